@@ -1,4 +1,11 @@
 # This file is called during the Bootstrap process.
+
+# On Linux / MacOS, this script is only run when its inputs have changed since it last completed
+# successfully. List any files (or globs) that it reads, relative to the repository root, in a
+# comment so that changes to them cause the script to run again:
+#
+#     # bootstrap-inputs: requirements.txt
+
 import sys
 
 from pathlib import Path
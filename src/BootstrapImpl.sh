@@ -14,28 +14,40 @@
 # ----------------------------------------------------------------------
 set +e # Continue on errors
 
+script_version=0.13.0
+
 echo ""
-echo "Script Version 0.12.2"
+echo "Script Version ${script_version}"
 echo ""
 
 # This script:
 #     1) Ensure that PYTHON_VERSION is set
 #     2) Ensure that PYTHON_VERSION is valid
 #     3) Set global environment variables
-#     4) Delete the micromamba environment (if requested)
-#     5) Install micromamba (if necessary)
-#     6) Initialize a new environment (if necessary)
+#     4) Locate a system python interpreter (if requested)
+#     5) Delete micromamba and/or the micromamba environment (if requested)
+#     6) Restore archived environments (if necessary)
+#     7) Install micromamba (if necessary)
+#     8) Initialize a new environment (if necessary)
 #        a) Create the micromamba environment
 #        b) Intialize the micromamba shell
 #        c) Activate the environment
 #        d) Install virtualenv
 #        e) Deactivate the environment
-#     7) Initialize the micromamba shell
-#     8) Activate the environment
-#     9) Remove the python virtual environment (if necessary)
-#     10) Create the python virtual environment
-#     11) Invoke custom functionality (if necessary)
-#     12) Create Activate.sh and Deactivate.sh
+#     9) Upgrade the environment (if requested)
+#        - Bootstrap the repositories in the workspace and exit (if requested)
+#     10) Initialize the micromamba shell
+#     11) Activate the environment
+#     12) Remove the python virtual environment (if requested or out of date)
+#     13) Create the python virtual environment (if necessary)
+#     14) Install the python helpers
+#     15) Invoke custom functionality (if necessary)
+#     16) Deduplicate site-packages (if requested)
+#     17) Precompile python bytecode (if requested)
+#     18) Write the environment manifest
+#     19) Create Activate.sh, Deactivate.sh, Run.sh, and Switch.sh
+#
+# Steps 5 and 7 - 11 are skipped when a system python interpreter is used.
 
 # ----------------------------------------------------------------------
 # |
@@ -86,460 +98,3546 @@ function _ActivateEnvironment() {
 }
 
 
-# ----------------------------------------------------------------------
-# ----------------------------------------------------------------------
-# ----------------------------------------------------------------------
-is_force=0
-is_debug=0
+function _Event() {
+    # Writes a tab-delimited event to the file descriptor in PYTHON_BOOTSTRAPPER_EVENTS_FD (if set).
+    # Events are "started\t<phase>" and "finished\t<phase>\t<DONE|CACHED|FAILED>\t<details>"; they
+    # are consumed by the PythonBootstrapper python package.
+    [[ -n ${PYTHON_BOOTSTRAPPER_EVENTS_FD} ]] || return 0
 
-# ----------------------------------------------------------------------
-# |
-# |  Parse and Process is_debug
-# |
-# ----------------------------------------------------------------------
-command_line_args=()
+    printf "%s\t%s\t%s\t%s\n" "$1" "$2" "$3" "$4" >&"${PYTHON_BOOTSTRAPPER_EVENTS_FD}" 2> /dev/null
+}
 
-while [[ $# -gt 0 ]]; do
-    if [[ "$1" == "--python-version" ]]; then
-        PYTHON_VERSION=$2
-        shift
-    else
-        if [[ "$1" == "--debug" ]]; then
-            is_debug=1
-        elif [[ "$1" == "--force" ]]; then
-            is_force=1
-        fi
 
-        command_line_args+=("$1")
+function _EmptyTrash() {
+    # Deletes the contents of a trash directory in a detached background process
+    local trash_dir=$1
+    local trash_items=("${trash_dir}"/*)
+
+    if [[ -e "${trash_items[0]}" ]]; then
+        (
+            # The events file descriptor must not remain open after this script exits
+            [[ -z ${PYTHON_BOOTSTRAPPER_EVENTS_FD} ]] || eval "exec ${PYTHON_BOOTSTRAPPER_EVENTS_FD}>&-"
+
+            nohup rm -rf "${trash_items[@]}" < /dev/null > /dev/null 2>&1 &
+        )
     fi
+}
 
-    shift
-done
 
-# ----------------------------------------------------------------------
-if [[ ${is_debug} -eq 1 ]]; then
-    set -x
-fi
+function _RemoveDirectory() {
+    # Removes a directory without waiting for its contents to be deleted. The directory is renamed
+    # to a trash directory (which is atomic, as the trash directory is on the same file system)
+    # and then deleted in the background. The directory is deleted synchronously if it can't be
+    # renamed.
+    local dir=$1
+    local trash_dir=$2
 
-# ----------------------------------------------------------------------
-# |
-# |  Ensure that PYTHON_VERSION is set
-# |
-# ----------------------------------------------------------------------
-if [[ -z ${PYTHON_VERSION} ]]; then
-    echo "Downloading default python version information..."
+    [[ -d "${trash_dir}" ]] || mkdir -p "${trash_dir}" 2> /dev/null
 
-    temp_output_name=$(mktemp BootstrapImpl.XXXXXX)
+    if mv "${dir}" "${trash_dir}/${dir##*/}.$$.${RANDOM}" 2> /dev/null; then
+        _EmptyTrash "${trash_dir}"
+        return 0
+    fi
 
-    curl --header "Cache-Control: no-cache, no-store" --header "Pragma: no-cache" --location https://raw.githubusercontent.com/davidbrownell/PythonBootstrapper/main/default_version --output default_version --no-progress-meter --fail-with-body > "${temp_output_name}" 2>&1
-    error=$?
+    rm -rf "${dir}"
+}
 
-    if [[ ${error} != 0 ]]; then
-        echo "[1ADownloading default python version information...[31m[1mFAILED[0m."
-        echo ""
 
-        cat "${temp_output_name}"
+function _CurlDownload() {
+    # Downloads a url without using cached content. Transient failures are retried with an
+    # exponential backoff (this is curl's default behavior when --retry-delay isn't provided).
+    # Additional arguments are passed to curl.
+    local url=$1
+    local output_filename=$2
+    shift 2
 
-        rm default_version
-        rm "${temp_output_name}"
+    curl --header "Cache-Control: no-cache, no-store" --header "Pragma: no-cache" --location "${url}" --output "${output_filename}" --no-progress-meter --fail-with-body --retry "${download_retries}" --retry-connrefused --connect-timeout "${connect_timeout}" --max-time "${download_timeout}" "$@"
+}
 
-        exit ${error}
+
+function _DownloadMicromamba() {
+    # Downloads micromamba, resuming a partial download left behind by a previous run (if any).
+    # The result is validated, as a partial download may have been for a different release; the
+    # download is restarted from the beginning if validation fails.
+    local url="https://github.com/mamba-org/micromamba-releases/releases/latest/download/micromamba-${PLATFORM}-${ARCH}"
+
+    if [[ -f "${micromamba_download_filename}" ]]; then
+        _CurlDownload "${url}" "${micromamba_download_filename}" --continue-at - \
+            && chmod u+x "${micromamba_download_filename}" \
+            && "${micromamba_download_filename}" --version > /dev/null 2>&1 \
+            && return 0
+
+        echo "The partial download could not be resumed; restarting the download."
+        rm -f "${micromamba_download_filename}"
     fi
 
-    PYTHON_VERSION=$(tr -d "\r\n" < default_version)
+    _CurlDownload "${url}" "${micromamba_download_filename}" || return $?
+    chmod u+x "${micromamba_download_filename}"
+}
 
-    rm default_version
-    rm "${temp_output_name}"
 
-    echo "[1ADownloading default python version information...[32m[1mDONE[0m."
-fi
+function _StartMicromambaDownload() {
+    # Download to a temporary name, as the existing executable may be removed by --force later
+    if [[ ! -f "${HOME}/.local/bin/micromamba" ]] || [[ ${is_force_micromamba} -eq 1 ]]; then
+        [[ -d ~/.local/bin ]] || mkdir -p ~/.local/bin
 
-# ----------------------------------------------------------------------
-# |
-# |  Ensure that PYTHON_VERSION is valid
-# |
-# ----------------------------------------------------------------------
-echo "Validating python version..."
+        micromamba_output_name=$(mktemp BootstrapImpl.XXXXXX)
+        micromamba_download_filename="${HOME}/.local/bin/micromamba.partial"
 
-# The variable must have major and minor versions that are integers
-IFS="." read -r -a python_version_parts <<< "${PYTHON_VERSION}"
+        _DownloadMicromamba > "${micromamba_output_name}" 2>&1 &
+        micromamba_pid=$!
+    fi
+}
 
-# Trim chars from the last parameter
-python_version_parts[1]="${python_version_parts[1]//[$'\r\n']}"
 
-if ! {
-    [[ ${#python_version_parts[@]} == 2 ]] \
-    && [[ ${python_version_parts[0]} =~ ^[0-9]+$ ]] \
-    && [[ ${python_version_parts[1]} =~ ^[0-9]+$ ]]
-}; then
-    echo "[1AValidating python version...[31m[1mFAILED[0m."
-    echo ""
+function _StopProcess() {
+    # Terminates a process and its direct children
+    local pid=$1
 
-    echo "[31m[1mERROR:[0m The PYTHON_VERSION environment variable must be set to a valid python version."
-    echo "[31m[1mERROR:[0m"
-    echo "[31m[1mERROR:[0m Current Value:"
-    echo "[31m[1mERROR:[0m     ${PYTHON_VERSION}"
-    echo "[31m[1mERROR:[0m"
-    echo "[31m[1mERROR:[0m Example:"
-    echo "[31m[1mERROR:[0m     export PYTHON_VERISON=3.12"
-    echo ""
+    pkill -TERM -P "${pid}" 2> /dev/null
+    kill -TERM "${pid}" 2> /dev/null
+}
 
-    exit 1
-fi
 
-echo "[1AValidating python version...[32m[1mDONE[0m."
+function _CancelDownloads() {
+    # Stops any downloads that were started but not consumed (for example, when exiting early due
+    # to an error). Partial micromamba downloads are preserved so that they can be resumed.
+    if [[ -n ${default_version_pid} ]]; then
+        _StopProcess "${default_version_pid}"
+        rm -f "${default_version_output_name}" default_version
+    fi
 
-echo ""
-echo "Python Version ${PYTHON_VERSION}"
-echo ""
+    if [[ -n ${micromamba_pid} ]]; then
+        _StopProcess "${micromamba_pid}"
+        rm -f "${micromamba_output_name}"
+    fi
+}
 
-# ----------------------------------------------------------------------
-# |
-# |  Set global environment variables
-# |
-# ----------------------------------------------------------------------
-# The PLATFORM, ARCH, and validation logic matches the logic found at
-# https://raw.githubusercontent.com/mamba-org/micromamba-releases/main/install.sh
-case "$(uname)" in
-    Linux)
-        PLATFORM="linux" ;;
-    Darwin)
-        PLATFORM="osx" ;;
-    *NT*)
-        PLATFORM="win" ;;
-esac
 
-ARCH="$(uname -m)"
-case "$ARCH" in
-    aarch64|ppc64le|arm64)
-        ;;  # pass
-    *)
-        ARCH="64" ;;
-esac
+function _RunWithTimeout() {
+    # Runs a command, terminating it if it doesn't complete within the specified number of seconds
+    # (0 disables the timeout). Returns 124 if the command was terminated by the timeout.
+    local timeout_seconds=$1
+    shift
 
-case "$PLATFORM-$ARCH" in
-    linux-aarch64|linux-ppc64le|linux-64|osx-arm64|osx-64|win-64)
-        ;;  # pass
-    *)
-        echo "[1ADownloading micromamba...[31m[1mFAILED[0m (failed to detect your operating system)."
-        exit 1
-esac
+    if [[ ${timeout_seconds} -eq 0 ]]; then
+        "$@"
+        return $?
+    fi
 
-export PYTHON_BOOTSTRAPPER_ACTIVATION_DIR=$(pwd)
-export PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION=${PYTHON_VERSION}
-export PYTHON_BOOTSTRAPPER_GENERATED_DIR=${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}/Generated/${PLATFORM}/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}
+    local start_seconds=${SECONDS}
+    local previous_int_trap
+    previous_int_trap=$(trap -p INT)
+
+    # The watchdog writes this file when it terminates the command, as the command may also fail on
+    # its own after the timeout has elapsed
+    local timeout_filename
+    timeout_filename=$(mktemp BootstrapImpl.XXXXXX)
+    rm -f "${timeout_filename}"
+
+    "$@" &
+    local command_pid=$!
+
+    # Background processes ignore Ctrl+C, so forward it explicitly
+    trap '_StopProcess ${command_pid}; rm -f "${timeout_filename}"; exit 130' INT
+
+    # Poll rather than sleeping for the entire timeout so that the watchdog exits promptly
+    (
+        while kill -0 "${command_pid}" 2> /dev/null; do
+            if [[ $((SECONDS - start_seconds)) -ge ${timeout_seconds} ]]; then
+                touch "${timeout_filename}"
+                _StopProcess "${command_pid}"
+                break
+            fi
 
-# ----------------------------------------------------------------------
-# |
-# |  Delete micromamba (if requested)
-# |
-# ----------------------------------------------------------------------
-if [[ ${is_force} -eq 1 ]]; then
-    # Remove the environment
-    if [[ -d ~/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION} ]]; then
-        echo "Removing the Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION} micromamba environment..."
+            sleep 1
+        done
+    ) < /dev/null > /dev/null 2>&1 &
+    local watchdog_pid=$!
 
-        rm -rf "${HOME}/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}"
-        error=$?
+    wait "${command_pid}"
+    local result=$?
 
-        if [[ ${error} != 0 ]]; then
-            echo "[1ARemoving the Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION} micromamba environment...[31m[1mFAILED[0m."
-            echo ""
+    if [[ -n ${previous_int_trap} ]]; then
+        eval "${previous_int_trap}"
+    else
+        trap - INT
+    fi
 
-            exit ${error}
-        fi
+    kill "${watchdog_pid}" 2> /dev/null
 
-        echo "[1ARemoving the Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION} micromamba environment...[32m[1mDONE[0m."
+    if [[ -f "${timeout_filename}" ]]; then
+        rm -f "${timeout_filename}"
+        return 124
     fi
 
-    # Remove the binary
-    if [[ -f ~/.local/bin/micromamba ]]; then
-        echo "Removing the micromamba executable..."
+    return ${result}
+}
 
-        rm -f ~/.local/bin/micromamba
-        error=$?
 
-        if [[ ${error} != 0 ]]; then
-            echo "[1ARemoving the micromamba executable...[31m[1mFAILED[0m."
-            echo ""
+function _GetProcessorCount() {
+    nproc 2> /dev/null || getconf _NPROCESSORS_ONLN 2> /dev/null || sysctl -n hw.ncpu 2> /dev/null || echo 1
+}
 
-            exit ${error}
-        fi
 
-        echo "[1ARemoving the micromamba executable...[32m[1mDONE[0m."
+function _HashFiles() {
+    # Displays "<hash> <filename>" for each file
+    if command -v sha256sum > /dev/null; then
+        sha256sum "$@"
+    elif command -v shasum > /dev/null; then
+        shasum -a 256 "$@"
+    else
+        cksum "$@"
     fi
-fi
+}
 
-# ----------------------------------------------------------------------
-# |
-# |  Download micromamba (if necessary)
-# |
-# ----------------------------------------------------------------------
-echo "Downloading micromamba..."
 
-if [[ -f "${HOME}/.local/bin/micromamba" ]]; then
-    echo "[1ADownloading micromamba...[32m[1mDONE[0m (already exists)."
-else
-    [[ -d ~/.local/bin ]] || mkdir -p ~/.local/bin
-    pushd ~/.local/bin > /dev/null || exit $?
+function _SetEpilogManifest() {
+    # Sets epilog_manifest to a description of everything that determines the result of an epilog
+    # script: the script itself, the arguments meant for epilogs (the flags processed by this script
+    # don't change the result), the python virtual environment, and any files that the script
+    # declares as inputs via "# bootstrap-inputs: <filename or glob> ..." comments.
+    local script_filename=$1
+    local input_filenames=("${script_filename}")
+    local line
+    local input_filename
+
+    while IFS= read -r line || [[ -n ${line} ]]; do
+        if [[ ${line} =~ ^#[[:space:]]*bootstrap-inputs:(.*)$ ]]; then
+            # Not quoted so that globs are expanded
+            for input_filename in ${BASH_REMATCH[1]}; do
+                input_filenames+=("${input_filename}")
+            done
+        fi
+    done < "${script_filename}"
 
-    temp_output_name=$(mktemp BootstrapImpl.XXXXXX)
+    epilog_manifest="venv: ${venv_fingerprint}
+arguments: ${epilog_args[*]}
+$(_HashFiles "${input_filenames[@]}" 2>&1)"
+}
 
-    curl --header "Cache-Control: no-cache, no-store" --header "Pragma: no-cache" --location https://github.com/mamba-org/micromamba-releases/releases/latest/download/micromamba-${PLATFORM}-${ARCH} --output "micromamba" --no-progress-meter --fail-with-body > "${temp_output_name}" 2>&1
-    error=$?
 
-    if [[ ${error} != 0 ]]; then
-        echo "[1ADownloading micromamba...[31m[1mFAILED[0m."
-        echo ""
+function _IsEpilogCurrent() {
+    # Returns 0 if the epilog has been run successfully with the inputs described by epilog_manifest
+    local manifest_filename="${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/EpilogManifests/$1"
 
-        cat "${temp_output_name}"
+    [[ ${is_rerun_epilogs} -eq 0 ]] \
+    && [[ -f "${manifest_filename}" ]] \
+    && [[ "$(< "${manifest_filename}")" == "${epilog_manifest}" ]]
+}
 
-        rm "${temp_output_name}"
-        popd > /dev/null || exit $?
 
-        exit ${error}
-    fi
+function _SaveEpilogManifest() {
+    local manifest_filename="${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/EpilogManifests/$1"
 
-    chmod u+x ~/.local/bin/micromamba
+    mkdir -p "$(dirname "${manifest_filename}")"
+    echo "${epilog_manifest}" > "${manifest_filename}"
+}
 
-    rm "${temp_output_name}"
-    popd > /dev/null || exit $?
 
-    echo "[1ADownloading micromamba...[32m[1mDONE[0m."
-fi
+function _ResetEnvironmentDelta() {
+    # Sets epilog_environment_delta to the (empty) file where an epilog can record changes to the
+    # environment that are applied by Activate.sh.
+    epilog_environment_delta="${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/EnvironmentDeltas/$1"
 
-# ----------------------------------------------------------------------
-# |
-# |  Initialize a new environment (if necessary)
-# |
-# ----------------------------------------------------------------------
-echo "Initialzing the micromamba environment..."
+    mkdir -p "$(dirname "${epilog_environment_delta}")"
+    rm -f "${epilog_environment_delta}"
+}
 
-if [[ -d "${HOME}/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}" ]]; then
-    echo "[1AInitializing the micromamba environment...[32m[1mDONE[0m (already exists)."
-else
-    echo "[1AInitializing the micromamba environment...[32m[1mDONE[0m (a new environment will be created)."
-    echo ""
-    echo ""
-    echo ""
 
-    # ----------------------------------------------------------------------
-    # |  Create the micromamba environment
-    ~/.local/bin/micromamba create --channel conda-forge --name "Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}" --root-prefix "${HOME}/micromamba" --yes "python~=${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}.0"
-    error=$?
+function _SaveActivateEnvironmentDelta() {
+    # Combines the environment deltas recorded by the epilogs that exist in the repository
+    local delta_filename="${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/Activate.delta"
+    local epilog_filename
 
-    if [[ ${error} != 0 ]]; then
-        exit ${error}
-    fi
+    rm -f "${delta_filename}"
 
-    echo ""
-    echo ""
-    echo ""
+    for epilog_filename in BootstrapEpilog.sh BootstrapEpilog.py BootstrapEpilog.d/*; do
+        [[ -f "${epilog_filename}" ]] || continue
+        [[ -f "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/EnvironmentDeltas/${epilog_filename}" ]] || continue
 
-    # From this point forward, delete the environment if an error occurrs as the environment
-    # won't be fully initialized.
+        cat "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/EnvironmentDeltas/${epilog_filename}" >> "${delta_filename}"
+    done
+}
 
-    export MAMBA_ROOT_PREFIX=~/micromamba
 
-    # ----------------------------------------------------------------------
-    # |  Initialize the shell
-    if [[ ${error} == 0 ]]; then
-        _InitializeShell
-        error=$?
+function _RunPythonEpilog() {
+    # Runs a python epilog, profiling it when PYTHON_BOOTSTRAPPER_PROFILE_EPILOGS is set
+    if [[ ${is_profile_epilogs} -eq 1 ]]; then
+        python -m PythonBootstrapperHelpers ProfileEpilog "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/Profiles" "$@"
+    else
+        python "$@"
     fi
+}
 
-    # ----------------------------------------------------------------------
-    # |  Activate the environment
-    if [[ ${error} == 0 ]]; then
-        _ActivateEnvironment
-        error=$?
-    fi
 
-    # ----------------------------------------------------------------------
-    # |  Install virtualenv
-    if [[ ${error} == 0 ]]; then
-        echo ""
-        echo ""
-        echo ""
+function _RunEpilogTask() {
+    # Runs a BootstrapEpilog.d task, prefixing each line of its output with the name of the task
+    local task_filename=$1
+    local task_name
+    local line
 
-        pip install virtualenv
-        error=$?
+    task_name=$(basename "${task_filename}")
 
-        echo ""
-        echo ""
-        echo ""
-    fi
+    _ResetEnvironmentDelta "${task_filename}"
+    export PYTHON_BOOTSTRAPPER_ENVIRONMENT_DELTA=${epilog_environment_delta}
 
-    # Deactivte the environment (note that this will always be done, event if the
-    # previous commands failed).
-    echo "Deactivating the micromamba environment..."
+    if [[ ${task_filename} == *.py ]]; then
+        _RunPythonEpilog "${task_filename}" "${command_line_args[@]}" < /dev/null 2>&1
+    else
+        bash "${task_filename}" "${command_line_args[@]}" < /dev/null 2>&1
+    fi | while IFS= read -r line || [[ -n ${line} ]]; do
+        echo "[${task_name}] ${line}"
+    done
 
-    micromamba deactivate
-    error=$?
+    return "${PIPESTATUS[0]}"
+}
 
-    unset MAMBA_ROOT_PREFIX
 
-    if [[ ${error} != 0 ]]; then
-        echo "[1ADeactivating the micromamba environment...[31m[1mFAILED[0m."
-        echo ""
-    else
-        echo "[1ADeactivating the micromamba environment...[32m[1mDONE[0m."
-    fi
+function _RunEpilogTasks() {
+    # Runs the tasks in BootstrapEpilog.d. A task starts once the tasks that it depends upon (declared
+    # via "# bootstrap-depends: <task name> ..." comments) have completed, and independent tasks run
+    # concurrently (up to PYTHON_BOOTSTRAPPER_EPILOG_JOBS at a time). New tasks are not started
+    # once a task fails; tasks that are already running are allowed to complete.
+    local task_filename
+    local task_names=()
+    local task_filenames=()
+    local task_dependencies=()
+    local task_manifests=()
+    local task_states=() # pending, running, ran, skipped, or failed
+    local task_pids=()
+    local task_start_seconds=()
+    local index
+    local other_index
+    local line
+    local dependency
+    local is_ready
+    local is_dependency_rerun
+    local is_progress
+    local task_error
+    local error=0
+    local num_running=0
+    local num_remaining
+    local start_seconds=${SECONDS}
+
+    for task_filename in BootstrapEpilog.d/*; do
+        [[ ${task_filename} == *.sh ]] || [[ ${task_filename} == *.py ]] || continue
+        [[ -f "${task_filename}" ]] || continue
+
+        index=${#task_names[@]}
+
+        task_names[index]=$(basename "${task_filename}")
+        task_filenames[index]=${task_filename}
+        task_dependencies[index]=""
+        task_states[index]=pending
+
+        while IFS= read -r line || [[ -n ${line} ]]; do
+            if [[ ${line} =~ ^#[[:space:]]*bootstrap-depends:(.*)$ ]]; then
+                task_dependencies[index]="${task_dependencies[index]} ${BASH_REMATCH[1]}"
+            fi
+        done < "${task_filename}"
+    done
 
-    # Delete the environment if an error occurred
-    if [[ ${error} != 0 ]]; then
-        echo "Removing the micromamba environment..."
+    num_remaining=${#task_names[@]}
+    [[ ${num_remaining} -ne 0 ]] || return 0
 
-        temp_output_name=$(mktemp BootstrapImpl.XXXXXX)
+    for index in "${!task_names[@]}"; do
+        for dependency in ${task_dependencies[index]}; do
+            is_ready=0
 
-        rm -rf "${HOME}/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}" > "${temp_output_name}" 2>&1
-        rm_error=$?
+            for other_index in "${!task_names[@]}"; do
+                [[ ${task_names[other_index]} != "${dependency}" ]] || is_ready=1
+            done
 
-        if [[ ${rm_error} != 0 ]]; then
-            echo "[1ARemoving the micromamba environment...[31m[1mFAILED[0m."
-            echo ""
+            if [[ ${is_ready} -eq 0 ]]; then
+                echo "[31m[1mERROR:[0m BootstrapEpilog.d/${task_names[index]} depends on '${dependency}', which does not exist."
+                return 1
+            fi
+        done
+    done
+
+    echo "Running ${num_remaining} BootstrapEpilog.d task(s) (jobs: ${PYTHON_BOOTSTRAPPER_EPILOG_JOBS})..."
+
+    while [[ ${num_remaining} -gt 0 ]]; do
+        is_progress=0
+
+        # Process completed tasks
+        for index in "${!task_names[@]}"; do
+            [[ ${task_states[index]} == running ]] || continue
+            ! kill -0 "${task_pids[index]}" 2> /dev/null || continue
+
+            wait "${task_pids[index]}"
+            task_error=$?
+
+            num_running=$((num_running - 1))
+            num_remaining=$((num_remaining - 1))
+            is_progress=1
+
+            if [[ ${task_error} != 0 ]]; then
+                task_states[index]=failed
+                echo "[${task_names[index]}] [31m[1mFAILED[0m ($((SECONDS - task_start_seconds[index]))s)."
+                _Event finished "epilog:BootstrapEpilog.d/${task_names[index]}" FAILED "exit code ${task_error}"
+
+                if [[ ${error} == 0 ]]; then
+                    echo "[31m[1mERROR: [0mBootstrapEpilog.d/${task_names[index]} failed."
+                    error=${task_error}
+                fi
+            else
+                task_states[index]=ran
+                echo "[${task_names[index]}] [32m[1mDONE[0m ($((SECONDS - task_start_seconds[index]))s)."
+                _Event finished "epilog:BootstrapEpilog.d/${task_names[index]}" DONE
+
+                epilog_manifest=${task_manifests[index]}
+                _SaveEpilogManifest "BootstrapEpilog.d/${task_names[index]}"
+            fi
+        done
 
-            cat "${temp_output_name}"
-        else
-            echo "[1ARemoving the micromamba environment...[32m[1mDONE[0m."
+        # Start tasks whose dependencies have completed
+        if [[ ${error} == 0 ]]; then
+            for index in "${!task_names[@]}"; do
+                [[ ${task_states[index]} == pending ]] || continue
+                [[ ${num_running} -lt ${PYTHON_BOOTSTRAPPER_EPILOG_JOBS} ]] || break
+
+                is_ready=1
+                is_dependency_rerun=0
+
+                for dependency in ${task_dependencies[index]}; do
+                    for other_index in "${!task_names[@]}"; do
+                        [[ ${task_names[other_index]} == "${dependency}" ]] || continue
+
+                        case "${task_states[other_index]}" in
+                            ran) is_dependency_rerun=1 ;;
+                            skipped) ;;
+                            *) is_ready=0 ;;
+                        esac
+                    done
+                done
+
+                [[ ${is_ready} -eq 1 ]] || continue
+
+                is_progress=1
+
+                _Event started "epilog:BootstrapEpilog.d/${task_names[index]}"
+                _SetEpilogManifest "${task_filenames[index]}"
+                task_manifests[index]=${epilog_manifest}
+
+                if [[ ${is_dependency_rerun} -eq 0 ]] && _IsEpilogCurrent "BootstrapEpilog.d/${task_names[index]}"; then
+                    task_states[index]=skipped
+                    num_remaining=$((num_remaining - 1))
+
+                    echo "[${task_names[index]}] Current and was not run (use --rerun-epilogs to run it)."
+                    _Event finished "epilog:BootstrapEpilog.d/${task_names[index]}" CACHED
+                    continue
+                fi
+
+                rm -f "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/EpilogManifests/BootstrapEpilog.d/${task_names[index]}"
+
+                _RunEpilogTask "${task_filenames[index]}" &
+
+                task_pids[index]=$!
+                task_start_seconds[index]=${SECONDS}
+                task_states[index]=running
+                num_running=$((num_running + 1))
+            done
+        fi
+
+        if [[ ${is_progress} -eq 0 ]]; then
+            # Nothing can be started once a task has failed or when the dependencies are circular
+            [[ ${num_running} -ne 0 ]] || break
+            sleep 0.1
         fi
+    done
+
+    [[ ${error} == 0 ]] || return ${error}
+
+    if [[ ${num_remaining} -ne 0 ]]; then
+        echo "[31m[1mERROR:[0m BootstrapEpilog.d contains tasks with circular dependencies."
+        return 1
+    fi
+
+    echo "Running ${#task_names[@]} BootstrapEpilog.d task(s) (jobs: ${PYTHON_BOOTSTRAPPER_EPILOG_JOBS})...[32m[1mDONE[0m ($((SECONDS - start_seconds))s)."
+}
+
+
+function _SnapshotPackageCache() {
+    # Records the packages in the micromamba package cache before the environment is created or
+    # upgraded, so that cache hits and misses can be calculated afterwards. The process is also
+    # registered as a user of the cache until _ManagePackageCache runs; packages are only evicted
+    # when no other process is using the cache, as micromamba may be linking any of them.
+    local users_dir="${PYTHON_BOOTSTRAPPER_CACHE_DIR}/PackageCache/.users"
+    local evicting_filename="${PYTHON_BOOTSTRAPPER_CACHE_DIR}/PackageCache/.evicting"
+    local evicting_pid
+
+    mkdir -p "${users_dir}"
+
+    package_cache_user="${users_dir}/$$"
+    touch "${package_cache_user}"
+
+    # Wait for an eviction that started before this process was registered
+    while [[ -f "${evicting_filename}" ]]; do
+        evicting_pid=$(cat "${evicting_filename}" 2>/dev/null)
+        [[ -n ${evicting_pid} ]] && kill -0 "${evicting_pid}" 2>/dev/null || break
+        sleep 0.1
+    done
+
+    package_cache_snapshot=$(mktemp BootstrapImpl.XXXXXX)
+
+    printf "%s\n" "${HOME}/micromamba/pkgs"/*/ > "${package_cache_snapshot}"
+}
+
+
+function _ManagePackageCache() {
+    # Displays the package cache hits and misses for the micromamba environment, records the time
+    # that its packages were last used, and removes the least recently used packages that don't fit
+    # within PYTHON_BOOTSTRAPPER_PACKAGE_CACHE_SIZE MB. Failures are displayed but not fatal, as the
+    # environment is valid either way.
+    local env_dir="${HOME}/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}"
+
+    rm -f "${package_cache_user}"
+
+    "${env_dir}/bin/python" - "${HOME}/micromamba/pkgs" "${env_dir}" "${PYTHON_BOOTSTRAPPER_CACHE_DIR}/PackageCache" "${package_cache_snapshot}" "${package_cache_size}" <<'END_OF_CONTENT'
+import fcntl
+import os
+import shutil
+import sys
+import time
+
+from pathlib import Path
+
+pkgs_dir, env_dir, markers_dir, snapshot_filename, max_size = sys.argv[1:]
+
+pkgs_dir = Path(pkgs_dir)
+markers_dir = Path(markers_dir)
+max_size = int(max_size) * 1024 * 1024
+
+# Packages used within this period may be in use by a concurrent bootstrap
+min_age = 60 * 60
+
+# ----------------------------------------------------------------------
+def GetMtime(path):
+    # Files may be removed by a concurrent bootstrap
+    try:
+        return path.lstat().st_mtime
+    except FileNotFoundError:
+        return 0
+
+
+# ----------------------------------------------------------------------
+def GetSize(path):
+    # Files may be removed by a concurrent bootstrap
+    if path.is_symlink() or not path.is_dir():
+        filenames = [path]
+    else:
+        filenames = [Path(root) / filename for root, _, filenames in os.walk(path) for filename in filenames]
+
+    size = 0
+
+    for filename in filenames:
+        try:
+            size += filename.lstat().st_size
+        except FileNotFoundError:
+            pass
+
+    return size
+
+
+# ----------------------------------------------------------------------
+def IsInUse():
+    # Returns True if another process is creating or upgrading a micromamba environment
+    is_in_use = False
+
+    for user in (markers_dir / ".users").iterdir():
+        try:
+            os.kill(int(user.name), 0)
+            is_in_use = True
+        except ProcessLookupError:
+            # The process terminated without unregistering itself
+            user.unlink(missing_ok=True)
+        except (PermissionError, ValueError):
+            is_in_use = True
+
+    return is_in_use
+
+
+# ----------------------------------------------------------------------
+
+# Cache hits and misses; each record in conda-meta corresponds to a package in the cache
+env_packages = set(path.stem for path in (Path(env_dir) / "conda-meta").glob("*.json"))
+snapshot = set(Path(line).name for line in Path(snapshot_filename).read_text().splitlines())
+
+num_hits = len(env_packages & snapshot)
+num_misses = len(env_packages) - num_hits
+
+print(
+    "Package cache: {} hit(s), {} miss(es) ({}% hit rate).".format(
+        num_hits,
+        num_misses,
+        (num_hits * 100 // len(env_packages)) if env_packages else 100,
+    ),
+)
+
+markers_dir.mkdir(parents=True, exist_ok=True)
+
+# Only one bootstrap manages the cache at a time
+with (markers_dir / ".lock").open("w") as lock_file:
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+    # The packages in the environment were just used
+    for name in env_packages:
+        (markers_dir / name).touch()
+
+    # A package is an extracted directory and/or its archive
+    packages = {}
+
+    for path in pkgs_dir.iterdir():
+        name = path.name
+
+        if path.is_dir():
+            if name == "cache":
+                continue
+        elif name.endswith(".conda"):
+            name = name[: -len(".conda")]
+        elif name.endswith(".tar.bz2"):
+            name = name[: -len(".tar.bz2")]
+        else:
+            continue
+
+        packages.setdefault(name, []).append(path)
+
+    # Packages cached before they were tracked were last used when they were added to the cache
+    last_used = {}
+
+    for name, paths in packages.items():
+        marker = markers_dir / name
+        last_used[name] = GetMtime(marker) if marker.exists() else max(GetMtime(path) for path in paths)
+
+    sizes = {name: sum(GetSize(path) for path in paths) for name, paths in packages.items()}
+    total_size = sum(sizes.values())
+
+    num_removed = 0
+    removed_size = 0
+
+    is_deferred = False
+
+    if max_size and total_size > max_size:
+        # Processes that start using the cache after this point wait until the eviction is complete;
+        # the eviction is deferred if a process started using the cache before this point.
+        evicting_filename = markers_dir / ".evicting"
+        evicting_filename.write_text(str(os.getpid()))
+
+        try:
+            is_deferred = IsInUse()
+
+            if not is_deferred:
+                now = time.time()
+
+                for name in sorted(packages, key=lambda name: last_used[name]):
+                    if total_size - removed_size <= max_size:
+                        break
+
+                    if name in env_packages or now - last_used[name] < min_age:
+                        continue
+
+                    for path in packages[name]:
+                        if path.is_dir() and not path.is_symlink():
+                            shutil.rmtree(path, ignore_errors=True)
+                        else:
+                            path.unlink(missing_ok=True)
+
+                    (markers_dir / name).unlink(missing_ok=True)
+
+                    num_removed += 1
+                    removed_size += sizes[name]
+        finally:
+            evicting_filename.unlink()
+
+    # Markers for packages that are no longer in the cache
+    for marker in markers_dir.iterdir():
+        if not marker.name.startswith(".") and marker.name not in packages:
+            marker.unlink(missing_ok=True)
+
+if num_removed:
+    print(
+        "Package cache: removed {} least recently used package(s) ({} MB); {} MB remain (budget: {} MB).".format(
+            num_removed,
+            removed_size // (1024 * 1024),
+            (total_size - removed_size) // (1024 * 1024),
+            max_size // (1024 * 1024),
+        ),
+    )
+elif is_deferred:
+    print(
+        "Package cache: {} MB (budget: {} MB); eviction was deferred as the cache is in use by another process.".format(
+            total_size // (1024 * 1024),
+            max_size // (1024 * 1024),
+        ),
+    )
+elif max_size:
+    print("Package cache: {} MB (budget: {} MB).".format(total_size // (1024 * 1024), max_size // (1024 * 1024)))
+else:
+    print("Package cache: {} MB.".format(total_size // (1024 * 1024)))
+END_OF_CONTENT
+
+    rm -f "${package_cache_snapshot}"
+}
+
+
+function _DeduplicateSitePackages() {
+    # Replaces files in the site-packages of the registered python virtual environments with
+    # hardlinks to a single copy in a content-addressed store, so that packages installed in multiple
+    # environments only occupy disk space once. Failures are displayed but not fatal, as the
+    # environments are valid either way. The arguments are the python virtual environments created
+    # by this process, whose files are deduplicated regardless of when they were modified; the first
+    # of them runs the deduplication.
+    local registry_filename
+    local venv_dir
+    local venv_dirs=()
+    local current_venv_dirs
+
+    for registry_filename in "${PYTHON_BOOTSTRAPPER_CACHE_DIR}/Registry"/*; do
+        [[ -f "${registry_filename}" ]] || continue
+
+        read -r venv_dir < "${registry_filename}"
+        [[ ! -f "${venv_dir}/pyvenv.cfg" ]] || venv_dirs+=("${venv_dir}")
+    done
+
+    current_venv_dirs=$(IFS=":"; echo "$*")
+
+    "$1/bin/python" - "${PYTHON_BOOTSTRAPPER_CACHE_DIR}/SitePackages" "${current_venv_dirs}" "${venv_dirs[@]}" <<'END_OF_CONTENT'
+import errno
+import fcntl
+import filecmp
+import hashlib
+import os
+import stat
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+store_dir, current_venv_dirs, *venv_dirs = sys.argv[1:]
+
+store_dir = Path(store_dir)
+current_venv_dirs = set(Path(venv_dir) for venv_dir in current_venv_dirs.split(os.pathsep))
+
+# Files in other python virtual environments modified within this period may be in the process of
+# being installed by a concurrent bootstrap.
+min_age = 10 * 60
+
+
+# ----------------------------------------------------------------------
+def Hash(path):
+    # Returns the exception when the file can't be read (for example, when it has been removed by a
+    # concurrent process), as an exception would otherwise end the entire pass.
+    hasher = hashlib.sha256()
+
+    try:
+        with open(path, "rb") as f:
+            while True:
+                content = f.read(1024 * 1024)
+                if not content:
+                    break
+
+                hasher.update(content)
+    except OSError as ex:
+        return ex
+
+    return hasher.hexdigest()
+
+
+# ----------------------------------------------------------------------
+def OnError(path, ex):
+    global num_errors
+
+    # Files that were removed or replaced by a concurrent process are skipped
+    if ex.errno in [errno.ENOENT, errno.EEXIST]:
+        return
+
+    num_errors += 1
+    sys.stderr.write("{}: {}\n".format(path, ex))
+
+
+# ----------------------------------------------------------------------
+def Link(path, path_stat, store_filename):
+    # Returns True if the file was replaced with a hardlink to the store file
+    try:
+        # The store file is linked to the file when the content is seen for the first time
+        os.link(path, store_filename)
+        return False
+    except FileExistsError:
+        pass
+
+    store_stat = store_filename.stat()
+
+    if store_stat.st_ino == path_stat.st_ino or store_stat.st_size != path_stat.st_size:
+        return False
+
+    # Never trust the name alone; the store file could have been modified in place
+    if not filecmp.cmp(path, store_filename, shallow=False):
+        return False
+
+    # The file must not have changed while it was being hashed and compared
+    current_stat = path.lstat()
+
+    if current_stat.st_ino != path_stat.st_ino or current_stat.st_mtime_ns != path_stat.st_mtime_ns:
+        return False
+
+    # Readers see either the original file or the link, never a missing file
+    temp_filename = path.parent / ".{}.{}.dedupe".format(path.name, os.getpid())
+
+    os.link(store_filename, temp_filename)
+
+    try:
+        os.replace(temp_filename, path)
+    except Exception:
+        temp_filename.unlink()
+        raise
+
+    return True
+
+
+# ----------------------------------------------------------------------
+
+store_dir.mkdir(parents=True, exist_ok=True)
+store_device = store_dir.stat().st_dev
+
+now = time.time()
+uid = os.getuid()
+
+num_venvs = 0
+num_linked = 0
+linked_size = 0
+num_errors = 0
+skipped_venv_dirs = []
+
+# Only one bootstrap deduplicates files at a time
+with (store_dir / ".lock").open("w") as lock_file:
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+    for venv_dir in sorted(set(venv_dirs)):
+        venv_dir = Path(venv_dir)
+
+        try:
+            venv_device = venv_dir.stat().st_dev
+        except OSError as ex:
+            # The python virtual environment was removed after it was registered
+            OnError(venv_dir, ex)
+            continue
+
+        # Hardlinks can't span file systems
+        if venv_device != store_device:
+            skipped_venv_dirs.append(venv_dir)
+            continue
+
+        num_venvs += 1
+        is_current = venv_dir in current_venv_dirs
+
+        # Files that are already linked have been deduplicated, and empty files don't occupy any
+        # space. File modes are part of the key, as all links to a file share the same mode.
+        candidates = []
+
+        for site_packages_dir in venv_dir.glob("lib/python*/site-packages"):
+            for root, _, filenames in os.walk(site_packages_dir):
+                for filename in filenames:
+                    path = Path(root) / filename
+
+                    try:
+                        path_stat = path.lstat()
+                    except OSError as ex:
+                        OnError(path, ex)
+                        continue
+
+                    if (
+                        not stat.S_ISREG(path_stat.st_mode)
+                        or path_stat.st_nlink != 1
+                        or path_stat.st_size == 0
+                        or path_stat.st_uid != uid
+                        or (not is_current and now - path_stat.st_mtime < min_age)
+                    ):
+                        continue
+
+                    candidates.append((path, path_stat))
+
+        with ThreadPoolExecutor(os.cpu_count()) as executor:
+            hashes = list(executor.map(lambda candidate: Hash(candidate[0]), candidates))
+
+        for (path, path_stat), hash_value in zip(candidates, hashes):
+            if isinstance(hash_value, OSError):
+                OnError(path, hash_value)
+                continue
+
+            store_filename = store_dir / hash_value[:2] / "{}-{:o}".format(hash_value, stat.S_IMODE(path_stat.st_mode))
+            store_filename.parent.mkdir(exist_ok=True)
+
+            try:
+                if Link(path, path_stat, store_filename):
+                    num_linked += 1
+                    linked_size += path_stat.st_blocks * 512
+            except OSError as ex:
+                OnError(path, ex)
+
+    # Files in the store that are no longer used by any python virtual environment
+    for store_filename in store_dir.glob("??/*"):
+        try:
+            if store_filename.lstat().st_nlink == 1:
+                store_filename.unlink()
+        except OSError as ex:
+            OnError(store_filename, ex)
+
+print(
+    "Deduplicated site-packages in {} python virtual environment(s): linked {} file(s) ({} MB saved).".format(
+        num_venvs,
+        num_linked,
+        linked_size // (1024 * 1024),
+    ),
+)
+
+for venv_dir in skipped_venv_dirs:
+    print("    {} was skipped, as it is on a different file system than {}.".format(venv_dir, store_dir))
+
+sys.exit(1 if num_errors else 0)
+END_OF_CONTENT
+}
+
+
+function _RunDeduplication() {
+    # Runs _DeduplicateSitePackages with the provided python virtual environments and displays the
+    # results
+    local start_seconds=${SECONDS}
+    local temp_output_name
+    local error
+
+    echo "Deduplicating site-packages..."
+    _Event started dedupe
+
+    temp_output_name=$(mktemp BootstrapImpl.XXXXXX)
+
+    _DeduplicateSitePackages "$@" > "${temp_output_name}" 2>&1
+    error=$?
+
+    if [[ ${error} != 0 ]]; then
+        echo "[1ADeduplicating site-packages...[33m[1mDONE[0m ($((SECONDS - start_seconds))s; some files could not be deduplicated)."
+        _Event finished dedupe DONE "some files could not be deduplicated"
+    else
+        echo "[1ADeduplicating site-packages...[32m[1mDONE[0m ($((SECONDS - start_seconds))s)."
+        _Event finished dedupe DONE
+    fi
+
+    echo ""
+    cat "${temp_output_name}"
+    echo ""
+
+    rm "${temp_output_name}"
+}
+
+
+function _PinEnvironmentPython() {
+    # Prevent updates to the environment from changing the python major/minor version
+    echo "python ${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}.*" > "${HOME}/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}/conda-meta/pinned"
+}
+
+
+function _FindSystemPython() {
+    # Sets system_python to the first interpreter in PYTHON_BOOTSTRAPPER_SYSTEM_PYTHON_DIRS or PATH
+    # that has the requested major and minor version, is not a virtual environment, and provides the
+    # modules used to create a python virtual environment. Interpreters that were rejected (along
+    # with the reason) are added to system_python_rejections.
+    local search_dirs
+    local search_dir
+    local candidate
+    local considered=":"
+    local output
+
+    system_python=""
+    system_python_rejections=()
+
+    IFS=":" read -r -a search_dirs <<< "${PYTHON_BOOTSTRAPPER_SYSTEM_PYTHON_DIRS}${PYTHON_BOOTSTRAPPER_SYSTEM_PYTHON_DIRS:+:}${PATH}"
+
+    for search_dir in "${search_dirs[@]}"; do
+        # Interpreters in micromamba environments and in this repository's python virtual
+        # environments are never used.
+        case "${search_dir}" in
+            ""|"${HOME}/micromamba/"*|"${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}/Generated/"*)
+                continue ;;
+        esac
+
+        for candidate in "${search_dir}/python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}" "${search_dir}/python3"; do
+            [[ -x "${candidate}" ]] || continue
+            [[ ${considered} != *":${candidate}:"* ]] || continue
+
+            considered="${considered}${candidate}:"
+
+            output=$("${candidate}" -c '
+import importlib.util
+import sys
+
+major, minor = (int(part) for part in sys.argv[1].split("."))
+
+if sys.version_info[:2] != (major, minor):
+    sys.exit("it is python {}.{}".format(*sys.version_info[:2]))
+
+if sys.prefix != sys.base_prefix:
+    sys.exit("it is a python virtual environment")
+
+missing = [name for name in ["ensurepip", "ssl", "venv"] if importlib.util.find_spec(name) is None]
+if missing:
+    sys.exit("these modules are not available: {}".format(", ".join(missing)))
+
+print(sys.executable)
+' "${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}" 2>&1 < /dev/null)
+
+            if [[ $? == 0 ]] && [[ -n ${output} ]]; then
+                system_python=${output}
+                return 0
+            fi
+
+            # The final line of output describes the problem
+            output=${output##*$'\n'}
+            system_python_rejections+=("${candidate}: ${output#"${output%%[![:space:]]*}"}")
+        done
+    done
+
+    return 1
+}
+
+
+function _SetVenvFingerprint() {
+    # Sets venv_fingerprint to a value that changes when the python virtual environment must be
+    # recreated. Only information that is available without spawning additional processes is used,
+    # so that the value can be calculated quickly (see --check).
+    if [[ ${is_system_python} -eq 1 ]]; then
+        venv_fingerprint="${PLATFORM}-${ARCH} Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION} system:${system_python}"
+        return 0
+    fi
+
+    local python_packages=("${HOME}/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}"/conda-meta/python-[0-9]*.json)
+
+    venv_fingerprint="${PLATFORM}-${ARCH} Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION} ${python_packages[0]##*/} ${virtualenv_app_data_dir##*/}"
+}
+
+
+function _CheckPhase() {
+    # Displays the status of a phase evaluated during --check
+    local phase=$1
+    local reason=$2
+
+    if [[ -z ${reason} ]]; then
+        echo "Checking ${phase}...[32m[1mCURRENT[0m."
+    else
+        echo "Checking ${phase}...[33m[1mSTALE[0m (${reason})."
+        stale_phases+=("${phase}")
+    fi
+}
+
+
+function _BootstrapWorkspace() {
+    # Bootstraps every repository under workspace_dir (a directory containing Bootstrap.sh or a
+    # BootstrapEpilog) using up to PYTHON_BOOTSTRAPPER_WORKSPACE_JOBS concurrent processes. This
+    # process has already performed the phases that are shared by all repositories (resolving the
+    # python version, downloading micromamba, and creating or upgrading the micromamba
+    # environment), so the repositories only create their python virtual environments and invoke
+    # their epilogs.
+    local script_filename
+    local log_dir
+    local child_args=()
+    local arg
+    local filename
+    local repo_dirs=()
+    local repo_states=() # pending, running, or the result
+    local repo_pids=()
+    local repo_start_seconds=()
+    local repo_seconds=()
+    local repo_logs=()
+    local generated_dirs=()
+    local generated_dir
+    local index
+    local repo_error
+    local is_progress
+    local num_running=0
+    local num_remaining
+    local error=0
+    local start_seconds=${SECONDS}
+    local success_result=DONE
+    local failure_result=FAILED
+    local failure_color="[31m"
+
+    if [[ ${is_check} -eq 1 ]]; then
+        success_result=CURRENT
+        failure_result=STALE
+        failure_color="[33m"
+    fi
+
+    script_filename="$(cd "$(dirname "$0")" && pwd)/$(basename "$0")"
+
+    # The micromamba and micromamba environment phases have already been performed
+    for arg in "${command_line_args[@]}"; do
+        [[ ${arg} == --force ]] || [[ ${arg} == --force=* ]] || [[ ${arg} == --upgrade ]] || [[ ${arg} == --dedupe ]] || child_args+=("${arg}")
+    done
+
+    # Deduplication is performed once all of the repositories have been bootstrapped
+    # (PYTHON_BOOTSTRAPPER_DEDUPE is cleared when invoking the repositories), rather than by each
+    # repository.
+
+    [[ ${is_force_venv} -eq 0 ]] || child_args+=("--force=venv")
+    [[ ${is_rerun_epilogs} -eq 0 ]] || child_args+=("--rerun-epilogs")
+
+    # This includes the directories from PYTHON_BOOTSTRAPPER_PRECOMPILE_DIRS, so that variable is
+    # cleared when invoking the repositories. Relative directories are relative to each repository.
+    for arg in "${precompile_dirs[@]}"; do
+        child_args+=("--precompile-dir" "${arg}")
+    done
+
+    if [[ ! -d "${workspace_dir}" ]]; then
+        echo "[31m[1mERROR:[0m '${workspace_dir}' is not a directory."
+        return 1
+    fi
+
+    # The repository directories are the unique parent directories of the files that were found
+    while IFS= read -r filename; do
+        repo_dirs+=("${filename}")
+    done < <(
+        find "$(cd "${workspace_dir}" && pwd)" \
+            \( -name .git -o -name Generated -o -name node_modules -o -name Templates \) -prune \
+            -o \( -name Bootstrap.sh -o -name BootstrapEpilog.sh -o -name BootstrapEpilog.py -o -name BootstrapEpilog.d \) -print \
+            | sed -e 's|/[^/]*$||' \
+            | sort -u
+    )
+
+    num_remaining=${#repo_dirs[@]}
+
+    if [[ ${num_remaining} -eq 0 ]]; then
+        echo "[31m[1mERROR:[0m No repositories were found in '${workspace_dir}'."
+        return 1
+    fi
+
+    PYTHON_BOOTSTRAPPER_WORKSPACE_JOBS=${PYTHON_BOOTSTRAPPER_WORKSPACE_JOBS:-${processor_count:-$(_GetProcessorCount)}}
+
+    if ! [[ ${PYTHON_BOOTSTRAPPER_WORKSPACE_JOBS} =~ ^[1-9][0-9]*$ ]]; then
+        echo "[31m[1mERROR:[0m '${PYTHON_BOOTSTRAPPER_WORKSPACE_JOBS}' is not a valid number of jobs."
+        return 1
+    fi
+
+    # Each run has its own log directory, as other workspaces may be bootstrapped concurrently
+    log_dir=$(mktemp -d "${TMPDIR:-/tmp}/PythonBootstrapperWorkspace.XXXXXX") || return 1
+
+    for index in "${!repo_dirs[@]}"; do
+        repo_states[index]=pending
+        repo_logs[index]="${log_dir}/${index}-$(basename "${repo_dirs[index]}").log"
+    done
+
+    echo ""
+    echo "Bootstrapping ${num_remaining} repositories in '${workspace_dir}' (jobs: ${PYTHON_BOOTSTRAPPER_WORKSPACE_JOBS})..."
+
+    while [[ ${num_remaining} -gt 0 ]]; do
+        is_progress=0
+
+        # Process completed repositories
+        for index in "${!repo_dirs[@]}"; do
+            [[ ${repo_states[index]} == running ]] || continue
+            ! kill -0 "${repo_pids[index]}" 2> /dev/null || continue
+
+            wait "${repo_pids[index]}"
+            repo_error=$?
+
+            repo_seconds[index]=$((SECONDS - repo_start_seconds[index]))
+            num_running=$((num_running - 1))
+            num_remaining=$((num_remaining - 1))
+            is_progress=1
+
+            if [[ ${repo_error} != 0 ]]; then
+                repo_states[index]=${failure_result}
+                error=1
+
+                echo "    ${repo_dirs[index]}...${failure_color}[1m${failure_result}[0m (${repo_seconds[index]}s; ${repo_logs[index]})."
+            else
+                repo_states[index]=${success_result}
+                echo "    ${repo_dirs[index]}...[32m[1m${success_result}[0m (${repo_seconds[index]}s)."
+            fi
+        done
+
+        # Start pending repositories
+        for index in "${!repo_dirs[@]}"; do
+            [[ ${repo_states[index]} == pending ]] || continue
+            [[ ${num_running} -lt ${PYTHON_BOOTSTRAPPER_WORKSPACE_JOBS} ]] || break
+
+            (
+                cd "${repo_dirs[index]}" \
+                && PYTHON_VERSION=${PYTHON_VERSION} PYTHON_BOOTSTRAPPER_EVENTS_FD="" PYTHON_BOOTSTRAPPER_PRECOMPILE_DIRS="" PYTHON_BOOTSTRAPPER_DEDUPE="" bash "${script_filename}" "${child_args[@]}"
+            ) < /dev/null > "${repo_logs[index]}" 2>&1 &
+
+            repo_pids[index]=$!
+            repo_start_seconds[index]=${SECONDS}
+            repo_states[index]=running
+            num_running=$((num_running + 1))
+            is_progress=1
+        done
+
+        [[ ${is_progress} -eq 1 ]] || sleep 0.1
+    done
+
+    echo "Bootstrapping ${#repo_dirs[@]} repositories in '${workspace_dir}' (jobs: ${PYTHON_BOOTSTRAPPER_WORKSPACE_JOBS})...DONE ($((SECONDS - start_seconds))s)."
+    echo ""
+
+    printf "%-60s  %-7s  %6s\n" "Repository" "Result" "Time"
+    printf "%-60s  %-7s  %6s\n" "------------------------------------------------------------" "-------" "------"
+
+    for index in "${!repo_dirs[@]}"; do
+        printf "%-60s  %-7s  %5ss\n" "${repo_dirs[index]}" "${repo_states[index]}" "${repo_seconds[index]}"
+    done
+
+    echo ""
+
+    if [[ ${is_dedupe} -eq 1 ]] && [[ ${is_check} -eq 0 ]]; then
+        for index in "${!repo_dirs[@]}"; do
+            [[ ${repo_states[index]} == "${success_result}" ]] || continue
+            generated_dirs+=("${repo_dirs[index]}/Generated/${PLATFORM}/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}")
+        done
+
+        if [[ ${#generated_dirs[@]} -ne 0 ]]; then
+            _RunDeduplication "${generated_dirs[@]}"
+
+            # Files replaced by links have the modification time of the linked file, so their
+            # bytecode must be compiled again.
+            if [[ ${is_precompile} -eq 1 ]]; then
+                for generated_dir in "${generated_dirs[@]}"; do
+                    "${generated_dir}/bin/python" -m compileall -q -j 0 "${generated_dir}"/lib/python*/site-packages > /dev/null 2>&1
+                done
+            fi
+        fi
+    fi
+
+    if [[ ${error} != 0 ]]; then
+        echo "[31m[1mERROR:[0m One or more repositories are ${failure_result}; logs are in '${log_dir}'."
+        echo ""
+    else
+        rm -rf "${log_dir}"
+    fi
+
+    return ${error}
+}
+
+
+function _GetModifiedTime() {
+    # Displays the modification time of a file (in seconds since the epoch)
+    stat -c %Y "$1" 2> /dev/null || stat -f %m "$1" 2> /dev/null
+}
+
+
+function _SetModifiedTime() {
+    # Sets the modification time of a file (in seconds since the epoch)
+    touch -d "@$2" "$1" 2> /dev/null || touch -t "$(date -r "$2" +%Y%m%d%H%M.%S)" "$1"
+}
+
+
+function _GetArchiveFilename() {
+    # Displays the name of the archive that --gc created for a directory (if one exists)
+    local archive
+
+    for archive in "$1.tar.zst" "$1.tar.gz"; do
+        if [[ -f "${archive}" ]]; then
+            echo "${archive}"
+            return 0
+        fi
+    done
+
+    return 1
+}
+
+
+function _RegisterVenv() {
+    # Records the python virtual environment (and its repository) in the registry used by --gc. The
+    # modification time of the registry file is the time that the python virtual environment was
+    # last used; it is updated here and each time that the environment is activated.
+    [[ -d "${PYTHON_BOOTSTRAPPER_CACHE_DIR}/Registry" ]] || mkdir -p "${PYTHON_BOOTSTRAPPER_CACHE_DIR}/Registry"
+
+    printf "%s\n%s\n" "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}" "${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}" > "${registry_filename}"
+}
+
+
+function _ArchiveDirectory() {
+    # Compresses a directory into <dir>.tar.zst (or <dir>.tar.gz when zstd isn't available) and then
+    # removes it; _PythonBootstrapperRestoreArchive restores the directory when it is used again. The
+    # modification time of the archive is the time that the directory was last used.
+    local dir=$1
+    local trash_dir=$2
+    local last_used=$3
+    local archive
+    local statuses
+    local error
+
+    if command -v zstd > /dev/null 2>&1; then
+        archive="${dir}.tar.zst"
+
+        tar -cf - -C "${dir%/*}" "${dir##*/}" | zstd -q -T0 -f -o "${archive}.tmp"
+        statuses=("${PIPESTATUS[@]}")
+
+        error=${statuses[0]}
+        [[ ${error} != 0 ]] || error=${statuses[1]}
+    else
+        archive="${dir}.tar.gz"
+
+        tar -czf "${archive}.tmp" -C "${dir%/*}" "${dir##*/}"
+        error=$?
+    fi
+
+    if [[ ${error} != 0 ]]; then
+        rm -f "${archive}.tmp"
+        return ${error}
+    fi
+
+    # The directory is only removed once the complete archive is available
+    mv "${archive}.tmp" "${archive}" \
+        && _SetModifiedTime "${archive}" "${last_used}" \
+        && _RemoveDirectory "${dir}" "${trash_dir}"
+}
+
+
+function _IsGarbageKnown() {
+    # Returns 0 if it is known whether the _CollectGarbage item at the index is in use: a python
+    # virtual environment must be in the registry (its last use is otherwise unknown) and a micromamba
+    # environment must have been used to create one of the python virtual environments that were
+    # found (it may otherwise be used by a repository that isn't in the registry).
+    local index=$1
+    local other_index
+
+    if [[ ${item_kinds[index]} == venv ]]; then
+        [[ -n ${item_registry_filenames[index]} ]]
+        return $?
+    fi
+
+    for other_index in "${!item_kinds[@]}"; do
+        [[ "${item_envs[other_index]}" != "${item_dirs[index]}" ]] || return 0
+    done
+
+    return 1
+}
+
+
+function _IsGarbageRemovable() {
+    # Returns 0 if the _CollectGarbage item at the index can be removed; items that aren't known to
+    # be unused are never removed, and micromamba environments can't be removed while a python
+    # virtual environment created from them remains.
+    local index=$1
+    local other_index
+
+    _IsGarbageKnown "${index}" || return 1
+    [[ ${item_kinds[index]} == env ]] || return 0
+
+    for other_index in "${!item_kinds[@]}"; do
+        if [[ ${item_is_removed[other_index]} -eq 0 ]] && [[ "${item_envs[other_index]}" == "${item_dirs[index]}" ]]; then
+            return 1
+        fi
+    done
+
+    return 0
+}
+
+
+function _CollectGarbage() {
+    # Displays the disk usage of the micromamba environments and of the python virtual environments
+    # in the registry, and removes those that haven't been used within PYTHON_BOOTSTRAPPER_GC_MAX_AGE
+    # days or (least recently used first) don't fit within PYTHON_BOOTSTRAPPER_GC_MAX_SIZE MB. The
+    # remaining environments that haven't been used within PYTHON_BOOTSTRAPPER_GC_ARCHIVE_AGE days are
+    # archived. Nothing is removed or archived with --check. A micromamba environment is never removed
+    # while a python virtual environment that was created from it remains, and items that may be used
+    # by something outside of the registry (see _IsGarbageKnown) are only displayed.
+    local registry_dir="${PYTHON_BOOTSTRAPPER_CACHE_DIR}/Registry"
+    local repo_dirs=()
+    local max_age=${PYTHON_BOOTSTRAPPER_GC_MAX_AGE:-90}
+    local max_size=${PYTHON_BOOTSTRAPPER_GC_MAX_SIZE:-0}
+    local archive_age=${PYTHON_BOOTSTRAPPER_GC_ARCHIVE_AGE:-30}
+    local value
+    local now
+    local index
+    local other_index
+    local num_venvs
+    local registry_filename
+    local venv_dir
+    local repo_dir
+    local env_dir
+    local archive
+    local key
+    local last_used
+    local size
+    local total_size=0
+    local removed_size=0
+    local num_removed=0
+    local num_archived=0
+    local result
+    local error=0
+
+    local item_kinds=()
+    local item_dirs=()
+    local item_repos=()
+    local item_envs=()
+    local item_registry_filenames=()
+    local item_last_used=()
+    local item_sizes=()
+    local item_archives=()
+    local item_is_removed=()
+    local item_is_archived=()
+
+    for value in "${max_age}" "${max_size}" "${archive_age}"; do
+        if ! [[ ${value} =~ ^[0-9]+$ ]]; then
+            echo "[31m[1mERROR:[0m '${value}' is not a valid PYTHON_BOOTSTRAPPER_GC_MAX_AGE, PYTHON_BOOTSTRAPPER_GC_MAX_SIZE, or PYTHON_BOOTSTRAPPER_GC_ARCHIVE_AGE value."
+            return 1
+        fi
+    done
+
+    now=$(date +%s)
+
+    echo "Calculating disk usage..."
+
+    # Repositories with registered python virtual environments
+    for registry_filename in "${registry_dir}"/*; do
+        [[ -f "${registry_filename}" ]] || continue
+
+        { read -r venv_dir; read -r repo_dir; } < "${registry_filename}"
+
+        # The python virtual environment (or its repository) has been removed
+        if [[ ! -f "${venv_dir}/pyvenv.cfg" ]] && ! _GetArchiveFilename "${venv_dir}" > /dev/null; then
+            [[ ${is_check} -eq 1 ]] || rm -f "${registry_filename}"
+            continue
+        fi
+
+        [[ " ${repo_dirs[*]} " == *" ${repo_dir} "* ]] || repo_dirs+=("${repo_dir}")
+    done
+
+    # Python virtual environments in those repositories (including any that were created before the
+    # registry existed, which were last used when they were created).
+    for repo_dir in "${repo_dirs[@]}"; do
+        for venv_dir in "${repo_dir}/Generated"/*/Python*; do
+            archive=""
+
+            if [[ ${venv_dir} == *.tar.zst ]] || [[ ${venv_dir} == *.tar.gz ]]; then
+                archive=${venv_dir}
+                venv_dir=${venv_dir%.tar.*}
+
+                # The archive is stale if the python virtual environment has been created again
+                if [[ -d "${venv_dir}" ]]; then
+                    [[ ${is_check} -eq 1 ]] || rm -f "${archive}"
+                    continue
+                fi
+            elif [[ ! -f "${venv_dir}/pyvenv.cfg" ]]; then
+                continue
+            fi
+
+            registry_filename=${registry_dir}/${venv_dir//\//%}
+            [[ -f "${registry_filename}" ]] || registry_filename=""
+
+            # The python virtual environment depends on the environment that contains its interpreter
+            # (the interpreter that created it, as "home" is the resolved interpreter when the
+            # environment's interpreter is a link); an archived environment is assumed to depend on
+            # the micromamba environment for its version.
+            env_dir=""
+
+            if [[ -n ${archive} ]]; then
+                env_dir="${HOME}/micromamba/envs/${venv_dir##*/}"
+            else
+                while IFS="=" read -r key value; do
+                    value=${value# }
+
+                    if [[ ${key%% *} == "home" ]]; then
+                        env_dir=${value%/bin}
+                    elif [[ ${key%% *} == "command" ]] && [[ ${value} == "${HOME}/micromamba/envs/"* ]]; then
+                        value=${value%% *}
+                        env_dir=${value%/bin/*}
+                    fi
+                done < "${venv_dir}/pyvenv.cfg"
+            fi
+
+            read -r size _ < <(du -sk "${archive:-${venv_dir}}" 2> /dev/null)
+
+            item_kinds+=(venv)
+            item_dirs+=("${venv_dir}")
+            item_repos+=("${repo_dir}")
+            item_envs+=("${env_dir}")
+            item_registry_filenames+=("${registry_filename}")
+            item_last_used+=("$(_GetModifiedTime "${registry_filename:-${archive:-${venv_dir}/pyvenv.cfg}}")")
+            item_sizes+=("${size:-0}")
+            item_archives+=("${archive}")
+            item_is_removed+=(0)
+            item_is_archived+=(0)
+        done
+    done
+
+    # micromamba environments; an environment was last used when it was last modified (or archived)
+    # or when a python virtual environment created from it was last used (whichever is more recent).
+    for env_dir in "${HOME}/micromamba/envs"/Python*; do
+        archive=""
+
+        if [[ ${env_dir} == *.tar.zst ]] || [[ ${env_dir} == *.tar.gz ]]; then
+            archive=${env_dir}
+            env_dir=${env_dir%.tar.*}
+
+            # The archive is stale if the environment has been created again
+            if [[ -d "${env_dir}" ]]; then
+                [[ ${is_check} -eq 1 ]] || rm -f "${archive}"
+                continue
+            fi
+
+            last_used=$(_GetModifiedTime "${archive}")
+        elif [[ -d "${env_dir}/conda-meta" ]]; then
+            last_used=$(_GetModifiedTime "${env_dir}/conda-meta/history" || _GetModifiedTime "${env_dir}")
+        else
+            continue
+        fi
+
+        for index in "${!item_kinds[@]}"; do
+            if [[ "${item_envs[index]}" == "${env_dir}" ]] && [[ ${item_last_used[index]} -gt ${last_used} ]]; then
+                last_used=${item_last_used[index]}
+            fi
+        done
+
+        read -r size _ < <(du -sk "${archive:-${env_dir}}" 2> /dev/null)
+
+        item_kinds+=(env)
+        item_dirs+=("${env_dir}")
+        item_repos+=("")
+        item_envs+=("")
+        item_registry_filenames+=("")
+        item_last_used+=("${last_used:-${now}}")
+        item_sizes+=("${size:-0}")
+        item_archives+=("${archive}")
+        item_is_removed+=(0)
+        item_is_archived+=(0)
+    done
+
+    for index in "${!item_kinds[@]}"; do
+        total_size=$((total_size + item_sizes[index]))
+    done
+
+    echo "[1ACalculating disk usage...[32m[1mDONE[0m."
+    echo ""
+
+    # Remove items that haven't been used recently (python virtual environments are listed first,
+    # so the environments that they were created from may be removed as well).
+    if [[ ${max_age} -ne 0 ]]; then
+        for index in "${!item_kinds[@]}"; do
+            if [[ $((now - item_last_used[index])) -gt $((max_age * 86400)) ]] && _IsGarbageRemovable "${index}"; then
+                item_is_removed[index]=1
+                removed_size=$((removed_size + item_sizes[index]))
+            fi
+        done
+    fi
+
+    # Remove the least recently used items until the remaining items fit within the budget
+    if [[ ${max_size} -ne 0 ]]; then
+        while [[ $((total_size - removed_size)) -gt $((max_size * 1024)) ]]; do
+            other_index=""
+
+            for index in "${!item_kinds[@]}"; do
+                [[ ${item_is_removed[index]} -eq 0 ]] || continue
+                _IsGarbageRemovable "${index}" || continue
+
+                if [[ -z ${other_index} ]] || [[ ${item_last_used[index]} -lt ${item_last_used[other_index]} ]]; then
+                    other_index=${index}
+                fi
+            done
+
+            [[ -n ${other_index} ]] || break
+
+            item_is_removed[other_index]=1
+            removed_size=$((removed_size + item_sizes[other_index]))
+        done
+    fi
+
+    # Archive the remaining items that haven't been used recently, rather than removing them
+    if [[ ${archive_age} -ne 0 ]]; then
+        for index in "${!item_kinds[@]}"; do
+            if [[ ${item_is_removed[index]} -eq 0 ]] && [[ -z ${item_archives[index]} ]] && [[ $((now - item_last_used[index])) -gt $((archive_age * 86400)) ]] && _IsGarbageKnown "${index}"; then
+                item_is_archived[index]=1
+            fi
+        done
+    fi
+
+    # Display the results (and remove the items)
+    printf "%-4s  %-70s  %9s  %9s  %s\n" "Kind" "Directory" "Size (MB)" "Last Used" "Result"
+    printf "%-4s  %-70s  %9s  %9s  %s\n" "----" "----------------------------------------------------------------------" "---------" "---------" "------"
+
+    for index in "${!item_kinds[@]}"; do
+        if [[ ${item_is_archived[index]} -eq 1 ]]; then
+            if [[ ${is_check} -eq 1 ]]; then
+                result="[33m[1mwould be archived[0m"
+                num_archived=$((num_archived + 1))
+            else
+                if [[ ${item_kinds[index]} == venv ]]; then
+                    _ArchiveDirectory "${item_dirs[index]}" "${item_repos[index]}/Generated/.trash" "${item_last_used[index]}"
+                else
+                    _ArchiveDirectory "${item_dirs[index]}" "${HOME}/micromamba/.trash" "${item_last_used[index]}"
+                fi
+
+                if [[ $? != 0 ]]; then
+                    result="[31m[1mFAILED[0m"
+                    error=1
+                else
+                    result="[32m[1marchived[0m"
+                    num_archived=$((num_archived + 1))
+                fi
+            fi
+        elif [[ ${item_is_removed[index]} -eq 0 ]]; then
+            if ! _IsGarbageKnown "${index}"; then
+                result="kept (usage unknown)"
+            elif [[ -n ${item_archives[index]} ]]; then
+                result="kept (archived)"
+            else
+                result="kept"
+            fi
+        elif [[ ${is_check} -eq 1 ]]; then
+            result="[33m[1mwould be removed[0m"
+        else
+            if [[ -n ${item_archives[index]} ]]; then
+                rm -f "${item_archives[index]}" \
+                    && { [[ -z ${item_registry_filenames[index]} ]] || rm -f "${item_registry_filenames[index]}"; }
+            elif [[ ${item_kinds[index]} == venv ]]; then
+                _RemoveDirectory "${item_dirs[index]}" "${item_repos[index]}/Generated/.trash" \
+                    && { [[ -z ${item_registry_filenames[index]} ]] || rm -f "${item_registry_filenames[index]}"; }
+            else
+                _RemoveDirectory "${item_dirs[index]}" "${HOME}/micromamba/.trash"
+            fi
+
+            if [[ $? != 0 ]]; then
+                result="[31m[1mFAILED[0m"
+                error=1
+            else
+                result="[32m[1mremoved[0m"
+                num_removed=$((num_removed + 1))
+            fi
+        fi
+
+        printf "%-4s  %-70s  %9s  %8sd  %s\n" "${item_kinds[index]}" "${item_dirs[index]}" "$((item_sizes[index] / 1024))" "$(((now - item_last_used[index]) / 86400))" "${result}"
+    done
+
+    echo ""
+
+    # Display the disk usage of the python virtual environments in each repository
+    printf "%-70s  %5s  %9s\n" "Repository" "Venvs" "Size (MB)"
+    printf "%-70s  %5s  %9s\n" "----------------------------------------------------------------------" "-----" "---------"
+
+    for index in "${!item_kinds[@]}"; do
+        [[ ${item_kinds[index]} == venv ]] || continue
+
+        repo_dir=${item_repos[index]}
+        size=0
+        num_venvs=0
+
+        for other_index in "${!item_kinds[@]}"; do
+            [[ "${item_repos[other_index]}" == "${repo_dir}" ]] || continue
+
+            # Each repository is only displayed once
+            [[ ${other_index} -ge ${index} ]] || continue 2
+
+            size=$((size + item_sizes[other_index]))
+            num_venvs=$((num_venvs + 1))
+        done
+
+        printf "%-70s  %5s  %9s\n" "${repo_dir}" "${num_venvs}" "$((size / 1024))"
+    done
+
+    echo ""
+
+    # Files in the --dedupe store that are no longer linked to any python virtual environment (files
+    # linked to the environments removed above are deleted in the background and are removed by the
+    # next --dedupe or --gc).
+    if [[ ${is_check} -eq 0 ]] && [[ -d "${PYTHON_BOOTSTRAPPER_CACHE_DIR}/SitePackages" ]]; then
+        find "${PYTHON_BOOTSTRAPPER_CACHE_DIR}/SitePackages" -mindepth 2 -type f -links 1 -delete 2> /dev/null
+    fi
+
+    if [[ ${is_check} -eq 1 ]]; then
+        echo "Total: $((total_size / 1024)) MB; $((removed_size / 1024)) MB would be removed and ${num_archived} item(s) would be archived (max age: ${max_age} days, max size: ${max_size} MB, archive age: ${archive_age} days; 0 is unlimited)."
+    else
+        echo "Total: $((total_size / 1024)) MB; removed ${num_removed} item(s) totaling $((removed_size / 1024)) MB and archived ${num_archived} item(s) (max age: ${max_age} days, max size: ${max_size} MB, archive age: ${archive_age} days; 0 is unlimited)."
+    fi
+
+    echo ""
+
+    return ${error}
+}
+
+
+# Restores a directory that was archived by --gc, which is much faster than creating it again. Returns
+# 0 if the directory exists or there is nothing to restore. Concurrent restores of the same directory
+# are serialized by renaming the archive before it is extracted; an archive claimed by a process that
+# no longer exists is released. This function is used by this script and included in Activate.sh and
+# Run.sh, so it must work in bash and zsh.
+restore_archive_function=$(cat <<'END_OF_CONTENT'
+function _PythonBootstrapperRestoreArchive() {
+    local dir=$1
+    local archive
+    local claimed
+    local temp_dir
+    local start_seconds
+    local pipeline_statuses
+    local error
+
+    while [[ ! -d "${dir}" ]]; do
+        archive=""
+        [[ ! -f "${dir}.tar.gz" ]] || archive="${dir}.tar.gz"
+        [[ ! -f "${dir}.tar.zst" ]] || archive="${dir}.tar.zst"
+
+        if [[ -z ${archive} ]]; then
+            # Another process may be restoring the directory
+            claimed=$(find "${dir%/*}" -maxdepth 1 -name "${dir##*/}.tar.*.restoring.*" 2> /dev/null | head -n 1)
+            [[ -n ${claimed} ]] || return 0
+
+            if kill -0 "${claimed##*.}" 2> /dev/null; then
+                sleep 1
+            else
+                rm -rf "${dir}.restoring.${claimed##*.}"
+                mv "${claimed}" "${claimed%.restoring.*}" 2> /dev/null
+            fi
+
+            continue
+        fi
+
+        claimed="${archive}.restoring.$$"
+        mv "${archive}" "${claimed}" 2> /dev/null || continue
+
+        echo "Restoring '${dir}'..."
+        start_seconds=${SECONDS}
+
+        temp_dir="${dir}.restoring.$$"
+        mkdir -p "${temp_dir}"
+
+        if [[ ${archive} == *.zst ]]; then
+            # Both commands must succeed (PIPESTATUS is specific to bash and pipestatus to zsh)
+            zstd -q -d -c "${claimed}" | tar -xf - -C "${temp_dir}"
+            pipeline_statuses="${PIPESTATUS[*]}${pipestatus[*]}"
+
+            error=0
+            [[ ${pipeline_statuses} == "0 0" ]] || error=1
+        else
+            tar -xzf "${claimed}" -C "${temp_dir}"
+            error=$?
+        fi
+
+        if [[ ${error} == 0 ]]; then
+            mv "${temp_dir}/${dir##*/}" "${dir}"
+            error=$?
+        fi
+
+        rm -rf "${temp_dir}"
+
+        if [[ ${error} != 0 ]]; then
+            mv "${claimed}" "${archive}"
+            echo "[1ARestoring '${dir}'...[31m[1mFAILED[0m."
+            return ${error}
+        fi
+
+        rm -f "${claimed}"
+        echo "[1ARestoring '${dir}'...[32m[1mDONE[0m ($((SECONDS - start_seconds))s)."
+    done
+
+    return 0
+}
+END_OF_CONTENT
+)
+
+eval "${restore_archive_function}"
+
+
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+is_check=0
+is_force_venv=0
+is_force_env=0
+is_force_micromamba=0
+is_debug=0
+is_refresh_seed_wheels=0
+is_upgrade=0
+is_precompile=0
+is_rerun_epilogs=0
+is_system_python=0
+is_gc=0
+is_dedupe=0
+precompile_dirs=()
+workspace_dir=""
+
+# ----------------------------------------------------------------------
+# |
+# |  Parse and Process is_debug
+# |
+# ----------------------------------------------------------------------
+command_line_args=()
+
+# The arguments that aren't processed by this script; these are the only arguments that determine
+# whether an epilog is current (see _SetEpilogManifest), although epilogs receive all of them.
+epilog_args=()
+
+while [[ $# -gt 0 ]]; do
+    if [[ "$1" == "--python-version" ]]; then
+        PYTHON_VERSION=$2
+        shift
+    elif [[ "$1" == "--download-threads" ]]; then
+        PYTHON_BOOTSTRAPPER_DOWNLOAD_THREADS=$2
+        shift
+    elif [[ "$1" == "--extract-threads" ]]; then
+        PYTHON_BOOTSTRAPPER_EXTRACT_THREADS=$2
+        shift
+    elif [[ "$1" == "--rerun-epilogs" ]]; then
+        # This isn't passed to the epilogs, as it would change their manifests
+        is_rerun_epilogs=1
+    elif [[ "$1" == "--workspace" ]]; then
+        workspace_dir=$2
+        shift
+    elif [[ "$1" == "--precompile-dir" ]]; then
+        is_precompile=1
+        precompile_dirs+=("$2")
+        shift
+    else
+        if [[ "$1" == "--debug" ]]; then
+            is_debug=1
+        elif [[ "$1" == "--force" ]]; then
+            is_force_venv=1
+            is_force_env=1
+            is_force_micromamba=1
+        elif [[ "$1" == --force=* ]]; then
+            IFS="," read -r -a force_levels <<< "${1#--force=}"
+
+            # An empty value is invalid rather than a no-op
+            [[ ${#force_levels[@]} -ne 0 ]] || force_levels=("")
+
+            for force_level in "${force_levels[@]}"; do
+                case "${force_level}" in
+                    venv)
+                        is_force_venv=1 ;;
+                    env)
+                        # The venv is based on the environment, so it must be recreated as well
+                        is_force_venv=1
+                        is_force_env=1 ;;
+                    micromamba)
+                        is_force_micromamba=1 ;;
+                    all)
+                        is_force_venv=1
+                        is_force_env=1
+                        is_force_micromamba=1 ;;
+                    *)
+                        echo "[31m[1mERROR:[0m '${force_level}' is not a valid --force value; valid values are 'venv', 'env', 'micromamba', and 'all'."
+                        exit 1
+                esac
+            done
+        elif [[ "$1" == "--refresh-seed-wheels" ]]; then
+            is_refresh_seed_wheels=1
+        elif [[ "$1" == "--check" ]]; then
+            is_check=1
+        elif [[ "$1" == "--upgrade" ]]; then
+            is_upgrade=1
+        elif [[ "$1" == "--precompile" ]]; then
+            is_precompile=1
+        elif [[ "$1" == "--system-python" ]]; then
+            is_system_python=1
+        elif [[ "$1" == "--gc" ]]; then
+            is_gc=1
+        elif [[ "$1" == "--dedupe" ]]; then
+            is_dedupe=1
+        else
+            epilog_args+=("$1")
+        fi
+
+        command_line_args+=("$1")
+    fi
+
+    shift
+done
+
+# ----------------------------------------------------------------------
+if [[ ${is_debug} -eq 1 ]]; then
+    set -x
+fi
+
+if [[ -n ${PYTHON_BOOTSTRAPPER_PRECOMPILE_DIRS} ]]; then
+    is_precompile=1
+
+    IFS=":" read -r -a precompile_env_dirs <<< "${PYTHON_BOOTSTRAPPER_PRECOMPILE_DIRS}"
+    precompile_dirs+=("${precompile_env_dirs[@]}")
+elif [[ ${PYTHON_BOOTSTRAPPER_PRECOMPILE} == "1" ]]; then
+    is_precompile=1
+fi
+
+if [[ ${PYTHON_BOOTSTRAPPER_SYSTEM_PYTHON} == "1" ]]; then
+    is_system_python=1
+fi
+
+if [[ ${PYTHON_BOOTSTRAPPER_DEDUPE} == "1" ]]; then
+    is_dedupe=1
+fi
+
+# Profiled epilogs are always run, as skipping them would produce empty profiles
+if [[ ${PYTHON_BOOTSTRAPPER_PROFILE_EPILOGS} == "1" ]]; then
+    is_profile_epilogs=1
+    is_rerun_epilogs=1
+else
+    is_profile_epilogs=0
+fi
+
+# Data shared by all repositories bootstrapped on this machine
+export PYTHON_BOOTSTRAPPER_CACHE_DIR=${PYTHON_BOOTSTRAPPER_CACHE_DIR:-${XDG_CACHE_HOME:-${HOME}/.cache}/PythonBootstrapper}
+
+# Network and timeout settings (all times are in seconds; a timeout of 0 disables it)
+download_retries=${PYTHON_BOOTSTRAPPER_DOWNLOAD_RETRIES:-5}
+connect_timeout=${PYTHON_BOOTSTRAPPER_CONNECT_TIMEOUT:-30}
+download_timeout=${PYTHON_BOOTSTRAPPER_DOWNLOAD_TIMEOUT:-600}
+env_timeout=${PYTHON_BOOTSTRAPPER_ENV_TIMEOUT:-1800}
+
+# The size budget (in MB) of the micromamba package cache; 0 is unlimited
+package_cache_size=${PYTHON_BOOTSTRAPPER_PACKAGE_CACHE_SIZE:-0}
+
+if ! [[ ${package_cache_size} =~ ^[0-9]+$ ]]; then
+    echo "[31m[1mERROR:[0m '${package_cache_size}' is not a valid PYTHON_BOOTSTRAPPER_PACKAGE_CACHE_SIZE value."
+    exit 1
+fi
+
+# Apply the same settings to the package downloads made by micromamba (unless explicitly configured)
+export MAMBA_REMOTE_MAX_RETRIES=${MAMBA_REMOTE_MAX_RETRIES:-${download_retries}}
+export MAMBA_REMOTE_CONNECT_TIMEOUT_SECS=${MAMBA_REMOTE_CONNECT_TIMEOUT_SECS:-${connect_timeout}}
+
+# The number of threads used by micromamba to download and extract packages. Extraction is CPU-bound
+# and uses one thread per processor by default. Downloads are I/O-bound and use one thread per
+# processor by default, bounded to a range that is reasonable for a single host.
+if [[ ${is_check} -eq 0 ]]; then
+    processor_count=$(_GetProcessorCount)
+
+    if [[ -z ${PYTHON_BOOTSTRAPPER_DOWNLOAD_THREADS} ]]; then
+        PYTHON_BOOTSTRAPPER_DOWNLOAD_THREADS=${processor_count}
+
+        [[ ${PYTHON_BOOTSTRAPPER_DOWNLOAD_THREADS} -ge 5 ]] || PYTHON_BOOTSTRAPPER_DOWNLOAD_THREADS=5
+        [[ ${PYTHON_BOOTSTRAPPER_DOWNLOAD_THREADS} -le 16 ]] || PYTHON_BOOTSTRAPPER_DOWNLOAD_THREADS=16
+    fi
+
+    PYTHON_BOOTSTRAPPER_EXTRACT_THREADS=${PYTHON_BOOTSTRAPPER_EXTRACT_THREADS:-${processor_count}}
+
+    # The number of BootstrapEpilog.d tasks that run concurrently
+    PYTHON_BOOTSTRAPPER_EPILOG_JOBS=${PYTHON_BOOTSTRAPPER_EPILOG_JOBS:-${processor_count}}
+
+    for thread_count in "${PYTHON_BOOTSTRAPPER_DOWNLOAD_THREADS}" "${PYTHON_BOOTSTRAPPER_EXTRACT_THREADS}" "${PYTHON_BOOTSTRAPPER_EPILOG_JOBS}"; do
+        if ! [[ ${thread_count} =~ ^[1-9][0-9]*$ ]]; then
+            echo "[31m[1mERROR:[0m '${thread_count}' is not a valid number of threads."
+            exit 1
+        fi
+    done
+
+    export MAMBA_DOWNLOAD_THREADS=${PYTHON_BOOTSTRAPPER_DOWNLOAD_THREADS}
+    export MAMBA_EXTRACT_THREADS=${PYTHON_BOOTSTRAPPER_EXTRACT_THREADS}
+fi
+
+# ----------------------------------------------------------------------
+# |
+# |  Detect the platform
+# |
+# ----------------------------------------------------------------------
+# The PLATFORM, ARCH, and validation logic matches the logic found at
+# https://raw.githubusercontent.com/mamba-org/micromamba-releases/main/install.sh
+case "$(uname)" in
+    Linux)
+        PLATFORM="linux" ;;
+    Darwin)
+        PLATFORM="osx" ;;
+    *NT*)
+        PLATFORM="win" ;;
+esac
+
+ARCH="$(uname -m)"
+case "$ARCH" in
+    aarch64|ppc64le|arm64)
+        ;;  # pass
+    *)
+        ARCH="64" ;;
+esac
+
+case "$PLATFORM-$ARCH" in
+    linux-aarch64|linux-ppc64le|linux-64|osx-arm64|osx-64|win-64)
+        ;;  # pass
+    *)
+        echo "Downloading micromamba...[31m[1mFAILED[0m (failed to detect your operating system)."
+        exit 1
+esac
+
+# ----------------------------------------------------------------------
+# |
+# |  Collect garbage (if requested)
+# |
+# ----------------------------------------------------------------------
+if [[ ${is_gc} -eq 1 ]]; then
+    _CollectGarbage
+    exit $?
+fi
+
+# ----------------------------------------------------------------------
+# |
+# |  Start downloads (if necessary)
+# |
+# ----------------------------------------------------------------------
+# Downloads that don't depend upon each other are started concurrently here and consumed by the
+# phases that need them, so that the time spent downloading is bounded by the slowest download
+# rather than the sum of all of them.
+default_version_pid=""
+micromamba_pid=""
+
+trap _CancelDownloads EXIT
+
+if [[ ${is_check} -eq 0 ]]; then
+    # Bootstrap.sh may have already downloaded this information while downloading BootstrapImpl.sh
+    if [[ -z ${PYTHON_VERSION} ]] && [[ ! -f "${PYTHON_BOOTSTRAPPER_PREFETCHED_DEFAULT_VERSION}" ]]; then
+        default_version_output_name=$(mktemp BootstrapImpl.XXXXXX)
+
+        _CurlDownload https://raw.githubusercontent.com/davidbrownell/PythonBootstrapper/main/default_version default_version > "${default_version_output_name}" 2>&1 &
+        default_version_pid=$!
+    fi
+
+    # micromamba isn't needed when a system python interpreter is used (it is downloaded later if
+    # one can't be found).
+    if [[ ${is_system_python} -eq 0 ]]; then
+        _StartMicromambaDownload
+    fi
+fi
+
+# ----------------------------------------------------------------------
+# |
+# |  Ensure that PYTHON_VERSION is set
+# |
+# ----------------------------------------------------------------------
+if [[ -z ${PYTHON_VERSION} ]] && [[ ${is_check} -eq 1 ]]; then
+    # Use the most recently downloaded value, as --check never accesses the network
+    if [[ -f "${PYTHON_BOOTSTRAPPER_CACHE_DIR}/default_version" ]]; then
+        read -r PYTHON_VERSION < "${PYTHON_BOOTSTRAPPER_CACHE_DIR}/default_version"
+    else
+        echo "Checking default python version information...[33m[1mSTALE[0m (it has not been downloaded)."
+        exit 1
+    fi
+fi
+
+if [[ -z ${PYTHON_VERSION} ]]; then
+    echo "Downloading default python version information..."
+
+    if [[ -n ${default_version_pid} ]]; then
+        wait "${default_version_pid}"
+        error=$?
+
+        default_version_pid=""
+
+        if [[ ${error} != 0 ]]; then
+            echo "[1ADownloading default python version information...[31m[1mFAILED[0m."
+            echo ""
+
+            cat "${default_version_output_name}"
+
+            rm -f default_version
+            rm "${default_version_output_name}"
+
+            exit ${error}
+        fi
+
+        PYTHON_VERSION=$(tr -d "\r\n" < default_version)
+
+        rm default_version
+        rm "${default_version_output_name}"
+    else
+        PYTHON_VERSION=$(tr -d "\r\n" < "${PYTHON_BOOTSTRAPPER_PREFETCHED_DEFAULT_VERSION}")
+    fi
+
+    [[ -d "${PYTHON_BOOTSTRAPPER_CACHE_DIR}" ]] || mkdir -p "${PYTHON_BOOTSTRAPPER_CACHE_DIR}"
+    echo "${PYTHON_VERSION}" > "${PYTHON_BOOTSTRAPPER_CACHE_DIR}/default_version"
+
+    echo "[1ADownloading default python version information...[32m[1mDONE[0m."
+fi
+
+# ----------------------------------------------------------------------
+# |
+# |  Ensure that PYTHON_VERSION is valid
+# |
+# ----------------------------------------------------------------------
+echo "Validating python version..."
+_Event started python_version
+
+# The variable must have major and minor versions that are integers
+IFS="." read -r -a python_version_parts <<< "${PYTHON_VERSION}"
+
+# Trim chars from the last parameter
+python_version_parts[1]="${python_version_parts[1]//[$'\r\n']}"
+
+if ! {
+    [[ ${#python_version_parts[@]} == 2 ]] \
+    && [[ ${python_version_parts[0]} =~ ^[0-9]+$ ]] \
+    && [[ ${python_version_parts[1]} =~ ^[0-9]+$ ]]
+}; then
+    echo "[1AValidating python version...[31m[1mFAILED[0m."
+    echo ""
+
+    echo "[31m[1mERROR:[0m The PYTHON_VERSION environment variable must be set to a valid python version."
+    echo "[31m[1mERROR:[0m"
+    echo "[31m[1mERROR:[0m Current Value:"
+    echo "[31m[1mERROR:[0m     ${PYTHON_VERSION}"
+    echo "[31m[1mERROR:[0m"
+    echo "[31m[1mERROR:[0m Example:"
+    echo "[31m[1mERROR:[0m     export PYTHON_VERISON=3.12"
+    echo ""
+
+    exit 1
+fi
+
+echo "[1AValidating python version...[32m[1mDONE[0m."
+_Event finished python_version DONE "${PYTHON_VERSION}"
+
+echo ""
+echo "Python Version ${PYTHON_VERSION}"
+echo ""
+
+# ----------------------------------------------------------------------
+# |
+# |  Set global environment variables
+# |
+# ----------------------------------------------------------------------
+export PYTHON_BOOTSTRAPPER_ACTIVATION_DIR=${PWD}
+export PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION=${PYTHON_VERSION}
+export PYTHON_BOOTSTRAPPER_GENERATED_DIR=${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}/Generated/${PLATFORM}/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}
+
+# virtualenv extracts the seed packages (pip, setuptools, wheel) into its app-data directory and
+# installs them from there. Sharing a single app-data directory means that this extraction happens
+# once per machine rather than once per venv. Increment the version (rather than deleting the
+# directory) when the options used to populate it change in an incompatible way.
+virtualenv_app_data_dir=${PYTHON_BOOTSTRAPPER_CACHE_DIR}/virtualenv/app-data-v1
+
+# Directories removed during the bootstrap process are moved here and deleted in the background.
+# These must be on the same file system as the directories that are moved into them.
+env_trash_dir=${HOME}/micromamba/.trash
+venv_trash_dir=${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}/Generated/.trash
+
+# The registry used by --gc
+registry_filename=${PYTHON_BOOTSTRAPPER_CACHE_DIR}/Registry/${PYTHON_BOOTSTRAPPER_GENERATED_DIR//\//%}
+
+# ----------------------------------------------------------------------
+# |
+# |  Check the status of each phase (if requested)
+# |
+# ----------------------------------------------------------------------
+if [[ ${is_check} -eq 1 ]] && [[ -n ${workspace_dir} ]]; then
+    _BootstrapWorkspace
+    exit $?
+fi
+
+if [[ ${is_check} -eq 1 ]]; then
+    # Everything here is based on information available via stat calls; the network is never
+    # accessed and no processes are spawned. The uname calls used to detect the platform (which must
+    # match the micromamba installer) are the only processes that --check starts.
+    stale_phases=()
+
+    existing_fingerprint=""
+    [[ ! -f "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/BootstrapFingerprint" ]] || read -r existing_fingerprint < "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/BootstrapFingerprint"
+
+    if [[ ${is_system_python} -eq 1 ]]; then
+        # Use the interpreter that was located during the bootstrap process, as locating it again
+        # would spawn processes.
+        system_python=""
+        if [[ "${existing_fingerprint}" =~ " system:"(.+)$ ]]; then
+            system_python=${BASH_REMATCH[1]}
+        fi
+
+        if [[ -z ${system_python} ]]; then
+            _CheckPhase "the system python interpreter" "it has not been located"
+        elif [[ ! -x "${system_python}" ]]; then
+            _CheckPhase "the system python interpreter" "'${system_python}' does not exist"
+        else
+            _CheckPhase "the system python interpreter"
+        fi
+    else
+        if [[ -x "${HOME}/.local/bin/micromamba" ]]; then
+            _CheckPhase "micromamba"
+        else
+            _CheckPhase "micromamba" "it has not been downloaded"
+        fi
+
+        env_dir="${HOME}/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}"
+
+        if [[ ! -d "${env_dir}" ]] && _GetArchiveFilename "${env_dir}" > /dev/null; then
+            _CheckPhase "the micromamba environment" "it has been archived by --gc"
+        elif [[ ! -x "${env_dir}/bin/python" ]]; then
+            _CheckPhase "the micromamba environment" "it does not exist"
+        elif [[ ! -x "${env_dir}/bin/virtualenv" ]]; then
+            _CheckPhase "the micromamba environment" "virtualenv is not installed"
+        else
+            _CheckPhase "the micromamba environment"
+        fi
+    fi
+
+    _SetVenvFingerprint
+
+    if [[ ! -d "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}" ]] && _GetArchiveFilename "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}" > /dev/null; then
+        _CheckPhase "the python virtual environment" "it has been archived by --gc"
+    elif [[ ! -f "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/pyvenv.cfg" ]]; then
+        _CheckPhase "the python virtual environment" "it does not exist"
+    elif [[ "${existing_fingerprint}" != "${venv_fingerprint}" ]]; then
+        _CheckPhase "the python virtual environment" "its fingerprint has changed"
+    else
+        _CheckPhase "the python virtual environment"
+    fi
+
+    # The second line of each generated script contains the values used to generate it
+    for script_name in Activate Deactivate Run; do
+        script_filename="${script_name}${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}.sh"
+        script_marker=""
+
+        [[ ! -f "${script_filename}" ]] || { read -r script_marker; read -r script_marker; } < "${script_filename}"
+
+        if [[ ! -f "${script_filename}" ]]; then
+            _CheckPhase "${script_name}.sh" "it does not exist"
+        elif [[ "${script_marker}" != "# PythonBootstrapper ${script_version}: ${venv_fingerprint}" ]]; then
+            _CheckPhase "${script_name}.sh" "it was generated with different values"
+        else
+            _CheckPhase "${script_name}.sh"
+        fi
+    done
+
+    echo ""
+
+    if [[ ${#stale_phases[@]} -ne 0 ]]; then
+        echo "[33m[1mThe repository must be bootstrapped[0m, as these phases are stale:"
+
+        for stale_phase in "${stale_phases[@]}"; do
+            echo "    - ${stale_phase}"
+        done
+
+        echo ""
+
+        exit 1
+    fi
+
+    echo "[32m[1mThe repository is current.[0m"
+    echo ""
+
+    exit 0
+fi
+
+# Delete anything left behind by previous runs (for example, if the machine was shut down before a
+# background deletion completed).
+_EmptyTrash "${env_trash_dir}"
+_EmptyTrash "${venv_trash_dir}"
+
+# ----------------------------------------------------------------------
+# |
+# |  Locate a system python interpreter (if requested)
+# |
+# ----------------------------------------------------------------------
+if [[ ${is_system_python} -eq 1 ]]; then
+    echo "Locating a system python interpreter..."
+    _Event started system_python
+
+    _FindSystemPython
+
+    if [[ -n ${system_python} ]]; then
+        echo "[1ALocating a system python interpreter...[32m[1mDONE[0m (${system_python})."
+        _Event finished system_python DONE "${system_python}"
+    else
+        echo "[1ALocating a system python interpreter...[33m[1mNOT FOUND[0m (micromamba will be used)."
+
+        for system_python_rejection in "${system_python_rejections[@]}"; do
+            echo "    - ${system_python_rejection}"
+        done
+
+        echo ""
+
+        _Event finished system_python DONE "not found"
+
+        is_system_python=0
+        _StartMicromambaDownload
+    fi
+fi
+
+# ----------------------------------------------------------------------
+# |
+# |  Delete micromamba and/or the micromamba environment (if requested)
+# |
+# ----------------------------------------------------------------------
+if [[ ${is_force_env} -eq 1 ]] && [[ ${is_system_python} -eq 0 ]]; then
+    if [[ -d ~/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION} ]]; then
+        echo "Removing the Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION} micromamba environment..."
+
+        _RemoveDirectory "${HOME}/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}" "${env_trash_dir}"
+        error=$?
+
+        if [[ ${error} != 0 ]]; then
+            echo "[1ARemoving the Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION} micromamba environment...[31m[1mFAILED[0m."
+            echo ""
+
+            exit ${error}
+        fi
+
+        echo "[1ARemoving the Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION} micromamba environment...[32m[1mDONE[0m."
+    fi
+fi
+
+if [[ ${is_force_micromamba} -eq 1 ]] && [[ ${is_system_python} -eq 0 ]]; then
+    if [[ -f ~/.local/bin/micromamba ]]; then
+        echo "Removing the micromamba executable..."
+
+        rm -f ~/.local/bin/micromamba
+        error=$?
+
+        if [[ ${error} != 0 ]]; then
+            echo "[1ARemoving the micromamba executable...[31m[1mFAILED[0m."
+            echo ""
+
+            exit ${error}
+        fi
+
+        echo "[1ARemoving the micromamba executable...[32m[1mDONE[0m."
+    fi
+fi
+
+# ----------------------------------------------------------------------
+# |
+# |  Restore archived environments (if necessary)
+# |
+# ----------------------------------------------------------------------
+# Environments archived by --gc are restored rather than created again. A failure isn't fatal, as the
+# environment is created instead. Archives of environments that are being recreated are removed.
+if [[ ${is_system_python} -eq 0 ]]; then
+    if [[ ${is_force_env} -eq 1 ]]; then
+        rm -f "${HOME}/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}".tar.{zst,gz}
+    else
+        _PythonBootstrapperRestoreArchive "${HOME}/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}"
+    fi
+fi
+
+if [[ ${is_force_venv} -eq 1 ]]; then
+    rm -f "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}".tar.{zst,gz}
+else
+    _PythonBootstrapperRestoreArchive "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}"
+fi
+
+# ----------------------------------------------------------------------
+# |
+# |  Download micromamba (if necessary)
+# |
+# ----------------------------------------------------------------------
+if [[ ${is_system_python} -eq 0 ]]; then
+    echo "Downloading micromamba..."
+    _Event started micromamba
+
+    if [[ -z ${micromamba_pid} ]]; then
+        echo "[1ADownloading micromamba...[32m[1mDONE[0m (already exists)."
+        _Event finished micromamba CACHED
+    else
+        # The download was started earlier
+        wait "${micromamba_pid}"
+        error=$?
+
+        micromamba_pid=""
+
+        if [[ ${error} != 0 ]]; then
+            echo "[1ADownloading micromamba...[31m[1mFAILED[0m."
+            echo ""
+
+            cat "${micromamba_output_name}"
+
+            rm "${micromamba_output_name}"
+
+            exit ${error}
+        fi
+
+        mv -f "${micromamba_download_filename}" ~/.local/bin/micromamba
+
+        rm "${micromamba_output_name}"
+
+        echo "[1ADownloading micromamba...[32m[1mDONE[0m."
+        _Event finished micromamba DONE
+    fi
+fi
+
+# ----------------------------------------------------------------------
+# |
+# |  Initialize a new environment (if necessary)
+# |
+# ----------------------------------------------------------------------
+if [[ ${is_system_python} -eq 0 ]]; then
+    echo "Initialzing the micromamba environment..."
+    _Event started environment
+
+    is_new_env=0
+
+    if [[ -d "${HOME}/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}" ]]; then
+        echo "[1AInitializing the micromamba environment...[32m[1mDONE[0m (already exists)."
+        _Event finished environment CACHED
+    else
+        is_new_env=1
+
+        echo "[1AInitializing the micromamba environment...[32m[1mDONE[0m (a new environment will be created)."
+        echo ""
+        echo ""
+        echo ""
+
+        # ----------------------------------------------------------------------
+        # |  Create the micromamba environment
+        start_seconds=${SECONDS}
+
+        _SnapshotPackageCache
+
+        _RunWithTimeout "${env_timeout}" ~/.local/bin/micromamba create --channel conda-forge --name "Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}" --root-prefix "${HOME}/micromamba" --yes "python~=${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}.0"
+        error=$?
+
+        if [[ ${error} == 124 ]]; then
+            echo ""
+            echo "[31m[1mERROR:[0m The micromamba environment was not created within ${env_timeout} seconds (PYTHON_BOOTSTRAPPER_ENV_TIMEOUT)."
+
+            # The environment is incomplete and would otherwise be treated as valid during the next run
+            [[ ! -d "${HOME}/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}" ]] || _RemoveDirectory "${HOME}/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}" "${env_trash_dir}"
+        fi
+
+        if [[ ${error} != 0 ]]; then
+            rm -f "${package_cache_snapshot}" "${package_cache_user}"
+            exit ${error}
+        fi
+
+        _PinEnvironmentPython
+
+        echo ""
+        echo "Created the micromamba environment in $((SECONDS - start_seconds))s (download threads: ${MAMBA_DOWNLOAD_THREADS}, extract threads: ${MAMBA_EXTRACT_THREADS})."
+        _ManagePackageCache
+        echo ""
+        echo ""
+        echo ""
+
+        # From this point forward, delete the environment if an error occurrs as the environment
+        # won't be fully initialized.
+
+        export MAMBA_ROOT_PREFIX=~/micromamba
+
+        # ----------------------------------------------------------------------
+        # |  Initialize the shell
+        if [[ ${error} == 0 ]]; then
+            _InitializeShell
+            error=$?
+        fi
+
+        # ----------------------------------------------------------------------
+        # |  Activate the environment
+        if [[ ${error} == 0 ]]; then
+            _ActivateEnvironment
+            error=$?
+        fi
+
+        # ----------------------------------------------------------------------
+        # |  Install virtualenv
+        if [[ ${error} == 0 ]]; then
+            echo ""
+            echo ""
+            echo ""
+
+            pip install virtualenv
+            error=$?
+
+            echo ""
+            echo ""
+            echo ""
+        fi
+
+        # Deactivte the environment (note that this will always be done, event if the
+        # previous commands failed).
+        echo "Deactivating the micromamba environment..."
+
+        micromamba deactivate
+        error=$?
+
+        unset MAMBA_ROOT_PREFIX
+
+        if [[ ${error} != 0 ]]; then
+            echo "[1ADeactivating the micromamba environment...[31m[1mFAILED[0m."
+            echo ""
+        else
+            echo "[1ADeactivating the micromamba environment...[32m[1mDONE[0m."
+        fi
+
+        # Delete the environment if an error occurred
+        if [[ ${error} != 0 ]]; then
+            echo "Removing the micromamba environment..."
+
+            temp_output_name=$(mktemp BootstrapImpl.XXXXXX)
+
+            _RemoveDirectory "${HOME}/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}" "${env_trash_dir}" > "${temp_output_name}" 2>&1
+            rm_error=$?
+
+            if [[ ${rm_error} != 0 ]]; then
+                echo "[1ARemoving the micromamba environment...[31m[1mFAILED[0m."
+                echo ""
+
+                cat "${temp_output_name}"
+            else
+                echo "[1ARemoving the micromamba environment...[32m[1mDONE[0m."
+            fi
+
+            rm "${temp_output_name}"
+            exit ${error}
+        fi
+
+        _Event finished environment DONE "download threads: ${MAMBA_DOWNLOAD_THREADS}, extract threads: ${MAMBA_EXTRACT_THREADS}"
+    fi
+fi
+
+# ----------------------------------------------------------------------
+# |
+# |  Upgrade the environment (if requested)
+# |
+# ----------------------------------------------------------------------
+if [[ ${is_upgrade} -eq 1 ]] && [[ ${is_new_env} -eq 0 ]] && [[ ${is_system_python} -eq 0 ]]; then
+    # Update the existing environment in place rather than recreating it. The pinned python version
+    # ensures that only patch releases are installed. The python virtual environment will be
+    # recreated below if the python package changed (as its fingerprint will be different).
+    echo "Upgrading the micromamba environment..."
+    _Event started upgrade
+    echo ""
+    echo ""
+    echo ""
+
+    _PinEnvironmentPython
+    _SnapshotPackageCache
+
+    start_seconds=${SECONDS}
+
+    _RunWithTimeout "${env_timeout}" ~/.local/bin/micromamba update --channel conda-forge --name "Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}" --root-prefix "${HOME}/micromamba" --yes --all
+    error=$?
+
+    if [[ ${error} == 0 ]]; then
+        _RunWithTimeout "${env_timeout}" "${HOME}/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}/bin/python" -m pip install --upgrade virtualenv
+        error=$?
+    fi
+
+    if [[ ${error} == 124 ]]; then
+        echo ""
+        echo "[31m[1mERROR:[0m The micromamba environment was not upgraded within ${env_timeout} seconds (PYTHON_BOOTSTRAPPER_ENV_TIMEOUT)."
+    fi
+
+    echo ""
+    echo ""
+    echo ""
+
+    if [[ ${error} != 0 ]]; then
+        echo "Upgrading the micromamba environment...[31m[1mFAILED[0m."
+        echo ""
+
+        rm -f "${package_cache_snapshot}" "${package_cache_user}"
+        exit ${error}
+    fi
+
+    echo "Upgrading the micromamba environment...[32m[1mDONE[0m ($((SECONDS - start_seconds))s; download threads: ${MAMBA_DOWNLOAD_THREADS}, extract threads: ${MAMBA_EXTRACT_THREADS})."
+    _ManagePackageCache
+    _Event finished upgrade DONE "download threads: ${MAMBA_DOWNLOAD_THREADS}, extract threads: ${MAMBA_EXTRACT_THREADS}"
+fi
+
+# ----------------------------------------------------------------------
+# |
+# |  Bootstrap the workspace (if requested)
+# |
+# ----------------------------------------------------------------------
+if [[ -n ${workspace_dir} ]]; then
+    _BootstrapWorkspace
+    exit $?
+fi
+
+# ----------------------------------------------------------------------
+# |
+# |  Initialize the micromamba shell
+# |
+# ----------------------------------------------------------------------
+if [[ ${is_system_python} -eq 0 ]]; then
+    _InitializeShell
+    error=$?
+
+    if [[ ${error} != 0 ]]; then
+        exit ${error}
+    fi
+fi
+
+# ----------------------------------------------------------------------
+# |
+# |  Activate the environment
+# |
+# ----------------------------------------------------------------------
+if [[ ${is_system_python} -eq 0 ]]; then
+    _ActivateEnvironment
+    error=$?
+
+    if [[ ${error} != 0 ]]; then
+        exit ${error}
+    fi
+fi
+
+# ----------------------------------------------------------------------
+# |
+# |  Remove the python virtual environment (if requested or out of date)
+# |
+# ----------------------------------------------------------------------
+_Event started venv
+_SetVenvFingerprint
+
+is_venv_current=0
+
+if [[ ${is_force_venv} -eq 0 ]] && [[ -f "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/BootstrapFingerprint" ]]; then
+    read -r existing_fingerprint < "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/BootstrapFingerprint"
+
+    if [[ "${existing_fingerprint}" == "${venv_fingerprint}" ]]; then
+        is_venv_current=1
+    fi
+fi
+
+if [[ ${is_venv_current} -eq 0 ]] && [[ -d "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}" ]]; then
+    echo "Removing the existing python virtual environment..."
+
+    _RemoveDirectory "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}" "${venv_trash_dir}"
+    error=$?
+
+    if [[ ${error} != 0 ]]; then
+        echo "[1ARemoving the existing python virtual environment...[31m[1mFAILED[0m."
+        echo ""
+
+        exit ${error}
+    fi
+
+    echo "[1ARemoving the existing python virtual environment...[32m[1mDONE[0m."
+fi
+
+# ----------------------------------------------------------------------
+# |
+# |  Create the python virtual environment (if necessary)
+# |
+# ----------------------------------------------------------------------
+echo "Creating the python virtual environment..."
+
+if [[ ${is_venv_current} -eq 1 ]]; then
+    echo "[1ACreating the python virtual environment...[32m[1mDONE[0m (already exists)."
+    _Event finished venv CACHED
+else
+    virtualenv_args=(
+        --no-periodic-update
+        --no-vcs-ignore
+        --verbose
+        --app-data "${virtualenv_app_data_dir}"
+    )
+
+    # Symlink the seed packages from the app-data directory rather than copying them (this isn't
+    # supported on Windows).
+    if [[ ${PLATFORM} != "win" ]]; then
+        virtualenv_args+=(--symlink-app-data)
+    fi
+
+    # The seed wheels are only refreshed when explicitly requested; otherwise, the previously
+    # extracted packages are reused as-is. Note that the app-data directory is never reset, as
+    # existing venvs (in this and other repositories) may have symlinks into it.
+    if [[ ${is_refresh_seed_wheels} -eq 1 ]]; then
+        virtualenv_args+=(--upgrade-embed-wheels)
+    fi
+
+    temp_output_name=$(mktemp BootstrapImpl.XXXXXX)
+
+    if [[ ${is_system_python} -eq 1 ]]; then
+        # virtualenv isn't available, so the standard library is used
+        "${system_python}" -m venv "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}" > "${temp_output_name}" 2>&1
+    else
+        virtualenv "${virtualenv_args[@]}" "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}" > "${temp_output_name}" 2>&1
+    fi
+    error=$?
+
+    if [[ ${error} != 0 ]]; then
+        echo "[1ACreating the python virtual environment...[31m[1mFAILED[0m."
+        echo ""
+
+        cat "${temp_output_name}"
+
+        rm "${temp_output_name}"
+        exit ${error}
+    fi
+
+    rm "${temp_output_name}"
+
+    echo "${venv_fingerprint}" > "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/BootstrapFingerprint"
+
+    echo "[1ACreating the python virtual environment...[32m[1mDONE[0m."
+    _Event finished venv DONE
+fi
+
+_RegisterVenv
+
+# ----------------------------------------------------------------------
+# |
+# |  Install the python helpers
+# |
+# ----------------------------------------------------------------------
+# This module is available to BootstrapEpilog.py (and any other python script run within the
+# environment) via "import PythonBootstrapperHelpers". It is written during every bootstrap so that
+# it is always consistent with this script.
+site_packages_dirs=("${PYTHON_BOOTSTRAPPER_GENERATED_DIR}"/lib/python*/site-packages)
+
+# The file may be a hardlink shared with other environments (see --dedupe), so it is replaced rather
+# than written in place.
+rm -f "${site_packages_dirs[0]}/PythonBootstrapperHelpers.py"
+
+# ----------------------------------------------------------------------
+cat <<'END_OF_CONTENT' > "${site_packages_dirs[0]}/PythonBootstrapperHelpers.py"
+# This file is generated during the Bootstrap process and is specific to your environment.
+# IT SHOULD NOT be added to your source control system.
+"""Functionality that simplifies the implementation of BootstrapEpilog.py files."""
+
+import hashlib
+import importlib.metadata
+import json
+import os
+import pstats
+import shutil
+import subprocess
+import sys
+import time
+
+from pathlib import Path
+from typing import List, Optional, Union
+
+
+# ----------------------------------------------------------------------
+def InstallRequirements(
+    *requirements_filenames: Union[Path, str],
+    install_args: Optional[List[str]] = None,
+    force: bool = False,
+) -> bool:
+    """Installs the requirements files unless they are unchanged since they were last installed.
+
+    The contents of the requirements files (and any files that they reference via -r or -c) are
+    hashed along with information about the python interpreter; installation is skipped when that
+    hash matches the one recorded by the previous installation. Packages are installed using a
+    cache shared by all repositories on this machine (via uv when it is available, as it
+    downloads packages in parallel; pip otherwise).
+
+    Returns True if the requirements were installed or False if they were already current. The
+    output of the installer is only displayed if the installation fails, in which case the process
+    exits with the installer's return code.
+    """
+
+    generated_dir = Path(os.environ["PYTHON_BOOTSTRAPPER_GENERATED_DIR"])
+    cache_dir = Path(os.environ["PYTHON_BOOTSTRAPPER_CACHE_DIR"])
+    record_filename = generated_dir / "InstalledRequirements.json"
+
+    requirements_paths = [Path(filename).resolve() for filename in requirements_filenames]
+    install_args = install_args or []
+
+    fingerprint = _CalculateFingerprint(requirements_paths, install_args)
+
+    if not force and record_filename.is_file():
+        try:
+            record = json.loads(record_filename.read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            record = {}
+
+        if record.get("fingerprint") == fingerprint:
+            print(
+                "Requirements are current ({}).".format(
+                    ", ".join(p.name for p in requirements_paths)
+                )
+            )
+            return False
+
+    # Remove the record before installing so that a failed installation isn't considered current
+    if record_filename.is_file():
+        record_filename.unlink()
+
+    requirements_args: List[str] = []
+
+    for requirements_path in requirements_paths:
+        requirements_args += ["-r", str(requirements_path)]
+
+    env = dict(os.environ)
+
+    uv = shutil.which("uv")
+    if uv is not None:
+        env["UV_CACHE_DIR"] = str(cache_dir / "uv")
+        command_line = [uv, "pip", "install", "--python", sys.executable]
+    else:
+        env["PIP_CACHE_DIR"] = str(cache_dir / "pip")
+        command_line = [sys.executable, "-m", "pip", "install", "--disable-pip-version-check"]
+
+    result = subprocess.run(
+        command_line + requirements_args + install_args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        env=env,
+    )
+
+    if result.returncode != 0:
+        sys.stdout.flush()
+        sys.stdout.buffer.write(result.stdout)
+        sys.stdout.flush()
+
+        print(
+            "ERROR: The requirements could not be installed ({}).".format(
+                ", ".join(p.name for p in requirements_paths)
+            ),
+            file=sys.stderr,
+        )
+        sys.exit(result.returncode)
+
+    record_filename.write_text(
+        json.dumps(
+            {
+                "fingerprint": fingerprint,
+                "requirements": [str(p) for p in requirements_paths],
+                "installed": sorted(
+                    "{}=={}".format(dist.metadata["Name"], dist.version)
+                    for dist in importlib.metadata.distributions()
+                ),
+            },
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
+
+    return True
+
+
+# ----------------------------------------------------------------------
+class EnvironmentDelta(object):
+    """Records changes to environment variables and aliases that are applied by the caller.
+
+    Changes recorded by BootstrapEpilog.py (or a BootstrapEpilog.d task) are saved and applied each
+    time that the environment is activated (and reverted when it is deactivated); changes recorded
+    by ActivateEpilog.py or DeactivateEpilog.py are applied immediately. This is an alternative to
+    writing shell commands to the file provided on the command line.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        filename = os.getenv("PYTHON_BOOTSTRAPPER_ENVIRONMENT_DELTA")
+        if not filename:
+            raise RuntimeError("Environment deltas are not supported in this context.")
+
+        self._filename = Path(filename)
+
+    # ----------------------------------------------------------------------
+    def Set(self, name: str, value: Union[Path, str]) -> None:
+        self._Write("set", name, str(value))
+
+    # ----------------------------------------------------------------------
+    def Unset(self, name: str) -> None:
+        self._Write("unset", name)
+
+    # ----------------------------------------------------------------------
+    def PrependPath(self, name: str, value: Union[Path, str]) -> None:
+        self._Write("prepend_path", name, str(value))
+
+    # ----------------------------------------------------------------------
+    def AppendPath(self, name: str, value: Union[Path, str]) -> None:
+        self._Write("append_path", name, str(value))
+
+    # ----------------------------------------------------------------------
+    def Alias(self, name: str, value: str) -> None:
+        self._Write("alias", name, value)
+
+    # ----------------------------------------------------------------------
+    # ----------------------------------------------------------------------
+    def _Write(self, action: str, name: str, value: str = "") -> None:
+        if not name.isidentifier():
+            raise ValueError("'{}' is not a valid name.".format(name))
+
+        if "\t" in value or "\n" in value:
+            raise ValueError("The value for '{}' cannot contain tabs or newlines.".format(name))
+
+        with self._filename.open("a", encoding="utf-8") as f:
+            f.write("{}\t{}\t{}\n".format(action, name, value))
+
+
+# ----------------------------------------------------------------------
+def ProfileEpilog(
+    output_dir: Union[Path, str],
+    script_filename: Union[Path, str],
+    *args: str,
+) -> int:
+    """Runs a python epilog under cProfile and "-X importtime".
+
+    The reports are written to output_dir (<script name>.pstats and <script name>.importtime.txt)
+    and a summary of the most expensive functions and imports is displayed once the script
+    completes. Returns the script's exit code.
+    """
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    script_name = Path(script_filename).stem
+    pstats_filename = output_dir / "{}.pstats".format(script_name)
+    importtime_filename = output_dir / "{}.importtime.txt".format(script_name)
+
+    start_time = time.perf_counter()
+
+    with importtime_filename.open("w", encoding="utf-8") as importtime_file:
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "-X",
+                "importtime",
+                "-m",
+                "cProfile",
+                "-o",
+                str(pstats_filename),
+                str(script_filename),
+                *args,
+            ],
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+
+        assert process.stderr is not None
+
+        # Separate the import times from the script's own error output
+        for line in process.stderr:
+            if line.startswith("import time:"):
+                importtime_file.write(line)
+            else:
+                sys.stderr.write(line)
+
+        result = process.wait()
+
+    print(
+        "\nProfile of {} ({:.2f}s; reports in {}):".format(
+            Path(script_filename).name, time.perf_counter() - start_time, output_dir
+        )
+    )
+
+    if pstats_filename.is_file():
+        stats = pstats.Stats(str(pstats_filename)).stats  # type: ignore[attr-defined]
+
+        print("    Functions (by self time):")
+        for (filename, line_number, function_name), data in sorted(
+            stats.items(), key=lambda item: item[1][2], reverse=True
+        )[:5]:
+            print(
+                "        {:8.3f}s  {}:{}({})".format(
+                    data[2], Path(filename).name, line_number, function_name
+                )
+            )
+
+    # Lines are "import time: <self us> | <cumulative us> | <indented module name>"; modules
+    # imported by cProfile itself are excluded.
+    profiler_modules = set(["_lsprof", "cProfile", "optparse", "profile", "pstats", "runpy"])
+    imports = []
+
+    for line in importtime_filename.read_text(encoding="utf-8").splitlines()[1:]:
+        parts = line.split("|")
+        if (
+            len(parts) == 3
+            and not parts[2].startswith("  ")
+            and parts[2].strip() not in profiler_modules
+        ):
+            imports.append((int(parts[1]), parts[2].strip()))
+
+    print("    Top-level imports (by cumulative time):")
+    for cumulative_us, module_name in sorted(imports, reverse=True)[:5]:
+        print("        {:8.3f}s  {}".format(cumulative_us / 1000000, module_name))
+
+    print("")
+
+    return result
+
+
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+def _CalculateFingerprint(
+    requirements_paths: List[Path],
+    install_args: List[str],
+) -> str:
+    hasher = hashlib.sha256()
+
+    hasher.update(sys.version.encode("utf-8"))
+    hasher.update(sys.executable.encode("utf-8"))
+    hasher.update("\0".join(install_args).encode("utf-8"))
+
+    # The bootstrap fingerprint identifies the exact python build that the venv is based on
+    bootstrap_fingerprint = (
+        Path(os.environ["PYTHON_BOOTSTRAPPER_GENERATED_DIR"]) / "BootstrapFingerprint"
+    )
+    if bootstrap_fingerprint.is_file():
+        hasher.update(bootstrap_fingerprint.read_bytes())
+
+    visited = set()
+
+    # ----------------------------------------------------------------------
+    def Impl(path: Path) -> None:
+        if path in visited:
+            return
+
+        visited.add(path)
+
+        content = path.read_bytes()
+
+        hasher.update(str(path).encode("utf-8"))
+        hasher.update(content)
+
+        for line in content.decode("utf-8").splitlines():
+            parts = line.strip().split(maxsplit=1)
+
+            if len(parts) == 2 and parts[0] in ["-r", "--requirement", "-c", "--constraint"]:
+                Impl((path.parent / parts[1]).resolve())
+
+    # ----------------------------------------------------------------------
+
+    for requirements_path in requirements_paths:
+        Impl(requirements_path)
+
+    return hasher.hexdigest()
+
+
+# ----------------------------------------------------------------------
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] != "ProfileEpilog":
+        sys.stderr.write("Usage: {} ProfileEpilog <output dir> <script> [args]\n".format(__file__))
+        sys.exit(-1)
+
+    sys.exit(ProfileEpilog(*sys.argv[2:]))
+END_OF_CONTENT
+# ----------------------------------------------------------------------
+
+# ----------------------------------------------------------------------
+# |
+# |  Invoke custom functionality (if necessary)
+# |
+# ----------------------------------------------------------------------
+# An epilog is skipped if it previously completed successfully with the same inputs (the manifests
+# are stored within the python virtual environment, so all epilogs run when it is recreated).
+if [[ -f "BootstrapEpilog.sh" ]] || [[ -f "BootstrapEpilog.py" ]] || [[ -d "BootstrapEpilog.d" ]]; then
+    # ----------------------------------------------------------------------
+    # |  Activate the python library
+    source "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/bin/activate"
+    echo ""
+
+    if [[ -f "BootstrapEpilog.sh" ]]; then
+        _Event started "epilog:BootstrapEpilog.sh"
+        _SetEpilogManifest BootstrapEpilog.sh
+
+        if _IsEpilogCurrent BootstrapEpilog.sh; then
+            echo "BootstrapEpilog.sh is current and was not run (use --rerun-epilogs to run it)."
+            _Event finished "epilog:BootstrapEpilog.sh" CACHED
+        else
+            rm -f "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/EpilogManifests/BootstrapEpilog.sh"
+            _ResetEnvironmentDelta BootstrapEpilog.sh
+
+            PYTHON_BOOTSTRAPPER_ENVIRONMENT_DELTA=${epilog_environment_delta} ./BootstrapEpilog.sh
+            error=$?
+
+            if [[ ${error} != 0 ]]; then
+                echo "[31m[1mERROR: [0mBootstrapEpilog.sh failed."
+                exit ${error}
+            fi
+
+            _SaveEpilogManifest BootstrapEpilog.sh
+            _Event finished "epilog:BootstrapEpilog.sh" DONE
+        fi
+    fi
+
+    if [[ -f "BootstrapEpilog.py" ]]; then
+        _Event started "epilog:BootstrapEpilog.py"
+        _SetEpilogManifest BootstrapEpilog.py
+
+        if _IsEpilogCurrent BootstrapEpilog.py; then
+            echo "BootstrapEpilog.py is current and was not run (use --rerun-epilogs to run it)."
+            _Event finished "epilog:BootstrapEpilog.py" CACHED
+        else
+            rm -f "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/EpilogManifests/BootstrapEpilog.py"
+            _ResetEnvironmentDelta BootstrapEpilog.py
+
+            PYTHON_BOOTSTRAPPER_ENVIRONMENT_DELTA=${epilog_environment_delta} _RunPythonEpilog BootstrapEpilog.py BootstrapEpilog_py.sh "${command_line_args[@]}"
+            error=$?
+
+            if [[ ${error} != 0 ]]; then
+                echo "[31m[1mERROR: [0mBootstrapEpilog.py failed."
+                ! [[ -f "BootstrapEpilog_py.sh" ]] || rm "BootstrapEpilog_py.sh"
+                exit ${error}
+            fi
+
+            if [[ -f "BootstrapEpilog_py.sh" ]]; then
+                chmod u+x "BootstrapEpilog_py.sh"
+
+                ./BootstrapEpilog_py.sh
+                error=$?
+
+                rm "BootstrapEpilog_py.sh"
+
+                if [[ ${error} != 0 ]]; then
+                    echo "[31m[1mERROR: [0mExecuting the BootstrapEpilog.py output failed."
+                    exit ${error}
+                fi
+            fi
+
+            _SaveEpilogManifest BootstrapEpilog.py
+            _Event finished "epilog:BootstrapEpilog.py" DONE
+        fi
+    fi
+
+    if [[ -d "BootstrapEpilog.d" ]]; then
+        _RunEpilogTasks
+        error=$?
 
-        rm "${temp_output_name}"
-        exit ${error}
+        [[ ${error} == 0 ]] || exit ${error}
     fi
+
+    deactivate
 fi
 
+_SaveActivateEnvironmentDelta
+
 # ----------------------------------------------------------------------
 # |
-# |  Initialize the micromamba shell
+# |  Deduplicate site-packages (if requested)
 # |
 # ----------------------------------------------------------------------
-_InitializeShell
-error=$?
-
-if [[ ${error} != 0 ]]; then
-    exit ${error}
+if [[ ${is_dedupe} -eq 1 ]]; then
+    # This happens before precompilation, as a file replaced by a link has the modification time of
+    # the linked file and its bytecode must be compiled again.
+    _RunDeduplication "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}"
 fi
 
+
 # ----------------------------------------------------------------------
 # |
-# |  Activate the environment
+# |  Precompile python bytecode (if requested)
 # |
 # ----------------------------------------------------------------------
-_ActivateEnvironment
-error=$?
+if [[ ${is_precompile} -eq 1 ]]; then
+    # Compile site-packages and any source directories provided so that the first import of each
+    # module doesn't pay the cost. Files whose bytecode is current are skipped, and the work is
+    # distributed across one process per processor.
+    echo "Precompiling python bytecode..."
+    _Event started precompile
 
-if [[ ${error} != 0 ]]; then
-    exit ${error}
-fi
+    compile_dirs=("${PYTHON_BOOTSTRAPPER_GENERATED_DIR}"/lib/python*/site-packages "${precompile_dirs[@]}")
+    start_seconds=${SECONDS}
 
-# ----------------------------------------------------------------------
-# |
-# |  Remove the python virtual environment (if necessary)
-# |
-# ----------------------------------------------------------------------
-if [[ -d "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}" ]]; then
-    echo "Removing the existing python virtual environment..."
+    temp_output_name=$(mktemp BootstrapImpl.XXXXXX)
 
-    rm -rf "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}"
+    "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/bin/python" -m compileall -q -j 0 "${compile_dirs[@]}" > "${temp_output_name}" 2>&1
     error=$?
 
+    # Packages frequently include files that aren't valid for the current version of python (for
+    # example, test data), so compilation errors are displayed but don't fail the bootstrap.
     if [[ ${error} != 0 ]]; then
-        echo "[1ARemoving the existing python virtual environment...[31m[1mFAILED[0m."
+        echo "[1APrecompiling python bytecode...[33m[1mDONE[0m ($((SECONDS - start_seconds))s; some files could not be compiled)."
+        _Event finished precompile DONE "some files could not be compiled"
         echo ""
 
-        exit ${error}
+        cat "${temp_output_name}"
+    else
+        echo "[1APrecompiling python bytecode...[32m[1mDONE[0m ($((SECONDS - start_seconds))s)."
+        _Event finished precompile DONE
     fi
 
-    echo "[1ARemoving the existing python virtual environment...[32m[1mDONE[0m."
+    rm "${temp_output_name}"
 fi
 
 # ----------------------------------------------------------------------
 # |
-# |  Create the python virtual environment
+# |  Write the environment manifest
 # |
 # ----------------------------------------------------------------------
-echo "Creating the python virtual environment..."
+# Tools can read this file to get information about the environment without starting python
+if [[ ${is_system_python} -eq 1 ]]; then
+    manifest_env_dir=""
+    manifest_base_interpreter=${system_python}
+else
+    manifest_env_dir="${HOME}/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}"
+    manifest_base_interpreter="${manifest_env_dir}/bin/python"
+fi
 
 temp_output_name=$(mktemp BootstrapImpl.XXXXXX)
 
-virtualenv --no-periodic-update --no-vcs-ignore --verbose "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}" > "${temp_output_name}" 2>&1
+"${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/bin/python" - "${script_version}" "${venv_fingerprint}" "${PLATFORM}-${ARCH}" "${manifest_env_dir}" "${manifest_base_interpreter}" > "${temp_output_name}" 2>&1 <<'END_OF_CONTENT'
+import hashlib
+import importlib.metadata
+import json
+import os
+import platform
+import sys
+import sysconfig
+
+from pathlib import Path
+
+script_version, venv_fingerprint, platform_name, env_dir, base_interpreter = sys.argv[1:]
+
+# env_dir is empty when the python virtual environment is based on a system python interpreter
+env_dir = Path(env_dir) if env_dir else None
+repo_dir = Path(os.environ["PYTHON_BOOTSTRAPPER_ACTIVATION_DIR"])
+generated_dir = Path(os.environ["PYTHON_BOOTSTRAPPER_GENERATED_DIR"])
+epilog_manifests_dir = generated_dir / "EpilogManifests"
+
+python_builds = sorted((env_dir / "conda-meta").glob("python-[0-9]*.json")) if env_dir else []
+
+manifest = {
+    "script_version": script_version,
+    "platform": platform_name,
+    "python_version": platform.python_version(),
+    "python_build": python_builds[0].stem if python_builds else None,
+    "interpreter": str(generated_dir / "bin" / "python"),
+    "base_interpreter": base_interpreter,
+    "micromamba_environment": str(env_dir) if env_dir else None,
+    "venv": str(generated_dir),
+    "venv_fingerprint": venv_fingerprint,
+    "site_packages": sorted(set([sysconfig.get_paths()["purelib"], sysconfig.get_paths()["platlib"]])),
+    # Manifests for epilogs that no longer exist in the repository are ignored
+    "epilogs": {
+        path.relative_to(epilog_manifests_dir).as_posix(): hashlib.sha256(path.read_bytes()).hexdigest()
+        for path in sorted(epilog_manifests_dir.rglob("*"))
+        if path.is_file() and (repo_dir / path.relative_to(epilog_manifests_dir)).is_file()
+    },
+    # Distributions with invalid metadata don't have a name
+    "packages": sorted(
+        (
+            {"name": dist.metadata["Name"], "version": dist.version}
+            for dist in importlib.metadata.distributions()
+            if dist.metadata["Name"] is not None
+        ),
+        key=lambda package: package["name"].lower(),
+    ),
+}
+
+manifest_filename = generated_dir / "EnvironmentManifest.json"
+temp_filename = manifest_filename.with_suffix(".tmp")
+
+temp_filename.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+os.replace(temp_filename, manifest_filename)
+END_OF_CONTENT
 error=$?
 
+# The environment is valid without the manifest, so errors are displayed but don't fail the bootstrap
 if [[ ${error} != 0 ]]; then
-    echo "[1ACreating the python virtual environment...[31m[1mFAILED[0m."
+    echo "Writing the environment manifest...[33m[1mFAILED[0m (the environment is valid, but EnvironmentManifest.json is not available)."
     echo ""
 
     cat "${temp_output_name}"
 
-    rm "${temp_output_name}"
-    exit ${error}
+    # A manifest from a previous bootstrap would describe a different environment
+    rm -f "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/EnvironmentManifest.json" "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/EnvironmentManifest.tmp"
 fi
 
 rm "${temp_output_name}"
-echo "[1ACreating the python virtual environment...[32m[1mDONE[0m."
+
+echo ""
 
 # ----------------------------------------------------------------------
 # |
-# |  Invoke custom functionality (if necessary)
+# |  Create Activate.sh and Deactivate.sh
 # |
 # ----------------------------------------------------------------------
-if [[ -f "BootstrapEpilog.sh" ]] || [[ -f "BootstrapEpilog.py" ]]; then
-    # ----------------------------------------------------------------------
-    # |  Activate the python library
-    source "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/bin/activate"
-    echo ""
+echo "Creating Activate.sh..."
+_Event started activation_scripts
 
-    if [[ -f "BootstrapEpilog.sh" ]]; then
-        ./BootstrapEpilog.sh
-        error=$?
+env_dir="${HOME}/micromamba/envs/Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}"
 
-        if [[ ${error} != 0 ]]; then
-            echo "[31m[1mERROR: [0mBootstrapEpilog.sh failed."
-            exit ${error}
-        fi
-    fi
+# The generated scripts don't use micromamba when the python virtual environment is based on a
+# system python interpreter.
+if [[ ${is_system_python} -eq 1 ]]; then
+    activate_environment_content=$(cat <<END_OF_CONTENT
+# The python virtual environment is based on a system python interpreter (${system_python})
+if [[ \${_PYTHON_BOOTSTRAPPER_IS_SWITCHING} == "micromamba" ]]; then
+    # Switch.sh has deactivated everything but the micromamba environment of the previous version
+    micromamba deactivate || return \$?
+    _PythonBootstrapperProfileStep "micromamba deactivate"
+fi
 
-    if [[ -f "BootstrapEpilog.py" ]]; then
-        python BootstrapEpilog.py BootstrapEpilog_py.sh "${command_line_args[@]}"
-        error=$?
+# Get the original prompt before it is decorated
+original_prompt=\${PS1}
+END_OF_CONTENT
+)
 
-        if [[ ${error} != 0 ]]; then
-            echo "[31m[1mERROR: [0mBootstrapEpilog.py failed."
-            ! [[ -f "BootstrapEpilog_py.sh" ]] || rm "BootstrapEpilog_py.sh"
-            exit ${error}
-        fi
+    deactivate_environment_content=$(cat <<END_OF_CONTENT
+# Switch.sh activates another version within the same directory
+[[ -z \${_PYTHON_BOOTSTRAPPER_IS_SWITCHING} ]] || return 0
+END_OF_CONTENT
+)
 
-        if [[ -f "BootstrapEpilog_py.sh" ]]; then
-            chmod u+x "BootstrapEpilog_py.sh"
+    run_environment_content=""
+    run_path="${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/bin"
+    activate_failure_content=""
+    archived_dirs=("${PYTHON_BOOTSTRAPPER_GENERATED_DIR}")
+else
+    activate_environment_content=$(cat <<END_OF_CONTENT
+if [[ \${_PYTHON_BOOTSTRAPPER_IS_SWITCHING} != "micromamba" ]]; then
+    export MAMBA_ROOT_PREFIX=~/micromamba
+    eval "\$(~/.local/bin/micromamba shell hook --shell bash)" || return \$?
+    _PythonBootstrapperProfileStep "micromamba shell hook"
 
-            ./BootstrapEpilog_py.sh
-            error=$?
+    # Get the original prompt before it is decorated
+    original_prompt=\${PS1}
+
+    micromamba activate "Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}" || return \$?
+    _PythonBootstrapperProfileStep "micromamba activate"
+else
+    # Switch.sh has deactivated everything but the micromamba environment of the previous version;
+    # replace that environment in place rather than invoking micromamba to deactivate and activate it.
+    original_prompt=\${PS1#"\${CONDA_PROMPT_MODIFIER}"}
+
+    for conda_script in "\${CONDA_PREFIX}/etc/conda/deactivate.d"/*.sh; do
+        [[ ! -f "\${conda_script}" ]] || source "\${conda_script}" || return \$?
+    done
+
+    PATH=":\${PATH}:"
+    PATH=\${PATH/":\${CONDA_PREFIX}/bin:"/":${env_dir}/bin:"}
+    PATH=\${PATH#:}
+    export PATH=\${PATH%:}
+
+    export CONDA_PREFIX="${env_dir}"
+    export CONDA_DEFAULT_ENV="Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}"
+    export CONDA_PROMPT_MODIFIER="(Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}) "
+    PS1="\${CONDA_PROMPT_MODIFIER}\${original_prompt}"
+
+    for conda_script in "${env_dir}/etc/conda/activate.d"/*.sh; do
+        [[ ! -f "\${conda_script}" ]] || source "\${conda_script}" || return \$?
+    done
+
+    hash -r
+    _PythonBootstrapperProfileStep "micromamba environment switch"
+fi
+END_OF_CONTENT
+)
 
-            rm "BootstrapEpilog_py.sh"
+    deactivate_environment_content=$(cat <<END_OF_CONTENT
+# Switch.sh activates another version within the same directory, and the Activate script for that
+# version replaces (or deactivates) this micromamba environment.
+if [[ -n \${_PYTHON_BOOTSTRAPPER_IS_SWITCHING} ]]; then
+    _PYTHON_BOOTSTRAPPER_IS_SWITCHING="micromamba"
+    return 0
+fi
 
-            if [[ ${error} != 0 ]]; then
-                echo "[31m[1mERROR: [0mExecuting the BootstrapEpilog.py output failed."
-                exit ${error}
+micromamba deactivate || return \$?
+END_OF_CONTENT
+)
+
+    run_environment_content=$(cat <<END_OF_CONTENT
+# micromamba activate
+export MAMBA_ROOT_PREFIX="${HOME}/micromamba"
+export CONDA_PREFIX="${env_dir}"
+export CONDA_DEFAULT_ENV="Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}"
+export CONDA_SHLVL=1
+export CONDA_PROMPT_MODIFIER="(Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}) "
+
+for activate_script in "${env_dir}/etc/conda/activate.d"/*.sh; do
+    [[ ! -f "\${activate_script}" ]] || source "\${activate_script}" || exit \$?
+done
+
+END_OF_CONTENT
+)
+
+    run_path="${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/bin:${env_dir}/bin"
+    activate_failure_content=$'\n    micromamba deactivate || return $?'
+    archived_dirs=("${env_dir}" "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}")
+fi
+
+# Restore the environments if they were archived by 'Bootstrap.sh --gc'
+activate_restore_content=$(printf '_PythonBootstrapperRestoreArchive "%s" || return $?\n' "${archived_dirs[@]}")
+run_restore_content=$(printf '_PythonBootstrapperRestoreArchive "%s" >&2 || exit $?\n' "${archived_dirs[@]}")
+
+# Applies (or reverts) environment deltas written by epilogs. Each line of a delta file is
+# "<action>\t<name>\t<value>", where <action> is set, unset, prepend_path, append_path, or alias.
+# When <mode> is "record", the values that the names had before the delta was applied are saved in
+# _PYTHON_BOOTSTRAPPER_SAVED_<name> variables ("+<value>", or "-" when the name was not defined) so
+# that "revert" can restore them. This function is included in both Activate.sh and Deactivate.sh
+# and must work in bash and zsh.
+environment_delta_function=$(cat <<'END_OF_CONTENT'
+function _PythonBootstrapperApplyEnvironmentDelta() {
+    local delta_filename=$1
+    local mode=$2
+    local action
+    local name
+    local value
+    local current_value
+    local saved_name
+    local saved_value
+    local saved_names=()
+    local prefix
+
+    [[ -f "${delta_filename}" ]] || return 0
+
+    while IFS=$'\t' read -r action name value || [[ -n ${action} ]]; do
+        [[ -n ${action} ]] || continue
+
+        if ! [[ ${name} =~ ^[A-Za-z_][A-Za-z0-9_]*$ ]]; then
+            echo "[31m[1mERROR:[0m '${name}' is not a valid name (${delta_filename})."
+            return 1
+        fi
+
+        eval "current_value=\"\${${name}}\""
+
+        if [[ ${action} == alias ]]; then
+            saved_name="_PYTHON_BOOTSTRAPPER_SAVED_ALIAS_${name}"
+        else
+            saved_name="_PYTHON_BOOTSTRAPPER_SAVED_${name}"
+        fi
+
+        eval "saved_value=\"\${${saved_name}}\""
+
+        # Only the first change is recorded, as that is the value to restore
+        if [[ ${mode} == record && -z ${saved_value} ]]; then
+            if [[ ${action} == alias ]]; then
+                saved_value=$(alias "${name}" 2> /dev/null)
+                [[ -n ${saved_value} ]] && saved_value="+${saved_value#alias }" || saved_value=-
+            elif eval "[[ -n \${${name}+x} ]]"; then
+                saved_value="+${current_value}"
+            else
+                saved_value=-
             fi
+
+            eval "${saved_name}=\${saved_value}"
         fi
+
+        case "${action}" in
+            set|unset)
+                if [[ ${mode} != revert ]]; then
+                    if [[ ${action} == set ]]; then
+                        export "${name}=${value}"
+                    else
+                        unset "${name}"
+                    fi
+                elif [[ ${saved_value} == +* ]]; then
+                    export "${name}=${saved_value#+}"
+                elif [[ ${saved_value} == - ]]; then
+                    unset "${name}"
+                fi
+                ;;
+            prepend_path|append_path)
+                if [[ ${mode} == revert ]]; then
+                    # Remove the entry that was added, leaving any entries that were already present
+                    current_value=":${current_value}:"
+
+                    if [[ ${current_value} == *":${value}:"* ]]; then
+                        if [[ ${action} == prepend_path ]]; then
+                            current_value=${current_value/":${value}:"/:}
+                        else
+                            prefix=${current_value%":${value}:"*}
+                            current_value="${prefix}:${current_value##*":${value}:"}"
+                        fi
+                    fi
+
+                    current_value=${current_value#:}
+                    current_value=${current_value%:}
+
+                    if [[ -z ${current_value} && ${saved_value} == - ]]; then
+                        unset "${name}"
+                    else
+                        export "${name}=${current_value}"
+                    fi
+                elif [[ -z ${current_value} ]]; then
+                    export "${name}=${value}"
+                elif [[ ${action} == prepend_path ]]; then
+                    export "${name}=${value}:${current_value}"
+                else
+                    export "${name}=${current_value}:${value}"
+                fi
+                ;;
+            alias)
+                if [[ ${mode} != revert ]]; then
+                    alias "${name}=${value}"
+                elif [[ ${saved_value} == +* ]]; then
+                    eval "alias ${saved_value#+}"
+                elif [[ ${saved_value} == - ]]; then
+                    unalias "${name}" 2> /dev/null
+                fi
+                ;;
+            *)
+                echo "[31m[1mERROR:[0m '${action}' is not a valid action (${delta_filename})."
+                return 1
+                ;;
+        esac
+
+        saved_names+=("${saved_name}")
+    done < "${delta_filename}"
+
+    # The saved values are needed until all of the changes have been reverted, as multiple changes can
+    # be made to the same variable
+    if [[ ${mode} == revert ]]; then
+        for saved_name in "${saved_names[@]}"; do
+            unset "${saved_name}"
+        done
     fi
 
-    deactivate
-fi
+    return 0
+}
+END_OF_CONTENT
+)
 
-echo ""
+# Records the time taken by each activation step when PYTHON_BOOTSTRAPPER_PROFILE_ACTIVATION is set;
+# the breakdown is displayed and written to Generated/.../Profiles/Activate.txt once activation is
+# complete. Times are measured in microseconds via EPOCHREALTIME (bash 5+ and zsh), falling back to
+# date or perl on older shells.
+activation_profile_functions=$(cat <<'END_OF_CONTENT'
+function _PythonBootstrapperProfileTime() {
+    local now
 
-# ----------------------------------------------------------------------
-# |
-# |  Create Activate.sh and Deactivate.sh
-# |
-# ----------------------------------------------------------------------
-echo "Creating Activate.sh..."
+    [[ -z ${ZSH_VERSION} ]] || zmodload zsh/datetime 2> /dev/null
+
+    if [[ -n ${EPOCHREALTIME} ]]; then
+        echo "${EPOCHREALTIME//[^0-9]/}"
+        return 0
+    fi
+
+    now=$(date +%s%N)
+
+    if [[ ${now} =~ ^[0-9]+$ ]]; then
+        echo $((now / 1000))
+    else
+        perl -MTime::HiRes=time -e 'printf("%d\n", time() * 1000000)'
+    fi
+}
+
+function _PythonBootstrapperProfileStep() {
+    [[ ${PYTHON_BOOTSTRAPPER_PROFILE_ACTIVATION} == "1" ]] || return 0
+
+    local step_name=$1
+    local now
+    local elapsed
+
+    now=$(_PythonBootstrapperProfileTime)
+
+    if [[ -z ${step_name} ]]; then
+        _python_bootstrapper_profile_start=${now}
+        _python_bootstrapper_profile_results=""
+    else
+        elapsed=$((now - _python_bootstrapper_profile_previous))
+        _python_bootstrapper_profile_results="${_python_bootstrapper_profile_results}$(printf "%8d.%03dms  %s" $((elapsed / 1000)) $((elapsed % 1000)) "${step_name}")"$'\n'
+    fi
+
+    _python_bootstrapper_profile_previous=${now}
+}
+
+function _PythonBootstrapperDisplayProfile() {
+    [[ ${PYTHON_BOOTSTRAPPER_PROFILE_ACTIVATION} == "1" ]] || return 0
+
+    local elapsed=$((_python_bootstrapper_profile_previous - _python_bootstrapper_profile_start))
+
+    _python_bootstrapper_profile_results="${_python_bootstrapper_profile_results}$(printf "%8d.%03dms  %s" $((elapsed / 1000)) $((elapsed % 1000)) "Total")"$'\n'
+
+    mkdir -p "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/Profiles"
+    printf "%s" "${_python_bootstrapper_profile_results}" > "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/Profiles/Activate.txt"
+
+    echo ""
+    echo "Activation profile:"
+    printf "%s" "${_python_bootstrapper_profile_results}"
+
+    unset _python_bootstrapper_profile_start
+    unset _python_bootstrapper_profile_previous
+    unset _python_bootstrapper_profile_results
+}
+END_OF_CONTENT
+)
+
+# Runs a python epilog, profiling it when PYTHON_BOOTSTRAPPER_PROFILE_EPILOGS is set. This function is
+# included in both Activate.sh and Deactivate.sh.
+python_epilog_function=$(cat <<'END_OF_CONTENT'
+function _PythonBootstrapperRunPythonEpilog() {
+    if [[ ${PYTHON_BOOTSTRAPPER_PROFILE_EPILOGS} == "1" ]]; then
+        python -m PythonBootstrapperHelpers ProfileEpilog "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/Profiles" "$@"
+    else
+        python "$@"
+    fi
+}
+END_OF_CONTENT
+)
 
 # ----------------------------------------------------------------------
 cat <<END_OF_CONTENT > Activate${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}.sh
 #!/usr/bin/env bash
+# PythonBootstrapper ${script_version}: ${venv_fingerprint}
 
 # This file is generated during the Bootstrap process and is specific to your environment.
 # IT SHOULD NOT be added to your source control system.
@@ -584,21 +3682,33 @@ if [[ ! -z \${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION} ]] && [[ "\${PYTHON_BOOTST
     return 1
 fi
 
-pushd "${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}" > /dev/null || return \$?
+${activation_profile_functions}
 
-export MAMBA_ROOT_PREFIX=~/micromamba
-eval "\$(~/.local/bin/micromamba shell hook --shell bash)" || return \$?
+_PythonBootstrapperProfileStep
 
-# Get the original prompt before it is decorated
-original_prompt=\${PS1}
+${restore_archive_function}
+
+${activate_restore_content}
+_PythonBootstrapperProfileStep "restore archives"
+
+if [[ -z \${_PYTHON_BOOTSTRAPPER_IS_SWITCHING} ]]; then
+    pushd "${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}" > /dev/null || return \$?
+    _PythonBootstrapperProfileStep "pushd"
+fi
+
+${activate_environment_content}
 
-micromamba activate "Python${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}" || return \$?
 source "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/bin/activate" || return \$?
+_PythonBootstrapperProfileStep "python virtual environment activate"
 
 export PYTHON_BOOTSTRAPPER_ACTIVATION_DIR="${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}"
 export PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION="${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}"
 export PYTHON_BOOTSTRAPPER_GENERATED_DIR="${PYTHON_BOOTSTRAPPER_GENERATED_DIR}"
 
+${environment_delta_function}
+
+${python_epilog_function}
+
 function Execute() {
     # Set the prompt
     if [[ -z \${_PYTHON_ENVIRONMENT_IS_ACTIVATED} ]]; then
@@ -608,6 +3718,10 @@ function Execute() {
         PS1="\${original_prompt}"
     fi
 
+    # Apply the changes recorded by the bootstrap epilogs
+    _PythonBootstrapperApplyEnvironmentDelta "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/Activate.delta" record || return \$?
+    _PythonBootstrapperProfileStep "bootstrap environment delta"
+
     if [[ -f "ActivateEpilog.sh" ]]; then
         source ./ActivateEpilog.sh "\$@"
         error=\$?
@@ -616,11 +3730,14 @@ function Execute() {
             echo "[31m[1mERROR: [0mActivateEpilog.sh failed."
             return \${error}
         fi
+
+        _PythonBootstrapperProfileStep "ActivateEpilog.sh"
     fi
 
     if [[ -f "ActivateEpilog.py" ]]; then
         # Create the instructions
-        python ActivateEpilog.py ActivateEpilog_py.sh "\$@"
+        rm -f "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/ActivateEpilog.delta"
+        PYTHON_BOOTSTRAPPER_ENVIRONMENT_DELTA="${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/ActivateEpilog.delta" _PythonBootstrapperRunPythonEpilog ActivateEpilog.py ActivateEpilog_py.sh "\$@"
         error=\$?
 
         if [[ \${error} != 0 ]]; then
@@ -643,6 +3760,9 @@ function Execute() {
                 return \${error}
             fi
         fi
+
+        _PythonBootstrapperApplyEnvironmentDelta "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/ActivateEpilog.delta" || return \$?
+        _PythonBootstrapperProfileStep "ActivateEpilog.py"
     fi
 
     return 0
@@ -656,12 +3776,17 @@ if [[ \${error} != 0 ]]; then
     unset PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION
     unset PYTHON_BOOTSTRAPPER_ACTIVATION_DIR
 
-    deactivate || return \$?
-    micromamba deactivate || return \$?
+    deactivate || return \$?${activate_failure_content}
 
     return \${error}
 fi
 
+# Used by 'Bootstrap.sh --gc' to determine when the environment was last used
+touch "${registry_filename}" 2> /dev/null
+_PythonBootstrapperProfileStep "registry"
+
+_PythonBootstrapperDisplayProfile
+
 echo ""
 echo "[61m[1m${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}[0m has been [32m[1mactivated[0m."
 echo ""
@@ -683,6 +3808,7 @@ echo "Creating Deactivate.sh..."
 # ----------------------------------------------------------------------
 cat <<END_OF_CONTENT > Deactivate${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}.sh
 #!/usr/bin/env bash
+# PythonBootstrapper ${script_version}: ${venv_fingerprint}
 
 # This file is generated during the Bootstrap process and is specific to your environment.
 # IT SHOULD NOT be added to your source control system.
@@ -734,6 +3860,10 @@ if [[ "\${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}" != "${PYTHON_BOOTSTRAPPER_ACT
     return 1
 fi
 
+${environment_delta_function}
+
+${python_epilog_function}
+
 if [[ -f "DeactivateEpilog.sh" ]]; then
     source ./DeactivateEpilog.sh
     error=\$?
@@ -746,7 +3876,8 @@ fi
 
 if [[ -f "DeactivateEpilog.py" ]]; then
     # Create the instructions
-    python DeactivateEpilog.py DeactivateEpilog_py.sh "\$@"
+    rm -f "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/DeactivateEpilog.delta"
+    PYTHON_BOOTSTRAPPER_ENVIRONMENT_DELTA="${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/DeactivateEpilog.delta" _PythonBootstrapperRunPythonEpilog DeactivateEpilog.py DeactivateEpilog_py.sh "\$@"
     error=\$?
 
     if [[ \${error} != 0 ]]; then
@@ -769,18 +3900,24 @@ if [[ -f "DeactivateEpilog.py" ]]; then
             return \${error}
         fi
     fi
+
+    _PythonBootstrapperApplyEnvironmentDelta "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/DeactivateEpilog.delta" || return \$?
 fi
 
-deactivate # Python virtualenv || return \$?
-micromamba deactivate || return \$?
+# Revert the changes recorded by the bootstrap epilogs
+_PythonBootstrapperApplyEnvironmentDelta "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/Activate.delta" revert || return \$?
 
-popd >> /dev/null || return \$?
+deactivate # Python virtualenv || return \$?
 
 unset _PYTHON_ENVIRONMENT_IS_ACTIVATED
 unset PYTHON_BOOTSTRAPPER_GENERATED_DIR
 unset PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION
 unset PYTHON_BOOTSTRAPPER_ACTIVATION_DIR
 
+${deactivate_environment_content}
+
+popd >> /dev/null || return \$?
+
 echo ""
 echo "[61m[1m${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}[0m has been [31m[1mdeactivated[0m."
 echo ""
@@ -794,6 +3931,174 @@ ln Deactivate${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}.sh Deactivate.sh
 
 echo "[1ACreating Deactivate.sh...[32m[1mDONE[0m."
 
+# ----------------------------------------------------------------------
+# Run.sh applies the activated environment directly (without micromamba or the python virtual
+# environment's activate script) and then execs the command, so that it can be invoked frequently.
+cat <<END_OF_CONTENT > Run${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}.sh
+#!/usr/bin/env bash
+# PythonBootstrapper ${script_version}: ${venv_fingerprint}
+
+# This file is generated during the Bootstrap process and is specific to your environment.
+# IT SHOULD NOT be added to your source control system.
+
+# Runs a command within the environment without sourcing Activate.sh:
+#
+#     ./Run.sh python -m pytest
+#
+# ActivateEpilog scripts are not invoked; set PYTHON_BOOTSTRAPPER_RUN_ACTIVATE_EPILOG=1 to apply the
+# environment delta written by ActivateEpilog.py during the most recent activation.
+
+if [[ \$# -eq 0 ]]; then
+    echo "[31m[1mERROR:[0m Usage: \${0##*/} <command> [<arg>...]"
+    exit 1
+fi
+
+export PYTHON_BOOTSTRAPPER_ACTIVATION_DIR="${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}"
+export PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION="${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}"
+export PYTHON_BOOTSTRAPPER_GENERATED_DIR="${PYTHON_BOOTSTRAPPER_GENERATED_DIR}"
+export _PYTHON_ENVIRONMENT_IS_ACTIVATED=1
+
+${restore_archive_function}
+
+${run_restore_content}
+
+${run_environment_content}
+# Python virtual environment activate
+export VIRTUAL_ENV="${PYTHON_BOOTSTRAPPER_GENERATED_DIR}"
+export PATH="${run_path}\${PATH:+:\${PATH}}"
+unset PYTHONHOME
+
+${environment_delta_function}
+
+_PythonBootstrapperApplyEnvironmentDelta "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/Activate.delta" || exit \$?
+
+if [[ \${PYTHON_BOOTSTRAPPER_RUN_ACTIVATE_EPILOG} == "1" ]]; then
+    _PythonBootstrapperApplyEnvironmentDelta "${PYTHON_BOOTSTRAPPER_GENERATED_DIR}/ActivateEpilog.delta" || exit \$?
+fi
+
+exec "\$@"
+END_OF_CONTENT
+# ----------------------------------------------------------------------
+
+chmod u+x Run${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}.sh
+
+! [[ -f "Run.sh" ]] || rm "Run.sh"
+ln Run${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}.sh Run.sh
+
+# ----------------------------------------------------------------------
+# Switch.sh moves an activated terminal to another bootstrapped python version by running the
+# current version's Deactivate script and the new version's Activate script without leaving the
+# micromamba shell (see _PYTHON_BOOTSTRAPPER_IS_SWITCHING above).
+cat <<END_OF_CONTENT > Switch.sh
+#!/usr/bin/env bash
+# PythonBootstrapper ${script_version}
+
+# This file is generated during the Bootstrap process and is specific to your environment.
+# IT SHOULD NOT be added to your source control system.
+
+# Ensure that the script is being invoked via source (as it modifies the current environment)
+script_name=\${ZSH_ARGZERO}
+if [[ -z \${script_name} ]]; then
+    script_name=\${0##*/}
+fi
+
+if [[ \${script_name} == Switch.sh ]]
+then
+    echo ""
+    echo "[31m[1mERROR:[0m This script switches an activated terminal to a different python version."
+    echo "[31m[1mERROR:[0m"
+    echo "[31m[1mERROR:[0m Because this process makes changes to environment variables, it must be run within the current context."
+    echo "[31m[1mERROR:[0m To do this, please source (run) the script as follows:"
+    echo "[31m[1mERROR:[0m"
+    echo "[31m[1mERROR:[0m     source ./\${script_name} <python version>"
+    echo "[31m[1mERROR:[0m"
+    echo "[31m[1mERROR:[0m         - or -"
+    echo "[31m[1mERROR:[0m"
+    echo "[31m[1mERROR:[0m     . ./\${script_name} <python version>"
+    echo "[31m[1mERROR:[0m"
+    echo ""
+
+    # It's ok to use exit here, as the script wasn't sourced
+    exit 1
+fi
+
+if [[ \$# -eq 0 ]]; then
+    echo ""
+    echo "[31m[1mERROR:[0m Usage: source ./Switch.sh <python version> [<any repository-specific arguments>]"
+
+    return 1
+fi
+
+if [[ -z \${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR} ]]; then
+    echo ""
+    echo "[31m[1mERROR:[0m The environment has not been activated."
+
+    return 1
+fi
+
+if [[ "\${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}" != "${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}" ]]; then
+    echo ""
+    echo "[31m[1mERROR:[0m This environment was activated by \"\${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}\"."
+
+    return 1
+fi
+
+switch_version=\$1
+shift
+
+if [[ "\${switch_version}" == "\${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}" ]]; then
+    echo ""
+    echo "[61m[1m${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}[0m is already activated with python \${switch_version}."
+    echo ""
+
+    return 0
+fi
+
+# Both scripts must have been created by this version of PythonBootstrapper, as earlier versions
+# are not able to switch.
+for switch_script in "Deactivate\${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}.sh" "Activate\${switch_version}.sh"; do
+    switch_header=""
+
+    if [[ -f "${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}/\${switch_script}" ]]; then
+        { read -r; read -r switch_header; } < "${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}/\${switch_script}"
+    fi
+
+    if [[ "\${switch_header}" != "# PythonBootstrapper ${script_version}: "* ]]; then
+        echo ""
+        echo "[31m[1mERROR:[0m \"\${switch_script}\" does not exist or was created by a different version of PythonBootstrapper."
+        echo "[31m[1mERROR:[0m Please run 'Bootstrap.sh --python-version \${switch_version}' and try again."
+
+        unset switch_script switch_header switch_version
+        return 1
+    fi
+done
+
+unset switch_script switch_header
+
+pushd "${PYTHON_BOOTSTRAPPER_ACTIVATION_DIR}" > /dev/null || return \$?
+
+export _PYTHON_BOOTSTRAPPER_IS_SWITCHING=1
+
+source "./Deactivate\${PYTHON_BOOTSTRAPPER_ACTIVATION_VERSION}.sh" "\$@"
+error=\$?
+
+if [[ \${error} == 0 ]]; then
+    source "./Activate\${switch_version}.sh" "\$@"
+    error=\$?
+fi
+
+unset _PYTHON_BOOTSTRAPPER_IS_SWITCHING
+unset switch_version
+
+popd > /dev/null
+
+return \${error}
+END_OF_CONTENT
+
+chmod u+x Switch.sh
+
+_Event finished activation_scripts DONE
+
 # ----------------------------------------------------------------------
 # |
 # |  Final Output
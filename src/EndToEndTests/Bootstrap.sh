@@ -10,10 +10,73 @@
 # |
 # |      --force                         Ensure that a new python environment is installed, even if it already exists.
 # |
+# |      --force=<levels>                Recreate only the specified layers, where <levels> is a comma-delimited list of:
+# |                                          venv:        the python virtual environment in ./Generated
+# |                                          env:         the micromamba environment (and the python virtual environment)
+# |                                          micromamba:  the micromamba executable
+# |                                          all:         all of the above (equivalent to --force)
+# |
+# |      --upgrade                       Update an existing python environment to the latest patch release in place; the python virtual environment is only recreated if python changed.
+# |
+# |      --system-python                 Create the python virtual environment from a python interpreter that is already installed (found in
+# |                                      PYTHON_BOOTSTRAPPER_SYSTEM_PYTHON_DIRS or on the PATH) rather than a micromamba environment; micromamba is used if a
+# |                                      compatible interpreter can't be found.
+# |
+# |      --download-threads <count>      Number of threads used to download packages when creating the python environment; the default is based on the number of processors.
+# |
+# |      --extract-threads <count>       Number of threads used to extract packages when creating the python environment; the default is the number of processors.
+# |
+# |      --precompile                    Compile python bytecode for the packages installed in the python virtual environment.
+# |
+# |      --precompile-dir <dir>          Compile python bytecode for the files in <dir> (implies --precompile); may be provided multiple times.
+# |
+# |      --rerun-epilogs                 Run BootstrapEpilog scripts even if their inputs haven't changed since they last completed successfully.
+# |
+# |      --workspace <dir>               Bootstrap every repository under <dir> (any directory containing Bootstrap.sh or a BootstrapEpilog) rather than this
+# |                                      repository. Phases shared by all repositories run once, repositories are bootstrapped concurrently, and a summary is displayed.
+# |
+# |      --gc                            Display the disk usage of the micromamba environments and python virtual environments on this machine and remove
+# |                                      or archive those that haven't been used recently (see PYTHON_BOOTSTRAPPER_GC_MAX_AGE, PYTHON_BOOTSTRAPPER_GC_MAX_SIZE,
+# |                                      and PYTHON_BOOTSTRAPPER_GC_ARCHIVE_AGE); combine with --check to display what would be removed or archived without
+# |                                      changing it. Archived environments are restored when they are next activated or bootstrapped.
+# |
+# |      --dedupe                        Replace identical files in the site-packages of the python virtual environments on this machine with hardlinks
+# |                                      to a single copy after the BootstrapEpilog scripts have run.
+# |
+# |      --check                         Display the status of each bootstrap phase without making changes; the exit code is 0 if the repository is current.
+# |
 # |      --python-version <version>      Specify the python version to install; the default python version is installed if not specified.
 # |
+# |      --refresh-seed-wheels           Refresh the pip/setuptools/wheel packages used to seed python virtual environments.
+# |
 # |      --bootstrap-branch <branch>     Specify the branch of the PythonBootstrapper repository to use when downloading BootstrapImpl; "main" is used if not specified.
 # |
+# |  Environment Variables:
+# |
+# |      PYTHON_BOOTSTRAPPER_DOWNLOAD_RETRIES      Number of times a failed download is retried (with exponential backoff); the default is 5.
+# |      PYTHON_BOOTSTRAPPER_CONNECT_TIMEOUT       Maximum number of seconds to wait for a connection; the default is 30.
+# |      PYTHON_BOOTSTRAPPER_DOWNLOAD_TIMEOUT      Maximum number of seconds for each download attempt; the default is 600.
+# |      PYTHON_BOOTSTRAPPER_DOWNLOAD_THREADS      Equivalent to --download-threads.
+# |      PYTHON_BOOTSTRAPPER_EXTRACT_THREADS       Equivalent to --extract-threads.
+# |      PYTHON_BOOTSTRAPPER_PRECOMPILE            Set to 1 for behavior equivalent to --precompile.
+# |      PYTHON_BOOTSTRAPPER_PRECOMPILE_DIRS       Colon-delimited directories; equivalent to --precompile-dir.
+# |      PYTHON_BOOTSTRAPPER_EPILOG_JOBS           Number of BootstrapEpilog.d tasks to run concurrently; the default is the number of processors.
+# |      PYTHON_BOOTSTRAPPER_PROFILE_EPILOGS       Set to 1 to profile python epilogs (including those run during activation) with cProfile and "-X importtime".
+# |      PYTHON_BOOTSTRAPPER_PROFILE_ACTIVATION    Set to 1 to display the time taken by each step when sourcing Activate.sh.
+# |      PYTHON_BOOTSTRAPPER_WORKSPACE_JOBS        Number of repositories to bootstrap concurrently with --workspace; the default is the number of processors.
+# |      PYTHON_BOOTSTRAPPER_RUN_ACTIVATE_EPILOG   Set to 1 to apply the changes recorded by ActivateEpilog.py when running a command with Run.sh.
+# |      PYTHON_BOOTSTRAPPER_SYSTEM_PYTHON         Set to 1 for behavior equivalent to --system-python.
+# |      PYTHON_BOOTSTRAPPER_SYSTEM_PYTHON_DIRS    Colon-delimited directories searched for a python interpreter (before the PATH) with --system-python.
+# |      PYTHON_BOOTSTRAPPER_DEDUPE                Set to 1 for behavior equivalent to --dedupe.
+# |      PYTHON_BOOTSTRAPPER_GC_MAX_AGE            Number of days that an environment can go unused before --gc removes it; the default is 90 (0 disables the limit).
+# |      PYTHON_BOOTSTRAPPER_GC_MAX_SIZE           Maximum number of MB used by all environments; --gc removes the least recently used environments that don't fit.
+# |                                                The default is 0 (no limit).
+# |      PYTHON_BOOTSTRAPPER_GC_ARCHIVE_AGE        Number of days that an environment can go unused before --gc compresses it into an archive (zstd when available,
+# |                                                gzip otherwise); the default is 30 (0 disables archiving).
+# |      PYTHON_BOOTSTRAPPER_PACKAGE_CACHE_SIZE    Maximum number of MB used by the micromamba package cache; the least recently used packages are removed after the
+# |                                                micromamba environment is created or upgraded. The default is 0 (no limit).
+# |      PYTHON_BOOTSTRAPPER_ENV_TIMEOUT           Maximum number of seconds to create or upgrade the micromamba environment; the default is 1800 (0 disables the timeout).
+# |
 # ----------------------------------------------------------------------
 set +v # Continue on errors
 
@@ -26,6 +89,8 @@ pushd "${this_dir}" > /dev/null || exit
 # |
 # ----------------------------------------------------------------------
 bootstrap_branch=main
+is_check=0
+is_python_version=0
 command_line_args=()
 
 while [[ $# -gt 0 ]]; do
@@ -33,6 +98,12 @@ while [[ $# -gt 0 ]]; do
         bootstrap_branch=$2
         shift
     else
+        if [[ "$1" == "--check" ]]; then
+            is_check=1
+        elif [[ "$1" == "--python-version" ]]; then
+            is_python_version=1
+        fi
+
         command_line_args+=("$1")
     fi
 
@@ -44,26 +115,68 @@ done
 # |  Download BootstrapImpl.sh
 # |
 # ----------------------------------------------------------------------
+cache_dir=${PYTHON_BOOTSTRAPPER_CACHE_DIR:-${XDG_CACHE_HOME:-${HOME}/.cache}/PythonBootstrapper}/BootstrapImpl/${bootstrap_branch}
+
+if [[ ${is_check} -eq 1 ]] && [[ -f "${cache_dir}/BootstrapImpl.sh" ]]; then
+    # --check never accesses the network, so use the most recently downloaded code
+    "${cache_dir}/BootstrapImpl.sh" "${command_line_args[@]}"
+    exit $?
+fi
+
 echo "Downloading Bootstrap code..."
 
 bootstrap_url=https://raw.githubusercontent.com/davidbrownell/PythonBootstrapper/${bootstrap_branch}/src/BootstrapImpl.sh
 
+curl_retry_args=(
+    --retry "${PYTHON_BOOTSTRAPPER_DOWNLOAD_RETRIES:-5}"
+    --retry-connrefused
+    --connect-timeout "${PYTHON_BOOTSTRAPPER_CONNECT_TIMEOUT:-30}"
+    --max-time "${PYTHON_BOOTSTRAPPER_DOWNLOAD_TIMEOUT:-600}"
+)
+
 temp_script_name=$(mktemp Bootstrap.XXXXXX)
+temp_default_version_name=$(mktemp Bootstrap.XXXXXX)
+temp_status_name=$(mktemp Bootstrap.XXXXXX)
+
+download_args=("${bootstrap_url}" --output BootstrapImpl.sh)
 
-curl --header "Cache-Control: no-cache, no-store" --header "Pragma: no-cache" --location ${bootstrap_url} --output BootstrapImpl.sh --no-progress-meter --fail-with-body > "${temp_script_name}" 2>&1
+# Download the default python version information (if it will be needed) at the same time; BootstrapImpl.sh
+# downloads it itself if this fails.
+if [[ ${is_python_version} -eq 0 ]] && [[ -z ${PYTHON_VERSION} ]]; then
+    download_args+=(https://raw.githubusercontent.com/davidbrownell/PythonBootstrapper/main/default_version --output "${temp_default_version_name}")
+fi
+
+# Both files are downloaded by a single curl process so that they share a connection to the server (and
+# are multiplexed over it when HTTP/2 is available). The result of each transfer is written to stdout.
+curl --parallel --header "Cache-Control: no-cache, no-store" --header "Pragma: no-cache" --location --no-progress-meter --fail-with-body "${curl_retry_args[@]}" --write-out "%{exitcode} %{filename_effective}\n" "${download_args[@]}" > "${temp_status_name}" 2> "${temp_script_name}"
 error=$?
 
+while read -r transfer_error transfer_filename; do
+    if [[ "${transfer_filename}" == "BootstrapImpl.sh" ]]; then
+        error=${transfer_error}
+    elif [[ ${transfer_error} == 0 ]]; then
+        export PYTHON_BOOTSTRAPPER_PREFETCHED_DEFAULT_VERSION="${this_dir}/${temp_default_version_name}"
+    fi
+done < "${temp_status_name}"
+
+rm "${temp_status_name}"
+
 if [[ ${error} != 0 ]]; then
     echo "[1ADownloading Bootstrap code...[31m[1mFAILED[0m (${bootstrap_url})."
     echo ""
 
     cat "${temp_script_name}"
     rm "${temp_script_name}"
+    rm "${temp_default_version_name}"
 
     exit ${error}
 fi
 
 chmod u+x BootstrapImpl.sh
+
+[[ -d "${cache_dir}" ]] || mkdir -p "${cache_dir}"
+cp -p BootstrapImpl.sh "${cache_dir}/BootstrapImpl.sh"
+
 echo "[1ADownloading Bootstrap code...[32m[1mDONE[0m."
 
 # ----------------------------------------------------------------------
@@ -81,5 +194,6 @@ error=$?
 # ----------------------------------------------------------------------
 rm "BootstrapImpl.sh"
 rm "${temp_script_name}"
+rm "${temp_default_version_name}"
 
 exit ${error}
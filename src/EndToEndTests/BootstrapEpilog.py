@@ -11,17 +11,28 @@
 # |  Distributed under the MIT License.
 # |
 # ----------------------------------------------------------------------
+# bootstrap-inputs: requirements.txt
+
 import subprocess
 
 from pathlib import Path
 
-result = subprocess.run(
-    "pip install -r requirements.txt",
-    check=False,
-    cwd=Path(__file__).parent,
-    shell=True,
-    stderr=subprocess.STDOUT,
-    stdout=subprocess.PIPE,
-)
+try:
+    from PythonBootstrapperHelpers import InstallRequirements
+except ImportError:
+    # PythonBootstrapperHelpers is only written by BootstrapImpl.sh (not BootstrapImpl.cmd)
+    InstallRequirements = None
+
+if InstallRequirements is not None:
+    InstallRequirements(Path(__file__).parent / "requirements.txt")
+else:
+    result = subprocess.run(
+        "pip install -r requirements.txt",
+        check=False,
+        cwd=Path(__file__).parent,
+        shell=True,
+        stderr=subprocess.STDOUT,
+        stdout=subprocess.PIPE,
+    )
 
-assert result.returncode == 0, result.stdout.decode("utf-8")
+    assert result.returncode == 0, result.stdout.decode("utf-8")
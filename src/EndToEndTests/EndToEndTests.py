@@ -13,11 +13,14 @@
 # ----------------------------------------------------------------------
 """Tests for PythonBootstrapper"""
 
+import json
 import os
 import re
 import shutil
 import subprocess
+import sys
 import textwrap
+import time
 
 from pathlib import Path
 from typing import Callable, Optional
@@ -54,7 +57,7 @@ if os.name.lower() == "nt":
     generate_set_command_func = lambda var, value: "set {}={}".format(var, value)
 
 else:
-    _script_version = "0.12.2"
+    _script_version = "0.13.0"
 
     _is_windows = False
 
@@ -70,6 +73,9 @@ else:
 
 assert _home_dir is not None
 micromamba_path = Path(_home_dir) / "micromamba"
+cache_path = (
+    Path(os.environ.get("XDG_CACHE_HOME") or Path(_home_dir) / ".cache") / "PythonBootstrapper"
+)
 
 # Ensure that Bootstrap has been run at least once. This is required because the output produced by
 # micromamba during the first run includes file sizes, download times, and hash values. All of these
@@ -1138,6 +1144,73 @@ class TestDeactivateEpilog(object):
             python_version=python_version,
         )
 
+    # ----------------------------------------------------------------------
+    @pytest.mark.skipif(_is_windows, reason="Environment deltas are not supported on Windows")
+    def test_EnvironmentDelta(self, tmp_path_factory, templates_path, python_version):
+        root = tmp_path_factory.mktemp("root")
+
+        # Variables are changed multiple times, which requires the value saved before the first
+        # change until all of the changes have been reverted
+        (root / "BootstrapEpilog.py").write_text(
+            textwrap.dedent(
+                """\
+                from PythonBootstrapperHelpers import EnvironmentDelta
+
+                delta = EnvironmentDelta()
+
+                delta.Set("DELTA_EXISTING", "first")
+                delta.Set("DELTA_EXISTING", "second")
+                delta.Set("DELTA_NEW", "new")
+                delta.AppendPath("DELTA_NEW", "/appended")
+                delta.PrependPath("DELTA_PATH", "/prepended")
+                delta.AppendPath("DELTA_PATH", "/appended")
+                delta.PrependPath("DELTA_NEW_PATH", "/prepended")
+                delta.Unset("DELTA_REMOVED")
+                delta.Set("DELTA_REMOVED", "added")
+                delta.Alias("delta_alias", "echo first")
+                delta.Alias("delta_alias", "echo second")
+                """,
+            ),
+        )
+
+        _Bootstrap(root, templates_path, python_version)
+
+        commands = [
+            "export DELTA_EXISTING=existing DELTA_PATH=/a:/b DELTA_REMOVED=removed",
+            "alias delta_alias='echo existing'",
+            "(env; alias) | sort > before.txt",
+            f"{_source}{_execute_prefix}Activate{_extension} >{_null_output}",
+            "(env; alias) | sort > activated.txt",
+            f"{_source}{_execute_prefix}Deactivate{_extension} >{_null_output}",
+            "(env; alias) | sort > after.txt",
+        ]
+
+        result, output = _Execute([], root, " && ".join(commands))
+        assert result == 0, output
+
+        # ----------------------------------------------------------------------
+        def ReadEnvironment(filename: str) -> list[str]:
+            # "_" is the last argument of the previous command, OLDPWD is changed by Activate's pushd and
+            # popd, and MAMBA_ROOT_PREFIX is used by the micromamba shell functions that remain defined
+            return [
+                line
+                for line in (root / filename).read_text().splitlines()
+                if not line.startswith(("_=", "OLDPWD=", "MAMBA_ROOT_PREFIX="))
+            ]
+
+        # ----------------------------------------------------------------------
+
+        activated = ReadEnvironment("activated.txt")
+
+        assert "DELTA_EXISTING=second" in activated
+        assert "DELTA_NEW=new:/appended" in activated
+        assert "DELTA_PATH=/prepended:/a:/b:/appended" in activated
+        assert "DELTA_NEW_PATH=/prepended" in activated
+        assert "DELTA_REMOVED=added" in activated
+        assert "alias delta_alias='echo second'" in activated
+
+        assert ReadEnvironment("after.txt") == ReadEnvironment("before.txt")
+
     # ----------------------------------------------------------------------
     def test_ScriptAndPythonFiles(self, tmp_path_factory, templates_path, python_version):
         root = tmp_path_factory.mktemp("root")
@@ -1363,36 +1436,11 @@ class TestDeactivateEpilog(object):
 
 # ----------------------------------------------------------------------
 class TestErrors(object):
-    # ----------------------------------------------------------------------
-    @staticmethod
-    def Bootstrap(
-        root: Path,
-        templates_path: Path,
-        python_version: Optional[str] = None,
-    ) -> None:
-        result, output = _Execute(
-            [
-                (
-                    templates_path / f"Bootstrap{_extension}",
-                    root / f"Bootstrap{_extension}",
-                ),
-            ],
-            root,
-            "{}Bootstrap{}{}{}".format(
-                _execute_prefix,
-                _extension,
-                _bootstrap_branch_arg,
-                "" if python_version is None else " --python-version {}".format(python_version),
-            ),
-        )
-
-        assert result == 0, output
-
     # ----------------------------------------------------------------------
     def test_DeactivateUnactivated(self, tmp_path_factory, templates_path):
         root = tmp_path_factory.mktemp("root")
 
-        self.Bootstrap(root, templates_path)
+        _Bootstrap(root, templates_path)
 
         result, output = _Execute(
             [],
@@ -1416,7 +1464,7 @@ class TestErrors(object):
     def test_ActivateRightDir(self, tmp_path_factory, templates_path):
         root = tmp_path_factory.mktemp("root")
 
-        self.Bootstrap(root, templates_path)
+        _Bootstrap(root, templates_path)
 
         commands = [
             f"{_source}{_execute_prefix}Activate{_extension}",
@@ -1446,8 +1494,8 @@ class TestErrors(object):
         root1 = tmp_path_factory.mktemp("root1")
         root2 = tmp_path_factory.mktemp("root2")
 
-        self.Bootstrap(root1, templates_path)
-        self.Bootstrap(root2, templates_path)
+        _Bootstrap(root1, templates_path)
+        _Bootstrap(root2, templates_path)
 
         commands = [
             f"{_source}{_execute_prefix}Activate{_extension}",
@@ -1477,8 +1525,8 @@ class TestErrors(object):
         root1 = tmp_path_factory.mktemp("root1")
         root2 = tmp_path_factory.mktemp("root2")
 
-        self.Bootstrap(root1, templates_path)
-        self.Bootstrap(root2, templates_path)
+        _Bootstrap(root1, templates_path)
+        _Bootstrap(root2, templates_path)
 
         commands = [
             f"{_source}{_execute_prefix}Activate{_extension}",
@@ -1511,8 +1559,8 @@ class TestErrors(object):
         version1 = PYTHON_VERSIONS[1]
         version2 = PYTHON_VERSIONS[2]
 
-        self.Bootstrap(root, templates_path, python_version=version1)
-        self.Bootstrap(root, templates_path, python_version=version2)
+        _Bootstrap(root, templates_path, python_version=version1)
+        _Bootstrap(root, templates_path, python_version=version2)
 
         commands = [
             f"{_source}{_execute_prefix}Activate{version1}{_extension}",
@@ -1544,8 +1592,8 @@ class TestErrors(object):
         version1 = PYTHON_VERSIONS[1]
         version2 = PYTHON_VERSIONS[2]
 
-        self.Bootstrap(root, templates_path, python_version=version1)
-        self.Bootstrap(root, templates_path, python_version=version2)
+        _Bootstrap(root, templates_path, python_version=version1)
+        _Bootstrap(root, templates_path, python_version=version2)
 
         commands = [
             f"{_source}{_execute_prefix}Activate{version1}{_extension}",
@@ -1574,7 +1622,7 @@ class TestErrors(object):
     def test_UnsourcedActivate(self, tmp_path_factory, templates_path):
         root = tmp_path_factory.mktemp("root")
 
-        self.Bootstrap(root, templates_path)
+        _Bootstrap(root, templates_path)
 
         commands = [
             f"{_execute_prefix}Activate{_extension}",
@@ -1613,7 +1661,7 @@ class TestErrors(object):
         assert PYTHON_VERSIONS[0] is None
         python_version = PYTHON_VERSIONS[1]
 
-        self.Bootstrap(root, templates_path, python_version)
+        _Bootstrap(root, templates_path, python_version)
 
         commands = [
             f"{_execute_prefix}Activate{python_version}{_extension}",
@@ -1649,7 +1697,7 @@ class TestErrors(object):
     def test_UnsourcedDeactivate(self, tmp_path_factory, templates_path):
         root = tmp_path_factory.mktemp("root")
 
-        self.Bootstrap(root, templates_path)
+        _Bootstrap(root, templates_path)
 
         commands = [
             f"{_source}{_execute_prefix}Activate{_extension}",
@@ -1692,7 +1740,7 @@ class TestErrors(object):
         assert PYTHON_VERSIONS[0] is None
         python_version = PYTHON_VERSIONS[1]
 
-        self.Bootstrap(root, templates_path, python_version)
+        _Bootstrap(root, templates_path, python_version)
 
         commands = [
             f"{_source}{_execute_prefix}Activate{python_version}{_extension}",
@@ -1729,55 +1777,1349 @@ class TestErrors(object):
 
 
 # ----------------------------------------------------------------------
+@pytest.mark.skipif(_is_windows, reason="--check is not supported on Windows")
+class TestCheck(object):
+    # ----------------------------------------------------------------------
+    def test_Current(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        result, output = _Check(root, templates_path, "3.12")
+
+        assert result == 0, output
+        assert output == textwrap.dedent(
+            f"""
+            Script Version {_script_version}
+
+            Validating python version...DONE.
+
+            Python Version 3.12
+
+            Checking micromamba...CURRENT.
+            Checking the micromamba environment...CURRENT.
+            Checking the python virtual environment...CURRENT.
+            Checking Activate.sh...CURRENT.
+            Checking Deactivate.sh...CURRENT.
+            Checking Run.sh...CURRENT.
+
+            The repository is current.
+
+            """,
+        )
+
+    # ----------------------------------------------------------------------
+    def test_NotBootstrapped(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        # Bootstrap once so that the cached bootstrap code is available
+        _Bootstrap(tmp_path_factory.mktemp("other_root"), templates_path, "3.12")
+
+        result, output = _Check(root, templates_path, "3.12")
+
+        assert result == 1, output
+        assert output == textwrap.dedent(
+            f"""
+            Script Version {_script_version}
+
+            Validating python version...DONE.
+
+            Python Version 3.12
+
+            Checking micromamba...CURRENT.
+            Checking the micromamba environment...CURRENT.
+            Checking the python virtual environment...STALE (it does not exist).
+            Checking Activate.sh...STALE (it does not exist).
+            Checking Deactivate.sh...STALE (it does not exist).
+            Checking Run.sh...STALE (it does not exist).
+
+            The repository must be bootstrapped, as these phases are stale:
+                - the python virtual environment
+                - Activate.sh
+                - Deactivate.sh
+                - Run.sh
+
+            """,
+        )
+
+
 # ----------------------------------------------------------------------
+@pytest.mark.skipif(_is_windows, reason="BootstrapEpilog.d is not supported on Windows")
+class TestBootstrapEpilogTasks(object):
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def CreateTasks(root: Path) -> None:
+        tasks_dir = root / "BootstrapEpilog.d"
+        tasks_dir.mkdir()
+
+        # second.py can only run after first.sh, which takes longer than the independent third.sh
+        (tasks_dir / "first.sh").write_text(
+            textwrap.dedent(
+                """\
+                sleep 1
+                echo first >> order.txt
+                """,
+            ),
+        )
+
+        (tasks_dir / "second.py").write_text(
+            textwrap.dedent(
+                """\
+                # bootstrap-depends: first.sh
+                with open("order.txt", "a") as f:
+                    f.write("second\\n")
+                """,
+            ),
+        )
+
+        (tasks_dir / "third.sh").write_text("echo third >> independent.txt\n")
+        (tasks_dir / "README.md").write_text("This is not a task.\n")
+
+    # ----------------------------------------------------------------------
+    def test_Order(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        self.CreateTasks(root)
+
+        output = _Bootstrap(root, templates_path, "3.12")
+
+        assert "Running 3 BootstrapEpilog.d task(s)" in output, output
+        assert (root / "order.txt").read_text() == "first\nsecond\n"
+        assert (root / "independent.txt").read_text() == "third\n"
+
+        manifests_dir = _GetGeneratedDir(root, "3.12") / "EpilogManifests" / "BootstrapEpilog.d"
+
+        assert sorted(path.name for path in manifests_dir.iterdir()) == [
+            "first.sh",
+            "second.py",
+            "third.sh",
+        ]
+
+    # ----------------------------------------------------------------------
+    def test_Skip(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        self.CreateTasks(root)
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        # Nothing has changed
+        output = _Bootstrap(root, templates_path, "3.12")
+
+        assert (
+            "[first.sh] Current and was not run (use --rerun-epilogs to run it).\n" in output
+        ), output
+        assert (root / "order.txt").read_text() == "first\nsecond\n"
+        assert (root / "independent.txt").read_text() == "third\n"
+
+        # Only the modified task runs
+        with (root / "BootstrapEpilog.d" / "second.py").open("a") as f:
+            f.write("# Modified\n")
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        assert (root / "order.txt").read_text() == "first\nsecond\nsecond\n"
+        assert (root / "independent.txt").read_text() == "third\n"
+
+        # Tasks that depend on a task that ran run as well
+        with (root / "BootstrapEpilog.d" / "first.sh").open("a") as f:
+            f.write("# Modified\n")
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        assert (root / "order.txt").read_text() == "first\nsecond\nsecond\nfirst\nsecond\n"
+        assert (root / "independent.txt").read_text() == "third\n"
+
+        # All tasks run when requested
+        _Bootstrap(root, templates_path, "3.12", ["--rerun-epilogs"])
+
+        assert (root / "independent.txt").read_text() == "third\nthird\n"
+
+
 # ----------------------------------------------------------------------
-_env = {
-    k: v
-    for k, v in os.environ.items()
-    if not k.startswith("_") and not k.startswith("PYTHON_BOOTSTRAPPER")
-}
+@pytest.mark.skipif(_is_windows, reason="--system-python is not supported on Windows")
+class TestSystemPython(object):
+    # ----------------------------------------------------------------------
+    def test_Standard(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        # The interpreter running these tests is the system python interpreter (rather than a
+        # virtual environment that it may have been invoked through)
+        python_version = "{}.{}".format(*sys.version_info[:2])
+        system_python_dir = Path(sys.base_prefix) / "bin"
+
+        result, output = _Execute(
+            [
+                (
+                    templates_path / f"Bootstrap{_extension}",
+                    root / f"Bootstrap{_extension}",
+                ),
+            ],
+            root,
+            'PYTHON_BOOTSTRAPPER_SYSTEM_PYTHON_DIRS="{}" {}Bootstrap{}{} --python-version {} --system-python'.format(
+                system_python_dir,
+                _execute_prefix,
+                _extension,
+                _bootstrap_branch_arg,
+                python_version,
+            ),
+        )
+
+        assert result == 0, output
+
+        match = re.search(
+            r"Locating a system python interpreter\.\.\.DONE \((?P<python>[^)]+)\)\.", output
+        )
+        assert match, output
+
+        if Path(match.group("python")).parent.resolve() != system_python_dir.resolve():
+            pytest.skip(
+                "The system python interpreter doesn't provide the modules required to create a virtual environment"
+            )
+
+        # micromamba is neither downloaded nor used
+        assert "micromamba" not in output, output
+
+        generated_dir = _GetGeneratedDir(root, python_version)
+
+        assert f"home = {system_python_dir}" in (generated_dir / "pyvenv.cfg").read_text()
+        assert (
+            '"micromamba_environment": null'
+            in (generated_dir / "EnvironmentManifest.json").read_text()
+        )
+
+        commands = [
+            f"{_source}{_execute_prefix}Activate{_extension} >{_null_output}",
+            "python -c 'import sys; print(sys.prefix)'",
+            f"{_source}{_execute_prefix}Deactivate{_extension} >{_null_output}",
+            f"{_execute_prefix}Run{_extension} python -c 'import sys; print(sys.base_prefix)'",
+        ]
+
+        result, output = _Execute([], root, " && ".join(commands))
+
+        assert result == 0, output
+        assert output == f"{generated_dir}\n{sys.base_prefix}\n", output
 
 
 # ----------------------------------------------------------------------
-def _Execute(
-    files_to_copy: list[tuple[Path, Path]],
-    root: Path,
-    command: str,
-) -> tuple[int, str]:
-    for source, dest in files_to_copy:
-        shutil.copyfile(source, dest)
+@pytest.mark.skipif(_is_windows, reason="--workspace is not supported on Windows")
+class TestWorkspace(object):
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def CreateRepository(
+        repo_dir: Path,
+        epilog_content: Optional[str] = None,
+    ) -> None:
+        repo_dir.mkdir(parents=True)
 
-        if dest.suffix == _extension:
-            dest.chmod(0o755)
+        if epilog_content is None:
+            (repo_dir / f"Bootstrap{_extension}").write_text("")
+            return
 
-    result = subprocess.run(
-        command,
-        check=False,
-        shell=True,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        cwd=root,
-        executable=_subprocess_executable,
-        env=_env,
-    )
+        epilog_filename = repo_dir / "BootstrapEpilog.sh"
 
-    content = result.stdout.decode("utf-8")
+        epilog_filename.write_text(f"#!/usr/bin/env bash\n{epilog_content}\n")
+        epilog_filename.chmod(0o755)
 
-    # Remove lines eventually replaced by DONE-style messages
-    content = re.sub(
-        r"^[^\n]+\r?\n\x1b\[1A",
-        "",
-        content,
-        flags=re.MULTILINE,
-    )
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def BootstrapWorkspace(
+        root: Path,
+        templates_path: Path,
+        workspace_dir: Path,
+        arguments: str = "",
+    ) -> tuple[int, str]:
+        return _Execute(
+            [
+                (
+                    templates_path / f"Bootstrap{_extension}",
+                    root / f"Bootstrap{_extension}",
+                ),
+            ],
+            root,
+            '{}Bootstrap{}{} --python-version 3.12 --workspace "{}"{}'.format(
+                _execute_prefix,
+                _extension,
+                _bootstrap_branch_arg,
+                workspace_dir,
+                arguments,
+            ),
+        )
 
-    # Remove escape sequences
-    content = re.sub(r"\x1b\[\d+[Am]", "", content)
+    # ----------------------------------------------------------------------
+    def test_Discovery(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+        workspace_dir = tmp_path_factory.mktemp("workspace")
 
-    # Remove CRs
-    content = content.replace("\r", "")
+        self.CreateRepository(workspace_dir / "repo1", "echo repo1 > bootstrapped.txt")
+        self.CreateRepository(workspace_dir / "nested" / "repo2")
+        self.CreateRepository(workspace_dir / "failing", "exit 3")
 
-    return result.returncode, content
+        # Directories that are never repositories
+        self.CreateRepository(workspace_dir / "repo1" / "Templates")
+        self.CreateRepository(workspace_dir / "repo1" / "node_modules" / "package")
+
+        result, output = self.BootstrapWorkspace(root, templates_path, workspace_dir)
+
+        assert result != 0, output
+        assert "Bootstrapping 3 repositories in" in output, output
+        assert re.search(r"/repo1\.\.\.DONE \(", output), output
+        assert re.search(r"/repo2\.\.\.DONE \(", output), output
+        assert re.search(r"/failing\.\.\.FAILED \(", output), output
+
+        assert (workspace_dir / "repo1" / "bootstrapped.txt").read_text() == "repo1\n"
+        assert (_GetGeneratedDir(workspace_dir / "repo1", "3.12") / "pyvenv.cfg").is_file()
+        assert (
+            _GetGeneratedDir(workspace_dir / "nested" / "repo2", "3.12") / "pyvenv.cfg"
+        ).is_file()
+        assert not (workspace_dir / "repo1" / "Templates" / "Generated").exists()
+        assert not (workspace_dir / "repo1" / "node_modules" / "package" / "Generated").exists()
+
+        # The logs of a failed bootstrap are kept
+        match = re.search(r"logs are in '(?P<log_dir>[^']+)'", output)
+        assert match, output
+
+        log_dir = Path(match.group("log_dir"))
+
+        try:
+            log_filenames = list(log_dir.glob("*-failing.log"))
+
+            assert len(log_filenames) == 1, log_filenames
+            assert "BootstrapEpilog.sh failed." in log_filenames[0].read_text()
+        finally:
+            shutil.rmtree(log_dir)
+
+    # ----------------------------------------------------------------------
+    def test_Dedupe(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+        workspace_dir = tmp_path_factory.mktemp("workspace")
+
+        self.CreateRepository(workspace_dir / "repo1")
+        self.CreateRepository(workspace_dir / "repo2")
+
+        result, output = self.BootstrapWorkspace(root, templates_path, workspace_dir, " --dedupe")
+
+        assert result == 0, output
+
+        # Deduplication happens once, after all of the repositories have been bootstrapped
+        assert output.count("Deduplicating site-packages...") == 1, output
+        assert output.index("Deduplicating site-packages...") > output.index("Repository"), output
+
+        filename1, filename2 = [
+            next(
+                _GetGeneratedDir(workspace_dir / repo_name, "3.12").glob(
+                    "lib/python*/site-packages/PythonBootstrapperHelpers.py"
+                )
+            )
+            for repo_name in ["repo1", "repo2"]
+        ]
+
+        if filename1.stat().st_dev != cache_path.stat().st_dev:
+            pytest.skip("Hardlinks can't span file systems")
+
+        assert filename1.stat().st_ino == filename2.stat().st_ino
+
+
+# ----------------------------------------------------------------------
+@pytest.mark.skipif(_is_windows, reason="Run.sh is not supported on Windows")
+class TestRun(object):
+    # ----------------------------------------------------------------------
+    def test_Environment(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        epilog_filename = root / "BootstrapEpilog.sh"
+
+        epilog_filename.write_text(
+            textwrap.dedent(
+                """\
+                #!/usr/bin/env bash
+                printf "set\\tMY_VALUE\\tfrom the epilog\\n" >> "${PYTHON_BOOTSTRAPPER_ENVIRONMENT_DELTA}"
+                """,
+            ),
+        )
+        epilog_filename.chmod(0o755)
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        result, output = _Execute(
+            [],
+            root,
+            """./Run.sh python -c 'import os, sys; open("run.txt", "w").write("{}\\n{}\\n".format(sys.prefix, os.environ["MY_VALUE"]))'""",
+        )
+
+        assert result == 0, output
+
+        prefix, value = (root / "run.txt").read_text().splitlines()
+
+        assert Path(prefix).resolve() == _GetGeneratedDir(root, "3.12").resolve()
+        assert value == "from the epilog"
+
+    # ----------------------------------------------------------------------
+    def test_ExitCode(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        result, output = _Execute([], root, "./Run.sh python -c 'raise SystemExit(3)'")
+
+        assert result == 3, output
+
+    # ----------------------------------------------------------------------
+    def test_NoCommand(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        result, output = _Execute([], root, "./Run.sh")
+
+        assert result != 0, output
+        assert output == "ERROR: Usage: Run.sh <command> [<arg>...]\n"
+
+
+# ----------------------------------------------------------------------
+@pytest.mark.skipif(_is_windows, reason="Switch.sh is not supported on Windows")
+class TestSwitch(object):
+    # ----------------------------------------------------------------------
+    def test_Switch(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        _Bootstrap(root, templates_path, "3.11")
+        _Bootstrap(root, templates_path, "3.12")
+
+        write_state_command = """python -c 'import os, sys; open("{}", "w").write("{{}}\\n{{}}\\n".format(sys.prefix, os.environ["PATH"]))'"""
+
+        commands = [
+            f"{_source}{_execute_prefix}Activate3.11{_extension}",
+            f"{_source}{_execute_prefix}Switch{_extension} 3.12",
+            write_state_command.format("switched.txt"),
+            f"{_source}{_execute_prefix}Deactivate3.12{_extension}",
+            'echo "${PATH}" > deactivated.txt',
+        ]
+
+        result, output = _Execute([], root, " && ".join(commands))
+
+        assert result == 0, output
+
+        generated_dir_311 = str(_GetGeneratedDir(root, "3.11").resolve())
+        generated_dir_312 = str(_GetGeneratedDir(root, "3.12").resolve())
+
+        prefix, path = (root / "switched.txt").read_text().splitlines()
+
+        assert str(Path(prefix).resolve()) == generated_dir_312
+        assert generated_dir_311 not in path
+        assert "Python3.11" not in path
+
+        path = (root / "deactivated.txt").read_text()
+
+        assert generated_dir_312 not in path
+        assert "Python3.12" not in path
+
+    # ----------------------------------------------------------------------
+    def test_NotBootstrapped(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        # The terminal remains activated with the original version
+        commands = [
+            f"{_source}{_execute_prefix}Activate3.12{_extension} > {_null_output}",
+            f"{_source}{_execute_prefix}Switch{_extension} 3.11; echo $? > result.txt",
+            """python -c 'import sys; open("prefix.txt", "w").write(sys.prefix)'""",
+        ]
+
+        result, output = _Execute([], root, " && ".join(commands))
+
+        assert result == 0, output
+        assert output == textwrap.dedent(
+            f"""\
+
+            ERROR: "Activate3.11{_extension}" does not exist or was created by a different version of PythonBootstrapper.
+            ERROR: Please run 'Bootstrap{_extension} --python-version 3.11' and try again.
+            """,
+        )
+
+        assert (root / "result.txt").read_text() == "1\n"
+        assert (
+            Path((root / "prefix.txt").read_text()).resolve()
+            == _GetGeneratedDir(root, "3.12").resolve()
+        )
+
+
+# ----------------------------------------------------------------------
+@pytest.mark.skipif(_is_windows, reason="--gc is not supported on Windows")
+class TestGarbageCollection(object):
+    # ----------------------------------------------------------------------
+    def test_Check(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+        cache_dir = tmp_path_factory.mktemp("cache")
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        generated_dir = _GetGeneratedDir(root, "3.12")
+        registry_filename = _Register(generated_dir, cache_dir)
+
+        result, output = _CollectGarbage(root, templates_path, cache_dir, 3000, 0, " --check")
+
+        assert result == 0, output
+        assert "would be removed" in output, output
+        assert (generated_dir / "pyvenv.cfg").is_file()
+        assert registry_filename.is_file()
+
+    # ----------------------------------------------------------------------
+    def test_Remove(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+        cache_dir = tmp_path_factory.mktemp("cache")
+
+        _Bootstrap(root, templates_path, "3.11")
+        _Bootstrap(root, templates_path, "3.12")
+
+        generated_dir = _GetGeneratedDir(root, "3.12")
+        registry_filename = _Register(generated_dir, cache_dir)
+
+        # The other python virtual environment isn't in the registry, so it may still be in use
+        unregistered_generated_dir = _GetGeneratedDir(root, "3.11")
+
+        last_used = time.time() - 3650 * 86400
+        os.utime(unregistered_generated_dir / "pyvenv.cfg", (last_used, last_used))
+
+        result, output = _CollectGarbage(root, templates_path, cache_dir, 3000, 0)
+
+        assert result == 0, output
+        assert "kept (usage unknown)" in output, output
+
+        assert not generated_dir.exists()
+        assert not registry_filename.exists()
+        assert (root / f"Activate{_extension}").is_file()
+
+        assert (unregistered_generated_dir / "pyvenv.cfg").is_file()
+
+
+# ----------------------------------------------------------------------
+@pytest.mark.skipif(_is_windows, reason="--gc is not supported on Windows")
+class TestArchive(object):
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def Archive(
+        root: Path,
+        templates_path: Path,
+        cache_dir: Path,
+    ) -> Path:
+        _Bootstrap(root, templates_path, "3.12")
+
+        generated_dir = _GetGeneratedDir(root, "3.12")
+        _Register(generated_dir, cache_dir)
+
+        # The restored python virtual environment is the one that was archived
+        (generated_dir / "marker.txt").write_text("marker")
+
+        result, output = _CollectGarbage(root, templates_path, cache_dir, 0, 3000)
+
+        assert result == 0, output
+        assert "archived" in output, output
+
+        assert not generated_dir.exists()
+        assert _GetArchiveFilenames(generated_dir)
+
+        return generated_dir
+
+    # ----------------------------------------------------------------------
+    def test_RestoreWithRun(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+        generated_dir = self.Archive(root, templates_path, tmp_path_factory.mktemp("cache"))
+
+        result, output = _Check(root, templates_path, "3.12")
+
+        assert result == 1, output
+        assert (
+            "Checking the python virtual environment...STALE (it has been archived by --gc).\n"
+            in output
+        ), output
+
+        result, output = _Execute(
+            [],
+            root,
+            """./Run.sh python -c 'import sys; open("prefix.txt", "w").write(sys.prefix)'""",
+        )
+
+        assert result == 0, output
+        assert (generated_dir / "marker.txt").is_file()
+        assert not _GetArchiveFilenames(generated_dir)
+        assert Path((root / "prefix.txt").read_text()).resolve() == generated_dir.resolve()
+
+    # ----------------------------------------------------------------------
+    def test_RestoreWithActivate(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+        generated_dir = self.Archive(root, templates_path, tmp_path_factory.mktemp("cache"))
+
+        commands = [
+            f"{_source}{_execute_prefix}Activate{_extension}",
+            """python -c 'import sys; open("prefix.txt", "w").write(sys.prefix)'""",
+        ]
+
+        result, output = _Execute([], root, " && ".join(commands))
+
+        assert result == 0, output
+        assert (generated_dir / "marker.txt").is_file()
+        assert not _GetArchiveFilenames(generated_dir)
+        assert Path((root / "prefix.txt").read_text()).resolve() == generated_dir.resolve()
+
+    # ----------------------------------------------------------------------
+    def test_RestoreWithBootstrap(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+        generated_dir = self.Archive(root, templates_path, tmp_path_factory.mktemp("cache"))
+
+        output = _Bootstrap(root, templates_path, "3.12")
+
+        assert (
+            "Creating the python virtual environment...DONE (already exists).\n" in output
+        ), output
+        assert (generated_dir / "marker.txt").is_file()
+        assert not _GetArchiveFilenames(generated_dir)
+
+
+# ----------------------------------------------------------------------
+@pytest.mark.skipif(_is_windows, reason="--dedupe is not supported on Windows")
+class TestDedupe(object):
+    # ----------------------------------------------------------------------
+    def test_Hardlinks(self, tmp_path_factory, templates_path):
+        root1 = tmp_path_factory.mktemp("root1")
+        root2 = tmp_path_factory.mktemp("root2")
+
+        _Bootstrap(root1, templates_path, "3.12")
+        _Bootstrap(root2, templates_path, "3.12")
+
+        filename1 = next(
+            _GetGeneratedDir(root1, "3.12").glob(
+                "lib/python*/site-packages/PythonBootstrapperHelpers.py"
+            )
+        )
+        filename2 = next(
+            _GetGeneratedDir(root2, "3.12").glob(
+                "lib/python*/site-packages/PythonBootstrapperHelpers.py"
+            )
+        )
+
+        assert filename1.stat().st_ino != filename2.stat().st_ino
+
+        if filename1.stat().st_dev != cache_path.stat().st_dev:
+            pytest.skip("Hardlinks can't span file systems")
+
+        # Files in other python virtual environments that were modified recently are not linked, as
+        # they may be in the process of being installed.
+        modified = time.time() - 60 * 60
+        os.utime(filename1, (modified, modified))
+
+        _Bootstrap(root2, templates_path, "3.12", ["--dedupe"])
+
+        stat1 = filename1.stat()
+        stat2 = filename2.stat()
+
+        assert stat1.st_ino == stat2.st_ino
+        assert stat1.st_nlink >= 3  # Both python virtual environments and the store
+        assert filename1.read_bytes() == filename2.read_bytes()
+
+    # ----------------------------------------------------------------------
+    def test_ConcurrentRemoval(self, tmp_path_factory, templates_path):
+        root1 = tmp_path_factory.mktemp("root1")
+        root2 = tmp_path_factory.mktemp("root2")
+
+        _Bootstrap(root1, templates_path, "3.12")
+        _Bootstrap(root2, templates_path, "3.12")
+
+        # Files are continuously created and removed in the other python virtual environment while it
+        # is deduplicated, as they would be by a concurrent pip install. The files are old enough to
+        # be deduplicated.
+        churn_dir = (
+            next(_GetGeneratedDir(root1, "3.12").glob("lib/python*/site-packages")) / "churn"
+        )
+        stop_filename = root1 / "stop"
+
+        churn_process = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                textwrap.dedent(
+                    """\
+                    import os
+                    import sys
+                    import time
+
+                    from pathlib import Path
+
+                    churn_dir = Path(sys.argv[1])
+                    stop_filename = Path(sys.argv[2])
+
+                    churn_dir.mkdir()
+
+                    modified = time.time() - 60 * 60
+                    filenames = []
+                    index = 0
+
+                    # Each new file replaces the oldest one, so that files are always being removed
+                    while not stop_filename.exists():
+                        filename = churn_dir / f"{index}.py"
+
+                        filename.write_text(f"value = {index}\\n" * 50)
+                        os.utime(filename, (modified, modified))
+
+                        filenames.append(filename)
+
+                        if len(filenames) > 200:
+                            filenames.pop(0).unlink()
+
+                        index += 1
+
+                    for filename in filenames:
+                        filename.unlink()
+
+                    churn_dir.rmdir()
+                    """,
+                ),
+                str(churn_dir),
+                str(stop_filename),
+            ],
+        )
+
+        try:
+            output = _Bootstrap(root2, templates_path, "3.12", ["--dedupe"])
+        finally:
+            stop_filename.touch()
+            churn_process.wait()
+
+        assert churn_process.returncode == 0
+        assert "Deduplicated site-packages in" in output, output
+        assert "some files could not be deduplicated" not in output, output
+        assert "Traceback" not in output, output
+
+
+# ----------------------------------------------------------------------
+@pytest.mark.skipif(_is_windows, reason="--force levels are not supported on Windows")
+class TestForce(object):
+    # ----------------------------------------------------------------------
+    def test_Reuse(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        generated_dir = _GetGeneratedDir(root, "3.12")
+        (generated_dir / "marker.txt").write_text("marker")
+
+        output = _Bootstrap(root, templates_path, "3.12")
+
+        assert (
+            "Creating the python virtual environment...DONE (already exists).\n" in output
+        ), output
+        assert (generated_dir / "marker.txt").is_file()
+
+    # ----------------------------------------------------------------------
+    def test_Venv(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        generated_dir = _GetGeneratedDir(root, "3.12")
+        (generated_dir / "marker.txt").write_text("marker")
+
+        env_inode = (micromamba_path / "envs" / "Python3.12").stat().st_ino
+
+        output = _Bootstrap(root, templates_path, "3.12", ["--force=venv"])
+
+        assert "Creating the python virtual environment...DONE.\n" in output, output
+        assert (generated_dir / "pyvenv.cfg").is_file()
+        assert not (generated_dir / "marker.txt").exists()
+
+        # The micromamba environment is not recreated
+        assert (micromamba_path / "envs" / "Python3.12").stat().st_ino == env_inode
+
+    # ----------------------------------------------------------------------
+    @pytest.mark.parametrize("level", ["invalid", ""])
+    def test_InvalidLevel(self, tmp_path_factory, templates_path, level):
+        root = tmp_path_factory.mktemp("root")
+
+        result, output = _Execute(
+            [
+                (
+                    templates_path / f"Bootstrap{_extension}",
+                    root / f"Bootstrap{_extension}",
+                ),
+            ],
+            root,
+            "{}Bootstrap{}{} --python-version 3.12 --force={}".format(
+                _execute_prefix,
+                _extension,
+                _bootstrap_branch_arg,
+                level,
+            ),
+        )
+
+        assert result != 0, output
+        assert (
+            f"ERROR: '{level}' is not a valid --force value; valid values are 'venv', 'env', 'micromamba', and 'all'.\n"
+            in output
+        ), output
+        assert not (root / "Generated").exists()
+
+
+# ----------------------------------------------------------------------
+@pytest.mark.skipif(_is_windows, reason="--upgrade is not supported on Windows")
+class TestUpgrade(object):
+    # ----------------------------------------------------------------------
+    def test_Standard(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        generated_dir = _GetGeneratedDir(root, "3.12")
+        (generated_dir / "marker.txt").write_text("marker")
+
+        fingerprint = (generated_dir / "BootstrapFingerprint").read_text()
+
+        output = _Bootstrap(root, templates_path, "3.12", ["--upgrade"])
+
+        assert "Upgrading the micromamba environment...DONE (" in output, output
+
+        # The python major and minor versions can't change
+        env_dir = Path(_home_dir) / "micromamba" / "envs" / "Python3.12"
+        assert (env_dir / "conda-meta" / "pinned").read_text() == "python 3.12.*\n"
+
+        # The python virtual environment is only recreated if python itself changed
+        if (generated_dir / "BootstrapFingerprint").read_text() == fingerprint:
+            assert (
+                "Creating the python virtual environment...DONE (already exists)." in output
+            ), output
+            assert (generated_dir / "marker.txt").is_file()
+        else:
+            assert "Removing the existing python virtual environment...DONE." in output, output
+            assert not (generated_dir / "marker.txt").exists()
+
+
+# ----------------------------------------------------------------------
+@pytest.mark.skipif(_is_windows, reason="Background deletion is not supported on Windows")
+class TestBackgroundDeletion(object):
+    # ----------------------------------------------------------------------
+    def test_Venv(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        generated_dir = _GetGeneratedDir(root, "3.12")
+        (generated_dir / "marker.txt").write_text("marker")
+
+        # Left behind by a bootstrap that was interrupted before the trash was emptied
+        trash_dir = root / "Generated" / ".trash"
+        (trash_dir / "Interrupted").mkdir(parents=True)
+        (trash_dir / "Interrupted" / "marker.txt").write_text("marker")
+
+        output = _Bootstrap(root, templates_path, "3.12", ["--force=venv"])
+
+        assert "Removing the existing python virtual environment...DONE." in output, output
+        assert (generated_dir / "pyvenv.cfg").is_file()
+        assert not (generated_dir / "marker.txt").exists()
+
+        # The previous python virtual environment is deleted in the background
+        for _ in range(60):
+            if not any(trash_dir.iterdir()):
+                break
+
+            time.sleep(0.5)
+
+        assert list(trash_dir.iterdir()) == []
+
+
+# ----------------------------------------------------------------------
+@pytest.mark.skipif(_is_windows, reason="Downloads are not prefetched on Windows")
+class TestPrefetch(object):
+    # ----------------------------------------------------------------------
+    def test_DefaultVersion(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        # Bootstrap.sh downloads the default python version information along with BootstrapImpl.sh
+        output = _Bootstrap(root, templates_path)
+
+        assert "Downloading default python version information...DONE." in output, output
+
+        # The information is saved for --check, which never accesses the network
+        python_version = (cache_path / "default_version").read_text().strip()
+        assert (_GetGeneratedDir(root, python_version) / "pyvenv.cfg").is_file()
+
+        # Temporary files are removed
+        assert [path.name for path in root.glob("Bootstrap*")] == [f"Bootstrap{_extension}"]
+        assert not (root / "default_version").exists()
+
+
+# ----------------------------------------------------------------------
+@pytest.mark.skipif(_is_windows, reason="Thread counts are not supported on Windows")
+class TestThreads(object):
+    # ----------------------------------------------------------------------
+    def test_Standard(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        # The thread counts are displayed when the micromamba environment is upgraded
+        output = _Bootstrap(
+            root,
+            templates_path,
+            "3.12",
+            ["--upgrade", "--download-threads", "3", "--extract-threads", "2"],
+        )
+
+        assert "download threads: 3, extract threads: 2" in output, output
+
+    # ----------------------------------------------------------------------
+    def test_Invalid(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        result, output = _Execute(
+            [
+                (
+                    templates_path / f"Bootstrap{_extension}",
+                    root / f"Bootstrap{_extension}",
+                ),
+            ],
+            root,
+            "{}Bootstrap{}{} --python-version 3.12 --download-threads 0".format(
+                _execute_prefix,
+                _extension,
+                _bootstrap_branch_arg,
+            ),
+        )
+
+        assert result != 0, output
+        assert "ERROR: '0' is not a valid number of threads.\n" in output, output
+        assert not (root / "Generated").exists()
+
+
+# ----------------------------------------------------------------------
+@pytest.mark.skipif(_is_windows, reason="--precompile is not supported on Windows")
+class TestPrecompile(object):
+    # ----------------------------------------------------------------------
+    def test_Standard(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        (root / "src").mkdir()
+        (root / "src" / "Module.py").write_text("value = 1\n")
+
+        output = _Bootstrap(root, templates_path, "3.12", ["--precompile-dir", "src"])
+
+        assert "Precompiling python bytecode...DONE (" in output, output
+        assert "some files could not be compiled" not in output, output
+
+        assert list((root / "src" / "__pycache__").glob("Module.cpython-*.pyc"))
+        assert list(
+            _GetGeneratedDir(root, "3.12").glob(
+                "lib/python*/site-packages/__pycache__/PythonBootstrapperHelpers.cpython-*.pyc"
+            )
+        )
+
+    # ----------------------------------------------------------------------
+    def test_InvalidFile(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        (root / "src").mkdir()
+        (root / "src" / "Valid.py").write_text("value = 1\n")
+        (root / "src" / "Invalid.py").write_text("value = \n")
+
+        # Files that can't be compiled don't fail the bootstrap
+        output = _Bootstrap(root, templates_path, "3.12", ["--precompile-dir", "src"])
+
+        assert "Precompiling python bytecode...DONE (" in output, output
+        assert "some files could not be compiled" in output, output
+        assert "Invalid.py" in output, output
+
+        assert list((root / "src" / "__pycache__").glob("Valid.cpython-*.pyc"))
+        assert not list((root / "src" / "__pycache__").glob("Invalid.cpython-*.pyc"))
+
+
+# ----------------------------------------------------------------------
+@pytest.mark.skipif(_is_windows, reason="Epilogs are always run on Windows")
+class TestEpilogInputs(object):
+    # ----------------------------------------------------------------------
+    def test_Standard(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        epilog_filename = root / "BootstrapEpilog.sh"
+        epilog_filename.write_text(
+            textwrap.dedent(
+                """\
+                #!/usr/bin/env bash
+                # bootstrap-inputs: inputs/*.txt
+                echo run >> runs.txt
+                """,
+            ),
+        )
+        epilog_filename.chmod(0o755)
+
+        (root / "inputs").mkdir()
+        (root / "inputs" / "a.txt").write_text("1")
+
+        # ----------------------------------------------------------------------
+        def Bootstrap(arguments: Optional[list[str]] = None) -> tuple[int, bool]:
+            output = _Bootstrap(root, templates_path, "3.12", arguments)
+
+            return (
+                (root / "runs.txt").read_text().count("run\n"),
+                "BootstrapEpilog.sh is current and was not run (use --rerun-epilogs to run it).\n"
+                in output,
+            )
+
+        # ----------------------------------------------------------------------
+
+        assert Bootstrap() == (1, False)
+        assert Bootstrap() == (1, True)
+
+        # Flags processed by the bootstrapper don't change the result of the epilog
+        assert Bootstrap(["--precompile"]) == (1, True)
+
+        (root / "inputs" / "a.txt").write_text("2")
+        assert Bootstrap() == (2, False)
+
+        # New files that match the glob are inputs as well
+        (root / "inputs" / "b.txt").write_text("1")
+        assert Bootstrap() == (3, False)
+
+        # Arguments that aren't processed by the bootstrapper are meant for the epilogs
+        assert Bootstrap(["--repository-argument"]) == (4, False)
+        assert Bootstrap(["--repository-argument"]) == (4, True)
+
+        assert (_GetGeneratedDir(root, "3.12") / "EpilogManifests" / "BootstrapEpilog.sh").is_file()
+
+
+# ----------------------------------------------------------------------
+@pytest.mark.skipif(_is_windows, reason="Epilog profiling is not supported on Windows")
+class TestProfileEpilogs(object):
+    # ----------------------------------------------------------------------
+    def test_Standard(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        (root / "BootstrapEpilog.py").write_text(
+            textwrap.dedent(
+                """\
+                import json
+                import sys
+
+                with open("runs.txt", "a") as f:
+                    f.write(json.dumps(sys.argv[1:]) + "\\n")
+                """,
+            ),
+        )
+
+        # ----------------------------------------------------------------------
+        def Bootstrap() -> str:
+            result, output = _Execute(
+                [
+                    (
+                        templates_path / f"Bootstrap{_extension}",
+                        root / f"Bootstrap{_extension}",
+                    ),
+                ],
+                root,
+                "PYTHON_BOOTSTRAPPER_PROFILE_EPILOGS=1 {}Bootstrap{}{} --python-version 3.12 --repository-argument".format(
+                    _execute_prefix,
+                    _extension,
+                    _bootstrap_branch_arg,
+                ),
+            )
+
+            assert result == 0, output
+            return output
+
+        # ----------------------------------------------------------------------
+
+        output = Bootstrap()
+
+        assert "Profile of BootstrapEpilog.py (" in output, output
+        assert "    Functions (by self time):\n" in output, output
+
+        # Epilogs receive the name of a script to write to, followed by the repository's arguments
+        expected_run = '["BootstrapEpilog_py.sh", "--repository-argument"]\n'
+
+        assert (root / "runs.txt").read_text() == expected_run
+
+        profiles_dir = _GetGeneratedDir(root, "3.12") / "Profiles"
+
+        assert (profiles_dir / "BootstrapEpilog.pstats").is_file()
+        assert "import time:" in (profiles_dir / "BootstrapEpilog.importtime.txt").read_text()
+
+        # Profiled epilogs are run even when their inputs are unchanged
+        output = Bootstrap()
+
+        assert "Profile of BootstrapEpilog.py (" in output, output
+        assert (root / "runs.txt").read_text() == expected_run * 2
+
+
+# ----------------------------------------------------------------------
+@pytest.mark.skipif(_is_windows, reason="Activation profiling is not supported on Windows")
+class TestProfileActivation(object):
+    # ----------------------------------------------------------------------
+    def test_Standard(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        commands = [
+            "export PYTHON_BOOTSTRAPPER_PROFILE_ACTIVATION=1",
+            f"{_source}{_execute_prefix}Activate{_extension}",
+        ]
+
+        result, output = _Execute([], root, " && ".join(commands))
+        assert result == 0, output
+
+        profile = (_GetGeneratedDir(root, "3.12") / "Profiles" / "Activate.txt").read_text()
+        assert f"\nActivation profile:\n{profile}" in output, output
+
+        steps = []
+
+        for line in profile.splitlines():
+            match = re.fullmatch(r"\s*\d+\.\d{3}ms  (?P<step>.+)", line)
+            assert match, line
+
+            steps.append(match.group("step"))
+
+        assert steps[-1] == "Total", steps
+        assert steps.index("pushd") < steps.index("python virtual environment activate"), steps
+
+    # ----------------------------------------------------------------------
+    def test_Disabled(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        result, output = _Execute([], root, f"{_source}{_execute_prefix}Activate{_extension}")
+        assert result == 0, output
+
+        assert "Activation profile:" not in output, output
+        assert not (_GetGeneratedDir(root, "3.12") / "Profiles").exists()
+
+
+# ----------------------------------------------------------------------
+@pytest.mark.skipif(_is_windows, reason="The environment manifest is not written on Windows")
+class TestEnvironmentManifest(object):
+    # ----------------------------------------------------------------------
+    def test_Standard(self, tmp_path_factory, templates_path):
+        root = tmp_path_factory.mktemp("root")
+
+        epilog_filename = root / "BootstrapEpilog.sh"
+        epilog_filename.write_text("#!/usr/bin/env bash\n")
+        epilog_filename.chmod(0o755)
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        generated_dir = _GetGeneratedDir(root, "3.12")
+        manifest = json.loads((generated_dir / "EnvironmentManifest.json").read_text())
+
+        python_version = subprocess.run(
+            [
+                generated_dir / "bin" / "python",
+                "-c",
+                "import platform; print(platform.python_version())",
+            ],
+            check=True,
+            stdout=subprocess.PIPE,
+            text=True,
+        ).stdout.strip()
+
+        assert manifest["python_version"] == python_version
+        assert manifest["interpreter"] == str(generated_dir / "bin" / "python")
+        assert manifest["venv"] == str(generated_dir)
+        assert (
+            manifest["venv_fingerprint"]
+            == (generated_dir / "BootstrapFingerprint").read_text().strip()
+        )
+        assert manifest["micromamba_environment"] == str(
+            Path(_home_dir) / "micromamba" / "envs" / "Python3.12"
+        )
+        assert list(manifest["epilogs"]) == ["BootstrapEpilog.sh"]
+        assert "pip" in [package["name"] for package in manifest["packages"]]
+
+        # Manifests for epilogs that no longer exist in the repository are ignored
+        epilog_filename.unlink()
+
+        _Bootstrap(root, templates_path, "3.12")
+
+        manifest = json.loads((generated_dir / "EnvironmentManifest.json").read_text())
+        assert manifest["epilogs"] == {}
+
+
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+_env = {
+    k: v
+    for k, v in os.environ.items()
+    if not k.startswith("_") and not k.startswith("PYTHON_BOOTSTRAPPER")
+}
+
+
+# ----------------------------------------------------------------------
+def _Execute(
+    files_to_copy: list[tuple[Path, Path]],
+    root: Path,
+    command: str,
+) -> tuple[int, str]:
+    for source, dest in files_to_copy:
+        shutil.copyfile(source, dest)
+
+        if dest.suffix == _extension:
+            dest.chmod(0o755)
+
+    result = subprocess.run(
+        command,
+        check=False,
+        shell=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        cwd=root,
+        executable=_subprocess_executable,
+        env=_env,
+    )
+
+    content = result.stdout.decode("utf-8")
+
+    # Remove lines eventually replaced by DONE-style messages
+    content = re.sub(
+        r"^[^\n]+\r?\n\x1b\[1A",
+        "",
+        content,
+        flags=re.MULTILINE,
+    )
+
+    # Remove escape sequences
+    content = re.sub(r"\x1b\[\d+[Am]", "", content)
+
+    # Remove CRs
+    content = content.replace("\r", "")
+
+    return result.returncode, content
+
+
+# ----------------------------------------------------------------------
+def _Bootstrap(
+    root: Path,
+    templates_path: Path,
+    python_version: Optional[str] = None,
+    arguments: Optional[list[str]] = None,
+) -> str:
+    result, output = _Execute(
+        [
+            (
+                templates_path / f"Bootstrap{_extension}",
+                root / f"Bootstrap{_extension}",
+            ),
+        ],
+        root,
+        "{}Bootstrap{}{}{}{}".format(
+            _execute_prefix,
+            _extension,
+            _bootstrap_branch_arg,
+            "" if python_version is None else " --python-version {}".format(python_version),
+            "".join(' "{}"'.format(arg) for arg in (arguments or [])),
+        ),
+    )
+
+    assert result == 0, output
+    return output
+
+
+# ----------------------------------------------------------------------
+def _Check(
+    root: Path,
+    templates_path: Path,
+    python_version: str,
+) -> tuple[int, str]:
+    return _Execute(
+        [
+            (
+                templates_path / f"Bootstrap{_extension}",
+                root / f"Bootstrap{_extension}",
+            ),
+        ],
+        root,
+        "{}Bootstrap{}{} --check --python-version {}".format(
+            _execute_prefix,
+            _extension,
+            _bootstrap_branch_arg,
+            python_version,
+        ),
+    )
+
+
+# ----------------------------------------------------------------------
+def _Register(
+    generated_dir: Path,
+    cache_dir: Path,
+) -> Path:
+    # Tests that collect garbage use a registry that only contains the python virtual environments
+    # registered here, so that the environments of other repositories on this machine are never
+    # affected. The environments are registered as having been used 10 years ago and the ages used
+    # when collecting garbage are large, so that the micromamba environments (which may be used by
+    # other repositories) are never considered old enough to remove or archive.
+    for registry_filename in (cache_path / "Registry").iterdir():
+        if Path(registry_filename.read_text().splitlines()[0]).resolve() == generated_dir.resolve():
+            break
+    else:
+        assert False, generated_dir  # pragma: no cover
+
+    result = cache_dir / "Registry" / registry_filename.name
+
+    result.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(registry_filename, result)
+
+    last_used = time.time() - 3650 * 86400
+    os.utime(result, (last_used, last_used))
+
+    return result
+
+
+# ----------------------------------------------------------------------
+def _CollectGarbage(
+    root: Path,
+    templates_path: Path,
+    cache_dir: Path,
+    max_age: int,
+    archive_age: int,
+    arguments: str = "",
+) -> tuple[int, str]:
+    return _Execute(
+        [
+            (
+                templates_path / f"Bootstrap{_extension}",
+                root / f"Bootstrap{_extension}",
+            ),
+        ],
+        root,
+        "PYTHON_BOOTSTRAPPER_CACHE_DIR={} PYTHON_BOOTSTRAPPER_GC_MAX_AGE={} PYTHON_BOOTSTRAPPER_GC_ARCHIVE_AGE={} {}Bootstrap{}{} --python-version 3.12 --gc{}".format(
+            cache_dir,
+            max_age,
+            archive_age,
+            _execute_prefix,
+            _extension,
+            _bootstrap_branch_arg,
+            arguments,
+        ),
+    )
+
+
+# ----------------------------------------------------------------------
+def _GetGeneratedDir(
+    root: Path,
+    python_version: str,
+) -> Path:
+    generated_dirs = list((root / "Generated").glob(f"*/Python{python_version}"))
+
+    assert len(generated_dirs) == 1, generated_dirs
+    return generated_dirs[0]
+
+
+# ----------------------------------------------------------------------
+def _GetArchiveFilenames(
+    directory: Path,
+) -> list[Path]:
+    return [
+        directory.parent / "{}{}".format(directory.name, extension)
+        for extension in [".tar.zst", ".tar.gz"]
+        if (directory.parent / "{}{}".format(directory.name, extension)).is_file()
+    ]
 
 
 # ----------------------------------------------------------------------
@@ -0,0 +1,301 @@
+# ----------------------------------------------------------------------
+# |
+# |  Bootstrapper.py
+# |
+# |  David Brownell <db@DavidBrownell.com>
+# |      2026-10-19 09:12:41
+# |
+# ----------------------------------------------------------------------
+# |
+# |  Copyright David Brownell 2023-24
+# |  Distributed under the MIT License.
+# |
+# ----------------------------------------------------------------------
+"""Runs Bootstrap.sh and produces structured events as the bootstrap process progresses."""
+
+import asyncio
+import os
+import re
+import time
+
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Deque, Dict, Iterable, List, Optional, Union
+
+
+# ----------------------------------------------------------------------
+@dataclass(frozen=True)
+class Event(object):
+    """Base class for all events"""
+
+    root: Path
+    timestamp: float  # time.monotonic()
+
+
+# ----------------------------------------------------------------------
+@dataclass(frozen=True)
+class PhaseStarted(Event):
+    """A bootstrap phase (for example, "micromamba", "environment", or "venv") has started."""
+
+    phase: str
+
+
+# ----------------------------------------------------------------------
+@dataclass(frozen=True)
+class PhaseFinished(Event):
+    """A bootstrap phase has finished."""
+
+    phase: str
+    result: str  # "DONE", "CACHED", or "FAILED"
+    duration: float  # seconds
+    details: str
+
+    # ----------------------------------------------------------------------
+    @property
+    def cache_hit(self) -> bool:
+        return self.result == "CACHED"
+
+
+# ----------------------------------------------------------------------
+@dataclass(frozen=True)
+class Output(Event):
+    """A line of output (without terminal escape sequences)."""
+
+    line: str
+
+
+# ----------------------------------------------------------------------
+@dataclass(frozen=True)
+class Error(Event):
+    """The bootstrap process failed."""
+
+    returncode: int
+    message: str  # The final lines of output
+
+
+# ----------------------------------------------------------------------
+@dataclass(frozen=True)
+class Completed(Event):
+    """The bootstrap process has exited; this is always the final event for a root."""
+
+    returncode: int
+    duration: float  # seconds
+
+
+# ----------------------------------------------------------------------
+async def Bootstrap(
+    root: Union[Path, str],
+    python_version: Optional[str] = None,
+    args: Optional[List[str]] = None,
+    *,
+    script: Union[Path, str, None] = None,
+    semaphore: Optional[asyncio.Semaphore] = None,
+) -> AsyncIterator[Event]:
+    """Bootstraps the repository at root, producing events as they happen.
+
+    The script defaults to <root>/Bootstrap.sh. When a semaphore is provided, it is held while the
+    script is running so that multiple bootstraps can share a concurrency limit.
+    """
+
+    root = Path(root).resolve()
+    script = Path(script) if script is not None else root / "Bootstrap.sh"
+
+    command_line = ["bash", str(script)]
+
+    if python_version is not None:
+        command_line += ["--python-version", python_version]
+
+    command_line += args or []
+
+    if semaphore is None:
+        async for event in _BootstrapImpl(root, command_line):
+            yield event
+    else:
+        async with semaphore:
+            async for event in _BootstrapImpl(root, command_line):
+                yield event
+
+
+# ----------------------------------------------------------------------
+async def BootstrapAll(
+    roots: Iterable[Union[Path, str]],
+    python_version: Optional[str] = None,
+    args: Optional[List[str]] = None,
+    *,
+    max_concurrency: Optional[int] = None,
+    script: Union[Path, str, None] = None,
+) -> AsyncIterator[Event]:
+    """Bootstraps multiple repositories concurrently, producing the events from all of them.
+
+    At most max_concurrency (the number of processors by default) bootstraps run at a time; use
+    the root attribute of each event to determine the repository that it applies to.
+    """
+
+    semaphore = asyncio.Semaphore(max_concurrency or os.cpu_count() or 1)
+    queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue()
+
+    # ----------------------------------------------------------------------
+    async def Run(root: Union[Path, str]) -> None:
+        try:
+            async for event in Bootstrap(
+                root,
+                python_version,
+                args,
+                script=script,
+                semaphore=semaphore,
+            ):
+                await queue.put(event)
+        finally:
+            await queue.put(None)
+
+    # ----------------------------------------------------------------------
+
+    tasks = [asyncio.create_task(Run(root)) for root in roots]
+    num_remaining = len(tasks)
+
+    try:
+        while num_remaining:
+            event = await queue.get()
+
+            if event is None:
+                num_remaining -= 1
+            else:
+                yield event
+
+        for task in tasks:
+            exception = task.exception()
+            if exception is not None:
+                raise exception
+
+    finally:
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+_ESCAPE_SEQUENCE_REGEX = re.compile(r"\x1b\[\d*[A-Za-z]")
+_NUM_ERROR_LINES = 20
+
+
+# ----------------------------------------------------------------------
+async def _BootstrapImpl(
+    root: Path,
+    command_line: List[str],
+) -> AsyncIterator[Event]:
+    start_time = time.monotonic()
+
+    # BootstrapImpl.sh writes events to the write end of this pipe
+    read_fd, write_fd = os.pipe()
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *command_line,
+            cwd=root,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env={**os.environ, "PYTHON_BOOTSTRAPPER_EVENTS_FD": str(write_fd)},
+            pass_fds=(write_fd,),
+        )
+    except Exception:
+        os.close(read_fd)
+        raise
+    finally:
+        os.close(write_fd)
+
+    loop = asyncio.get_running_loop()
+
+    events_reader = asyncio.StreamReader()
+    events_transport, _ = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(events_reader),
+        os.fdopen(read_fd, "rb", 0),
+    )
+
+    queue: "asyncio.Queue[Optional[tuple[bool, bytes]]]" = asyncio.Queue()
+
+    # ----------------------------------------------------------------------
+    async def Pump(reader: asyncio.StreamReader, is_event: bool) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                await queue.put((is_event, line))
+        finally:
+            await queue.put(None)
+
+    # ----------------------------------------------------------------------
+
+    assert process.stdout is not None
+
+    pumps = [
+        asyncio.create_task(Pump(process.stdout, False)),
+        asyncio.create_task(Pump(events_reader, True)),
+    ]
+
+    phase_start_times: Dict[str, float] = {}
+    last_lines: Deque[str] = deque(maxlen=_NUM_ERROR_LINES)
+
+    try:
+        num_remaining = len(pumps)
+
+        while num_remaining:
+            item = await queue.get()
+
+            if item is None:
+                num_remaining -= 1
+                continue
+
+            is_event, data = item
+            now = time.monotonic()
+            line = data.decode("utf-8", errors="replace").rstrip("\r\n")
+
+            if not is_event:
+                line = _ESCAPE_SEQUENCE_REGEX.sub("", line).replace("\r", "")
+                last_lines.append(line)
+
+                yield Output(root, now, line)
+                continue
+
+            parts = line.split("\t")
+            parts += [""] * (4 - len(parts))
+
+            event_type, phase, result, details = parts[:4]
+
+            if event_type == "started":
+                phase_start_times[phase] = now
+                yield PhaseStarted(root, now, phase)
+
+            elif event_type == "finished":
+                phase_start_time = phase_start_times.pop(phase, now)
+                yield PhaseFinished(root, now, phase, result, now - phase_start_time, details)
+
+        returncode = await process.wait()
+        now = time.monotonic()
+
+        if returncode != 0:
+            # Phases that were in progress when the script exited have failed
+            for phase, phase_start_time in phase_start_times.items():
+                yield PhaseFinished(root, now, phase, "FAILED", now - phase_start_time, "")
+
+            yield Error(root, now, returncode, "\n".join(last_lines))
+
+        yield Completed(root, now, returncode, now - start_time)
+
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+        for pump in pumps:
+            pump.cancel()
+
+        await asyncio.gather(*pumps, return_exceptions=True)
+
+        events_transport.close()
@@ -0,0 +1,36 @@
+# ----------------------------------------------------------------------
+# |
+# |  __init__.py
+# |
+# |  David Brownell <db@DavidBrownell.com>
+# |      2026-10-19 09:12:41
+# |
+# ----------------------------------------------------------------------
+# |
+# |  Copyright David Brownell 2023-24
+# |  Distributed under the MIT License.
+# |
+# ----------------------------------------------------------------------
+"""Programmatic access to the bootstrap process (Linux / MacOS)."""
+
+from .Bootstrapper import (
+    Bootstrap,
+    BootstrapAll,
+    Completed,
+    Error,
+    Event,
+    Output,
+    PhaseFinished,
+    PhaseStarted,
+)
+
+__all__ = [
+    "Bootstrap",
+    "BootstrapAll",
+    "Completed",
+    "Error",
+    "Event",
+    "Output",
+    "PhaseFinished",
+    "PhaseStarted",
+]
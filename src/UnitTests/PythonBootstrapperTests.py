@@ -0,0 +1,227 @@
+# ----------------------------------------------------------------------
+# |
+# |  PythonBootstrapperTests.py
+# |
+# |  David Brownell <db@DavidBrownell.com>
+# |      2026-10-19 09:12:41
+# |
+# ----------------------------------------------------------------------
+# |
+# |  Copyright David Brownell 2023-24
+# |  Distributed under the MIT License.
+# |
+# ----------------------------------------------------------------------
+"""Unit tests for the PythonBootstrapper package"""
+
+import asyncio
+import os
+import sys
+import textwrap
+
+from pathlib import Path
+from typing import List, Tuple
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from PythonBootstrapper import (
+    Bootstrap,
+    BootstrapAll,
+    Completed,
+    Error,
+    Event,
+    Output,
+    PhaseFinished,
+    PhaseStarted,
+)
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="The bootstrap scripts require bash")
+
+
+# ----------------------------------------------------------------------
+def test_Success(tmp_path):
+    script = _CreateScript(
+        tmp_path,
+        """\
+        echo "Downloading micromamba..."
+        _Event started micromamba
+        echo -e "\\e[1ADownloading micromamba...\\e[32m\\e[1mDONE\\e[0m (already exists)."
+        _Event finished micromamba CACHED
+
+        _Event started venv
+        sleep 0.2
+        _Event finished venv DONE "details go here"
+
+        echo "args: $*"
+        """,
+    )
+
+    events = _Run(Bootstrap(tmp_path, "3.12", ["--debug"], script=script))
+
+    output, phases = _Split(events)
+
+    assert output == [
+        "Output: Downloading micromamba...",
+        "Output: Downloading micromamba...DONE (already exists).",
+        "Output: args: --python-version 3.12 --debug",
+    ]
+
+    assert phases == [
+        "PhaseStarted: micromamba",
+        "PhaseFinished: micromamba CACHED",
+        "PhaseStarted: venv",
+        "PhaseFinished: venv DONE details go here",
+        "Completed: 0",
+    ]
+
+    assert all(event.root == tmp_path.resolve() for event in events)
+
+    finished = [event for event in events if isinstance(event, PhaseFinished)]
+
+    assert finished[0].cache_hit
+    assert not finished[1].cache_hit
+    assert finished[1].duration >= 0.2
+
+
+# ----------------------------------------------------------------------
+def test_Failure(tmp_path):
+    script = _CreateScript(
+        tmp_path,
+        """\
+        _Event started environment
+        echo "The environment could not be created."
+        exit 3
+        """,
+    )
+
+    events = _Run(Bootstrap(tmp_path, script=script))
+
+    output, phases = _Split(events)
+
+    assert output == ["Output: The environment could not be created."]
+
+    assert phases == [
+        "PhaseStarted: environment",
+        "PhaseFinished: environment FAILED",
+        "Error: 3 The environment could not be created.",
+        "Completed: 3",
+    ]
+
+
+# ----------------------------------------------------------------------
+def test_NoEvents(tmp_path):
+    # The events file descriptor is optional
+    script = _CreateScript(
+        tmp_path,
+        """\
+        unset PYTHON_BOOTSTRAPPER_EVENTS_FD
+        _Event started ignored
+        echo "Done"
+        """,
+    )
+
+    events = _Run(Bootstrap(tmp_path, script=script))
+
+    assert [_Describe(event) for event in events] == [
+        "Output: Done",
+        "Completed: 0",
+    ]
+
+
+# ----------------------------------------------------------------------
+@pytest.mark.parametrize("max_concurrency", [1, 3])
+def test_BootstrapAll(tmp_path, max_concurrency):
+    script = _CreateScript(
+        tmp_path,
+        """\
+        _Event started venv
+        sleep 0.2
+        _Event finished venv DONE
+        """,
+    )
+
+    roots = [tmp_path / str(index) for index in range(3)]
+
+    for root in roots:
+        root.mkdir()
+
+    events = _Run(BootstrapAll(roots, script=script, max_concurrency=max_concurrency))
+
+    assert (
+        sorted(_Describe(event) for event in events if isinstance(event, Completed))
+        == ["Completed: 0"] * 3
+    )
+
+    # Count the maximum number of bootstraps that were running at the same time
+    num_running = 0
+    max_running = 0
+
+    for event in events:
+        if isinstance(event, PhaseStarted):
+            num_running += 1
+            max_running = max(max_running, num_running)
+        elif isinstance(event, Completed):
+            num_running -= 1
+
+    assert max_running == max_concurrency
+
+
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+def _CreateScript(
+    root: Path,
+    content: str,
+) -> Path:
+    # Scripts use the same _Event function as BootstrapImpl.sh
+    impl_content = (Path(__file__).parent.parent / "BootstrapImpl.sh").read_text(encoding="utf-8")
+
+    event_func = impl_content[impl_content.index("function _Event() {") :]
+    event_func = event_func[: event_func.index("\n}\n") + 3]
+
+    script = root / "FakeBootstrap.sh"
+    script.write_text(event_func + "\n" + textwrap.dedent(content), encoding="utf-8")
+
+    return script
+
+
+# ----------------------------------------------------------------------
+def _Run(events) -> List[Event]:
+    # ----------------------------------------------------------------------
+    async def Impl() -> List[Event]:
+        return [event async for event in events]
+
+    # ----------------------------------------------------------------------
+
+    return asyncio.run(Impl())
+
+
+# ----------------------------------------------------------------------
+def _Split(events: List[Event]) -> Tuple[List[str], List[str]]:
+    # Output and events are read from different pipes, so their relative order is not deterministic
+    output: List[str] = []
+    others: List[str] = []
+
+    for event in events:
+        (output if isinstance(event, Output) else others).append(_Describe(event))
+
+    return output, others
+
+
+# ----------------------------------------------------------------------
+def _Describe(event: Event) -> str:
+    if isinstance(event, Output):
+        return "Output: {}".format(event.line)
+    if isinstance(event, PhaseStarted):
+        return "PhaseStarted: {}".format(event.phase)
+    if isinstance(event, PhaseFinished):
+        return "PhaseFinished: {}".format(
+            " ".join(part for part in [event.phase, event.result, event.details] if part)
+        )
+    if isinstance(event, Error):
+        return "Error: {} {}".format(event.returncode, event.message)
+    if isinstance(event, Completed):
+        return "Completed: {}".format(event.returncode)
+
+    assert False, event  # pragma: no cover